@@ -6,19 +6,37 @@ This script evaluates user inputs against expected outputs using
 LM Studio server with the gpt-oss-20b-mlx model and RAG capabilities.
 """
 
+import argparse
 import json
+import hashlib
 import time
 import logging
 import sys
 import os
 import shutil
 import re
+import threading
+import queue
+import socket
+import sqlite3
+import heapq
+import glob
+import gc
+import random
+import mmap
+import pickle
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
+from statistics import NormalDist
+from types import SimpleNamespace
 import requests
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +55,31 @@ class TestRun:
     run_number: int
     timestamp: str
     response: str
+    # JSON form of the response, parsed once on construction (None for free-text output)
+    parsed_response: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.parsed_response = parse_actual_output(self.response)
+
+    @classmethod
+    def from_parsed(cls, run_number: int, timestamp: str, response: str,
+                    parsed_response: Optional[Dict[str, Any]]) -> "TestRun":
+        """Rebuild a run whose response was already parsed, e.g. from the test data cache"""
+        run = cls.__new__(cls)
+        run.run_number, run.timestamp, run.response = run_number, timestamp, response
+        run.parsed_response = parsed_response
+        return run
+
+    @property
+    def offer_ids(self) -> List[str]:
+        """Offer IDs listed in the actual output, in the order they were returned"""
+        if not self.parsed_response:
+            return []
+        return normalize_offer_ids(self.parsed_response.get("offers"))
+    
+    def canonical_key(self, offer_order_significant: bool = True) -> str:
+        """Stable key that ignores whitespace, key order and offer ID formatting"""
+        return canonicalize_response(self.response, self.parsed_response, offer_order_significant)
 
 @dataclass
 class TestCase:
@@ -55,6 +98,75 @@ class DetailedScores:
     relevance: int
     overall_quality: int
     
+    @property
+    def weighted_average(self) -> float:
+        """Weighted score: Factual Accuracy 60%, others 10% each"""
+        return (
+            self.factual_accuracy * 0.60 +
+            self.completeness * 0.10 +
+            self.order_sequence * 0.10 +
+            self.relevance * 0.10 +
+            self.overall_quality * 0.10
+        )
+    
+@dataclass
+class JudgeCallStats:
+    """Telemetry collected while judging a single run"""
+    llm_calls: int = 0
+    time_to_first_token: Optional[float] = None
+    completion_tokens: int = 0
+    generation_time: float = 0.0
+    early_stopped: bool = False
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    batch_size: int = 1  # Runs judged by the same LLM request(s)
+    backend: Optional[str] = None  # Base URL of the backend that served the last call
+    hedged_calls: int = 0  # LLM calls for which a hedge request was sent
+    coalesced_calls: int = 0  # Calls answered by an identical request already in flight
+    round_trips: int = 0  # Judge requests made by the tool-call loop
+    tool_calls: int = 0  # Tool calls executed locally
+    iteration_times: List[float] = field(default_factory=list)  # Seconds per loop iteration (request + tools)
+    budget_exhausted: Optional[str] = None  # Tool-loop budget that forced a final answer, if any
+    cascade_tier: Optional[str] = None  # "cheap" or "heavy": judge tier whose verdict was kept
+    escalation_reason: Optional[str] = None  # Why the cheap verdict was escalated, if it was
+    
+    def record_usage(self, usage: Any):
+        """Add server-reported token usage, including prefix-cache hits when available"""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None:
+            self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+    
+    def merge(self, other: "JudgeCallStats"):
+        """Add the telemetry of one completed LLM call"""
+        if self.time_to_first_token is None:
+            self.time_to_first_token = other.time_to_first_token
+        self.completion_tokens += other.completion_tokens
+        self.generation_time += other.generation_time
+        self.early_stopped = self.early_stopped or other.early_stopped
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_tokens += other.cached_tokens
+        self.backend = other.backend or self.backend
+    
+    def absorb(self, other: "JudgeCallStats"):
+        """Add the telemetry of a whole judging attempt, such as the cheap tier of a cascade"""
+        self.merge(other)
+        self.llm_calls += other.llm_calls
+        self.hedged_calls += other.hedged_calls
+        self.coalesced_calls += other.coalesced_calls
+        self.round_trips += other.round_trips
+        self.tool_calls += other.tool_calls
+        self.iteration_times.extend(other.iteration_times)
+    
+    @property
+    def tokens_per_second(self) -> float:
+        """Completion tokens generated per second across all LLM calls of the run"""
+        if self.generation_time <= 0:
+            return 0.0
+        return self.completion_tokens / self.generation_time
+
 @dataclass
 class RunEvaluationResult:
     """Represents the result of evaluating a single run"""
@@ -67,19 +179,50 @@ class RunEvaluationResult:
     recommendation: str
     processing_time: float
     success: bool
+    judged_by: str = "llm"  # llm or rules
+    judge_stats: Optional[JudgeCallStats] = None
+    duplicate: bool = False  # Verdict fanned out from an identical, already judged run
     
     @property
     def average_score(self) -> float:
         """Calculate weighted average score with Factual Accuracy at 60%"""
-        # Weighted scoring: Factual Accuracy 60%, others 10% each
-        weighted_score = (
-            self.detailed_scores.factual_accuracy * 0.60 +  # 60%
-            self.detailed_scores.completeness * 0.10 +       # 10%
-            self.detailed_scores.order_sequence * 0.10 +     # 10%
-            self.detailed_scores.relevance * 0.10 +          # 10%
-            self.detailed_scores.overall_quality * 0.10      # 10%
+        return self.detailed_scores.weighted_average
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the verdict for the journal, keyed by the run it belongs to"""
+        return {
+            "test_id": self.test_case.test_id,
+            "run_number": self.test_run.run_number,
+            "timestamp": self.test_run.timestamp,
+            "content_hash": run_content_hash(self.test_case.input_text, self.test_case.reference_output,
+                                             self.test_run.response),
+            "evaluation": self.evaluation,
+            "detailed_scores": asdict(self.detailed_scores),
+            "rag_verification": self.rag_verification,
+            "reasoning": self.reasoning,
+            "recommendation": self.recommendation,
+            "processing_time": self.processing_time,
+            "success": self.success,
+            "judged_by": self.judged_by,
+            "judge_stats": asdict(self.judge_stats) if self.judge_stats else None
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], test_case: TestCase, test_run: TestRun) -> "RunEvaluationResult":
+        """Rebuild a verdict produced by to_dict for the given test case and run"""
+        return cls(
+            test_case=test_case,
+            test_run=test_run,
+            evaluation=data["evaluation"],
+            detailed_scores=DetailedScores(**data["detailed_scores"]),
+            rag_verification=data.get("rag_verification", ""),
+            reasoning=data.get("reasoning", ""),
+            recommendation=data.get("recommendation", ""),
+            processing_time=data.get("processing_time", 0.0),
+            success=data.get("success", True),
+            judged_by=data.get("judged_by", "llm"),
+            judge_stats=JudgeCallStats(**data["judge_stats"]) if data.get("judge_stats") else None
         )
-        return weighted_score
 
 @dataclass 
 class TestCaseResult:
@@ -108,6 +251,1092 @@ class TestCaseResult:
             return 0.0
         return min(result.average_score for result in self.run_results)
 
+def normalize_response(response: str) -> str:
+    """Collapse whitespace so formatting-only differences do not defeat deduplication"""
+    return " ".join(response.split())
+
+def run_content_hash(input_text: str, reference_output: str, response: str) -> str:
+    """Hash of everything the judge sees of a run, to detect edited inputs, references or responses"""
+    content = "\x00".join((input_text, reference_output, response))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def parse_actual_output(response: str) -> Optional[Dict[str, Any]]:
+    """Parse a model output of the form { "offers": [...], "text": "..." }"""
+    try:
+        parsed = json.loads(response)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def normalize_offer_ids(offers: Any) -> List[str]:
+    """Normalize offer IDs to stripped strings so 112, "112" and " 112 " compare equal"""
+    if not isinstance(offers, list):
+        return []
+    return [str(offer).strip() for offer in offers if str(offer).strip()]
+
+def _normalize_json_value(value: Any) -> Any:
+    """Recursively collapse whitespace in string values"""
+    if isinstance(value, str):
+        return normalize_response(value)
+    if isinstance(value, list):
+        return [_normalize_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize_json_value(v) for k, v in value.items()}
+    return value
+
+def canonicalize_response(response: str, parsed: Optional[Dict[str, Any]] = None,
+                          offer_order_significant: bool = True) -> str:
+    """Build a canonical key for an actual output
+    
+    JSON outputs are re-serialized with sorted keys, normalized offer IDs and
+    whitespace-collapsed strings. Offer lists are sorted when their order is not
+    significant. Free-text outputs fall back to whitespace normalization.
+    """
+    if parsed is None:
+        parsed = parse_actual_output(response)
+    if parsed is None:
+        return "text:" + normalize_response(response)
+    
+    canonical = _normalize_json_value(parsed)
+    if "offers" in canonical:
+        offer_ids = normalize_offer_ids(parsed.get("offers"))
+        if not offer_order_significant:
+            offer_ids.sort(key=lambda oid: (0, int(oid), oid) if oid.isdigit() else (1, 0, oid))
+        canonical["offers"] = offer_ids
+    return "json:" + json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+# Tool schema shared by every request so the serialized prompt prefix stays byte-identical
+SEARCH_KNOWLEDGE_BASE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_knowledge_base",
+        "description": "Search the knowledge base for offer information, IDs, and factual data",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The search query for the knowledge base"
+                }
+            },
+            "required": ["query"]
+        }
+    }
+}
+
+# Score lines of the structured judge output, in DetailedScores field order
+_SCORE_FIELDS = ("Factual_Accuracy", "Completeness", "Order_Sequence", "Relevance", "Overall_Quality")
+_RECOMMENDATION_END_PATTERN = re.compile(r"RECOMMENDATION:\s*\S[^\n]*(?:\n[ \t]*\S[^\n]*)*\n[ \t]*\n", re.IGNORECASE)
+
+def structured_output_complete(text: str) -> bool:
+    """True once the judge has emitted the verdict, all scores and a finished recommendation"""
+    if not re.search(r"EVALUATION_RESULT:\s*\w+", text, re.IGNORECASE):
+        return False
+    if not all(re.search(rf"{name}:\s*\d+", text, re.IGNORECASE) for name in _SCORE_FIELDS):
+        return False
+    return bool(_RECOMMENDATION_END_PATTERN.search(text))
+
+# JSON schema of a judge verdict, requested through response_format in structured output mode
+JUDGE_VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "evaluation": {"type": "string", "enum": ["CORRECT", "PARTIAL", "INCORRECT"]},
+        "scores": {
+            "type": "object",
+            "properties": {name.lower(): {"type": "integer", "minimum": 0, "maximum": 10} for name in _SCORE_FIELDS},
+            "required": [name.lower() for name in _SCORE_FIELDS],
+            "additionalProperties": False
+        },
+        "rag_verification": {"type": "string"},
+        "reasoning": {"type": "string"},
+        "recommendation": {"type": "string"}
+    },
+    "required": ["evaluation", "scores", "rag_verification", "reasoning", "recommendation"],
+    "additionalProperties": False
+}
+
+# Labels of the text judge output, lower-cased. Every label ends in a colon, so the
+# tokenizer only inspects the text just before each colon.
+_JUDGE_LABELS = ("evaluation_result",) + tuple(name.lower() for name in _SCORE_FIELDS) + ("rag_verification", "reasoning", "recommendation")
+_JUDGE_LABEL_WIDTH = max(len(label) for label in _JUDGE_LABELS)
+_VERDICT_VALUE_PATTERN = re.compile(r"\s*(\w+)")
+_SCORE_VALUE_PATTERN = re.compile(r"\s*(\d+)")
+
+def extract_judge_fields(text: str) -> Dict[str, Any]:
+    """Read the verdict, scores and sections of a judge output as stated, without defaults.
+
+    A JSON object (structured output mode) is decoded with a single json.loads.
+    The text format is tokenized in one pass over its colons; as before, the first
+    occurrence of each label wins, RAG_VERIFICATION runs to the next REASONING,
+    REASONING to the next RECOMMENDATION and RECOMMENDATION to the end. Missing fields are None
+    (verdict), absent from "scores", or empty strings (sections).
+    """
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            raw_scores = data.get("scores") if isinstance(data.get("scores"), dict) else {}
+            scores = {}
+            for name in _SCORE_FIELDS:
+                value = raw_scores.get(name.lower())
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    scores[name.lower()] = int(value)
+            verdict = data.get("evaluation")
+            return {
+                "evaluation": verdict.upper() if isinstance(verdict, str) and verdict else None,
+                "scores": scores,
+                "rag_verification": str(data.get("rag_verification") or "").strip(),
+                "reasoning": str(data.get("reasoning") or "").strip(),
+                "recommendation": str(data.get("recommendation") or "").strip()
+            }
+
+    verdict = None
+    scores: Dict[str, int] = {}
+    sections: Dict[str, List[Tuple[int, int]]] = {"rag_verification": [], "reasoning": [], "recommendation": []}
+    colon = text.find(":")
+    while colon != -1:
+        tail = text[max(0, colon - _JUDGE_LABEL_WIDTH):colon].lower()
+        if tail.endswith(_JUDGE_LABELS):
+            label = next(label for label in _JUDGE_LABELS if tail.endswith(label))
+            if label == "evaluation_result":
+                value = _VERDICT_VALUE_PATTERN.match(text, colon + 1)
+                if value and verdict is None:
+                    verdict = value.group(1).upper()
+            elif label in sections:
+                sections[label].append((colon - len(label), colon + 1))
+            else:
+                value = _SCORE_VALUE_PATTERN.match(text, colon + 1)
+                if value:
+                    scores.setdefault(label, int(value.group(1)))
+        colon = text.find(":", colon + 1)
+
+    def section_text(label: str, until: Optional[str]) -> str:
+        if not sections[label]:
+            return ""
+        start = sections[label][0][1]
+        if until is None:
+            return text[start:].strip()
+        end = next((s for s, _ in sections[until] if s >= start), None)
+        return text[start:end].strip() if end is not None else ""
+
+    return {
+        "evaluation": verdict,
+        "scores": scores,
+        "rag_verification": section_text("rag_verification", "reasoning"),
+        "reasoning": section_text("reasoning", "recommendation"),
+        "recommendation": section_text("recommendation", None)
+    }
+
+# Run-specific lines of a judge request: the actual output (compared by its canonical key) and its timestamp
+_ACTUAL_OUTPUT_PATTERN = re.compile(r"^Actual Output \(Run \d+\): (.*)$", re.MULTILINE)
+_TIMESTAMP_LINE_PATTERN = re.compile(r"^Timestamp: .*\n?", re.MULTILINE)
+
+def coalescing_key(request_params: dict, offer_order_significant: bool = True) -> str:
+    """Hash of a judge request with its actual outputs reduced to their canonical keys.
+    
+    Run numbers and timestamps are dropped and each actual output is replaced by
+    canonicalize_response, so runs of different test cases (or repeated runs, with
+    deduplication off) whose responses differ only in formatting map to the same
+    key and can share one in-flight call. Batched requests keep their "--- Run N ---"
+    headers, so they only match requests for the same run numbers.
+    """
+    def normalize(content: Any) -> Any:
+        if not isinstance(content, str):
+            return content
+        content = _TIMESTAMP_LINE_PATTERN.sub("", content)
+        return _ACTUAL_OUTPUT_PATTERN.sub(
+            lambda m: "Actual Output: " + canonicalize_response(m.group(1), offer_order_significant=offer_order_significant),
+            content
+        )
+    
+    normalized = dict(request_params)
+    normalized["messages"] = [
+        {**message, "content": normalize(message.get("content"))} if isinstance(message, dict) else message
+        for message in request_params.get("messages", [])
+    ]
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+_RUN_SECTION_PATTERN = re.compile(r"^[ \t]*=+[ \t]*RUN[ \t]+(\d+)[ \t]*=+[ \t]*$", re.IGNORECASE | re.MULTILINE)
+
+def split_run_sections(text: str, strip: bool = True) -> Dict[int, str]:
+    """Split a batched judge output into per-run sections keyed by run number"""
+    markers = list(_RUN_SECTION_PATTERN.finditer(text))
+    sections = {}
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        section = text[marker.end():end]
+        sections.setdefault(int(marker.group(1)), section.strip() if strip else section)
+    return sections
+
+def batched_output_complete(text: str, run_numbers: List[int]) -> bool:
+    """True once every expected run section has been emitted and the last one is complete"""
+    # Unstripped, so the blank line that ends the last RECOMMENDATION block is kept
+    sections = split_run_sections(text, strip=False)
+    if not all(n in sections for n in run_numbers):
+        return False
+    return structured_output_complete(sections[run_numbers[-1]])
+
+def parse_knowledge_base(kb_text: str) -> List[Any]:
+    """Split knowledge_base.txt into JSON offer objects by brace balancing.
+    
+    Entries that fail to parse are kept as raw text; if no braces are found the
+    text is split on blank lines.
+    """
+    entries: List[Any] = []
+    buf = []
+    depth = 0
+    for line in kb_text.splitlines():
+        if '{' in line:
+            depth += line.count('{')
+        if depth > 0:
+            buf.append(line)
+        if '}' in line and depth > 0:
+            depth -= line.count('}')
+            if depth == 0 and buf:
+                raw = '\n'.join(buf).strip()
+                buf = []
+                try:
+                    # Entries of a JSON array end with a separating comma
+                    entries.append(json.loads(raw.rstrip(',')))
+                except Exception:
+                    # Fallback: keep raw text entry
+                    entries.append(raw)
+    if not entries:
+        # Fallback: naive split
+        entries = [c.strip() for c in re.split(r"\n\s*\n|}\s*,?\s*{", kb_text) if c.strip()]
+    return entries
+
+# Country names used in references/inputs, mapped to KB OfferCountry codes
+COUNTRY_ALIASES = {
+    "UK": "GBR", "United Kingdom": "GBR", "Britain": "GBR", "England": "GBR", "London": "GBR",
+    "United States": "USA", "US": "USA",
+    "United Arab Emirates": "UAE", "Dubai": "UAE", "Abu Dhabi": "UAE",
+    "Italy": "ITA", "Milan": "ITA", "Rome": "ITA",
+    "France": "FRA", "Paris": "FRA",
+    "Spain": "ESP", "Madrid": "ESP",
+    "Turkey": "TUR", "Istanbul": "TUR",
+}
+
+class KnowledgeBaseIndex:
+    """Lookup tables over the knowledge base, built once per evaluator.
+    
+    Offer checks are done as set operations over whole ID lists rather than by
+    scanning the knowledge base for each ID.
+    """
+    
+    def __init__(self, entries: List[Any]):
+        self.entries = entries
+        self.offers: Dict[str, Dict[str, Any]] = {}
+        self.ids_by_country: Dict[str, set] = {}
+        self.ids_by_category: Dict[str, set] = {}
+        self.ids_by_merchant: Dict[str, set] = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or "OfferId" not in entry:
+                continue
+            offer_id = str(entry["OfferId"]).strip()
+            self.offers[offer_id] = entry
+            self.ids_by_country.setdefault(str(entry.get("OfferCountry", "")).upper(), set()).add(offer_id)
+            self.ids_by_category.setdefault(str(entry.get("OfferCategoryTrained", "")).upper(), set()).add(offer_id)
+            self.ids_by_merchant.setdefault(str(entry.get("Merchant", "")).strip(), set()).add(offer_id)
+        self.offer_ids = set(self.offers)
+        self._country_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(name) for name in sorted(
+                [c for c in self.ids_by_country if c] + list(COUNTRY_ALIASES), key=len, reverse=True
+            )) + r")\b"
+        )
+    
+    @classmethod
+    def from_file(cls, kb_path: str) -> "KnowledgeBaseIndex":
+        """Load and index the knowledge base file (empty index if unreadable)"""
+        try:
+            with open(kb_path, "r", encoding="utf-8") as f:
+                kb_text = f.read()
+        except Exception as e:
+            logger.warning(f"Failed to read knowledge base '{kb_path}': {e}")
+            kb_text = ""
+        return cls(parse_knowledge_base(kb_text) if kb_text else [])
+    
+    def unknown_ids(self, offer_ids: List[str]) -> set:
+        """IDs that do not exist in the knowledge base"""
+        return set(offer_ids) - self.offer_ids
+    
+    def ids_outside_country(self, offer_ids: List[str], country: str) -> set:
+        """Known IDs whose OfferCountry differs from country"""
+        return (set(offer_ids) & self.offer_ids) - self.ids_by_country.get(country, set())
+    
+    def ids_outside_category(self, offer_ids: List[str], category: str) -> set:
+        """Known IDs whose OfferCategoryTrained differs from category"""
+        return (set(offer_ids) & self.offer_ids) - self.ids_by_category.get(category, set())
+    
+    def countries_in(self, text: str) -> set:
+        """KB country codes mentioned in text by code or common name"""
+        return {COUNTRY_ALIASES.get(m, m) for m in self._country_pattern.findall(text)}
+    
+    def categories_in(self, text: str) -> set:
+        """KB categories written in upper case in text (e.g. 'USA TRAVEL offers')"""
+        found = {c for c in self.ids_by_category if c and re.search(r"\b" + re.escape(c) + r"\b", text)}
+        # CAR RENTAL should not also count as a bare RENTAL/CAR category mention
+        return {c for c in found if not any(c != other and c in other for other in found)}
+    
+    def merchants_in(self, text: str) -> set:
+        """Merchant names mentioned in text (case-insensitive)"""
+        lowered = text.lower()
+        return {m for m in self.ids_by_merchant if len(m) > 2 and m.lower() in lowered}
+
+_FORBID_OFFERS_PATTERN = re.compile(
+    r"\b(?:do not (?:show|share|return) (?:any )?offers|return no offers|(?:say|respond that|reply that) no offers)\b",
+    re.IGNORECASE
+)
+_CAP_PATTERN = re.compile(r"\b(?:cap|max|up to)\s*(\d+)\b", re.IGNORECASE)
+_EXCLUDE_PATTERN = re.compile(r"\b(?:exclud\w*|do not include|do not show)\b[^;.\[]*?\[([\d,\s]+)\]", re.IGNORECASE)
+# A clause stating a condition ("If the user's country is not UAE, ...") makes the expected behaviour depend
+# on context the rules cannot see
+_CONDITIONAL_CLAUSE_PATTERN = re.compile(r"(?:if|unless|when|whenever)\b", re.IGNORECASE)
+
+@dataclass
+class ReferenceConstraints:
+    """Mechanically checkable requirements extracted from a reference behaviour"""
+    offers_forbidden: bool
+    cap: Optional[int]
+    excluded_ids: set
+    countries: set
+    categories: set
+    conditional: bool = False  # Constraints only apply under a condition, so they never decide a run
+
+def parse_reference_constraints(reference: str, kb_index: KnowledgeBaseIndex) -> ReferenceConstraints:
+    """Extract offer constraints such as 'no offers shown', 'cap 5' or 'USA TRAVEL'"""
+    clauses = [c.strip() for c in re.split(r"[;.]", reference) if c.strip()]
+    offers_forbidden = bool(_FORBID_OFFERS_PATTERN.search(reference)) or any(
+        re.match(r"no offers\b", clause, re.IGNORECASE) for clause in clauses
+    )
+    caps = [int(n) for n in _CAP_PATTERN.findall(reference)]
+    excluded_ids = {oid.strip() for group in _EXCLUDE_PATTERN.findall(reference) for oid in group.split(",") if oid.strip()}
+    return ReferenceConstraints(
+        offers_forbidden=offers_forbidden,
+        cap=min(caps) if caps else None,
+        excluded_ids=excluded_ids,
+        countries=kb_index.countries_in(reference),
+        categories=kb_index.categories_in(reference),
+        conditional=any(_CONDITIONAL_CLAUSE_PATTERN.match(clause) for clause in clauses)
+    )
+
+@dataclass
+class RuleCheckResult:
+    """Findings of the deterministic pre-judge for a single run"""
+    findings: List[str]
+    violations: List[str]
+    verdict: Optional[str] = None  # Set only when the rules decide the run with certainty
+
+# HTTP statuses of a server that does not support streamed completions
+_STREAMING_UNSUPPORTED_STATUS = (400, 404, 405, 415, 422, 501)
+
+# End-of-stream marker passed between streaming pipeline stages
+_STREAM_END = object()
+
+RESULT_CSV_FIELDS = [
+    'test_id', 'run_number', 'timestamp', 'evaluation', 'factual_accuracy', 'completeness', 
+    'order_sequence', 'relevance', 'overall_quality', 'average_score',
+    'processing_time', 'input', 'reference_output', 'actual_output',
+    'rag_verification', 'reasoning', 'recommendation', 'success'
+]
+
+def reference_type(constraints: ReferenceConstraints) -> str:
+    """Coarse kind of expected behaviour, used to stratify samples"""
+    if constraints.offers_forbidden:
+        return "no_offers"
+    if constraints.cap is not None or constraints.categories or constraints.countries:
+        return "offers"
+    return "other"
+
+def wilson_interval(proportion: float, n: int, confidence: float = 0.95,
+                    population: Optional[int] = None) -> Tuple[float, float]:
+    """Wilson score interval for a proportion estimated from n sampled runs.
+    
+    With population given, the finite population correction is applied: a sample
+    of every run has no sampling error.
+    """
+    if n <= 0:
+        return 0.0, 1.0
+    if population is not None and n >= population:
+        return proportion, proportion
+    if population is not None and population > 1:
+        n = n * (population - 1) / (population - n)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    denominator = 1 + z * z / n
+    center = (proportion + z * z / (2 * n)) / denominator
+    half_width = z * ((proportion * (1 - proportion) / n + z * z / (4 * n * n)) ** 0.5) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def stratified_bootstrap_interval(values: Dict[str, List[float]], weights: Dict[str, float],
+                                  confidence: float = 0.95, samples: int = 2000,
+                                  rng: Optional[random.Random] = None) -> Tuple[float, float]:
+    """Percentile bootstrap interval of a stratum-weighted mean, resampling within each stratum"""
+    rng = rng or random.Random()
+    strata = [stratum for stratum, stratum_values in values.items() if stratum_values]
+    if not strata:
+        return 0.0, 0.0
+    total_weight = sum(weights[stratum] for stratum in strata)
+    estimates = []
+    for _ in range(samples):
+        estimate = 0.0
+        for stratum in strata:
+            resampled = rng.choices(values[stratum], k=len(values[stratum]))
+            estimate += weights[stratum] / total_weight * sum(resampled) / len(resampled)
+        estimates.append(estimate)
+    estimates.sort()
+    tail = (1 - confidence) / 2
+    return estimates[int(tail * (samples - 1))], estimates[int((1 - tail) * (samples - 1))]
+
+def iter_test_case_records(lines: Iterable[Tuple[int, str]]) -> Iterator[Tuple[TestCase, int, Optional[int]]]:
+    """Parse user test data lines into (TestCase, start, end) records, one test case at a time.
+    
+    lines yields (byte offset, line) pairs. start and end delimit the bytes of each
+    test case, from its "Test Case" line up to the next one; end is None for the
+    last test case, which extends to the end of the input. Test cases without runs
+    are skipped.
+    
+    The parser is a state machine over the lines: SEEK -> TEST_ID -> INPUT_LABEL
+    [-> INPUT] -> REFERENCE_LABEL [-> REFERENCE] -> RUNS, then per run RUN_BLANK ->
+    TIMESTAMP -> RESPONSE (multi-line, until the next "Run N" or "Test Case").
+    """
+    state = "SEEK"
+    start = 0
+    test_id = input_text = reference_output = timestamp = ""
+    runs: List[TestRun] = []
+    run_number = 0
+    response_lines: List[str] = []
+    
+    for offset, raw_line in lines:
+        line = raw_line.strip()
+        # A line that ends a state without belonging to it is handed on to the next state
+        while True:
+            if state == "SEEK":
+                if line == "Test Case":
+                    state, start = "TEST_ID", offset
+            elif state == "TEST_ID":
+                test_id, input_text, reference_output, runs = line, "", "", []
+                state = "INPUT_LABEL"
+            elif state == "INPUT_LABEL":
+                state = "INPUT" if line == "Input" else "REFERENCE_LABEL"
+                if state == "REFERENCE_LABEL":
+                    continue
+            elif state == "INPUT":
+                input_text, state = line, "REFERENCE_LABEL"
+            elif state == "REFERENCE_LABEL":
+                state = "REFERENCE" if line == "Reference" else "RUNS"
+                if state == "RUNS":
+                    continue
+            elif state == "REFERENCE":
+                reference_output, state = line, "RUNS"
+            elif state == "RUNS":
+                if line.startswith("Run "):
+                    try:
+                        run_number = int(line.split()[1])
+                        state = "RUN_BLANK"
+                    except (ValueError, IndexError):
+                        pass
+                elif line == "Test Case":
+                    if runs:
+                        yield TestCase(test_id=test_id, input_text=input_text, reference_output=reference_output, runs=runs), start, offset
+                    state = "SEEK"
+                    continue
+            elif state == "RUN_BLANK":
+                # An empty line may separate the run header from its timestamp
+                state = "TIMESTAMP"
+                if line:
+                    continue
+            elif state == "TIMESTAMP":
+                timestamp, response_lines, state = line, [], "RESPONSE"
+            elif state == "RESPONSE":
+                if line.startswith("Run ") or line == "Test Case":
+                    runs.append(TestRun(run_number=run_number, timestamp=timestamp, response=" ".join(response_lines)))
+                    state = "RUNS"
+                    continue
+                if line:
+                    response_lines.append(line)
+            break
+    
+    # End of input: close the run being read, if any
+    if state in ("RUN_BLANK", "TIMESTAMP"):
+        runs.append(TestRun(run_number=run_number, timestamp="", response=""))
+    elif state == "RESPONSE":
+        runs.append(TestRun(run_number=run_number, timestamp=timestamp, response=" ".join(response_lines)))
+    if state in ("RUNS", "RUN_BLANK", "TIMESTAMP", "RESPONSE") and runs:
+        yield TestCase(test_id=test_id, input_text=input_text, reference_output=reference_output, runs=runs), start, None
+
+# Test suite formats recognized by file extension; anything else is the scraped dashboard text export
+TEST_DATA_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+def test_data_format(file_path: str) -> str:
+    """"jsonl", "csv" or "text", from the test data file's extension"""
+    return TEST_DATA_FORMATS.get(Path(file_path).suffix.lower(), "text")
+
+# Bumped whenever the cache layout changes; parser changes are caught by test_data_parser_fingerprint
+TEST_DATA_CACHE_VERSION = 1
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@contextmanager
+def paused_gc():
+    """Suspend the cyclic garbage collector while building many small, acyclic objects"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _record_field(record: Dict[str, Any], *names: str) -> Any:
+    """First non-empty value among alternative field names of a suite record"""
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return ""
+
+def _record_response(value: Any) -> str:
+    """Responses may be given as structured JSON; TestRun keeps them as text"""
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def _record_run(record: Dict[str, Any], default_number: int) -> TestRun:
+    run_number = _record_field(record, "run_number", "run")
+    run_number = int(run_number) if run_number != "" else default_number
+    timestamp = str(_record_field(record, "timestamp"))
+    response = _record_field(record, "response", "actual_output", "output")
+    if isinstance(response, str):
+        return TestRun(run_number=run_number, timestamp=timestamp, response=response)
+    # A structured response was decoded along with its record; keep it instead of parsing its text again
+    return TestRun.from_parsed(run_number, timestamp, _record_response(response),
+                               response if isinstance(response, dict) else None)
+
+def group_suite_records(records: Iterable[Tuple[Dict[str, Any], int]]) -> Iterator[Tuple[TestCase, int, Optional[int]]]:
+    """Build (TestCase, start, end) records from structured suite records in one pass.
+    
+    A record holding a "runs" list is a whole test case; any other record is one
+    run, and consecutive run records with the same test_id form one test case.
+    start is the byte offset of a test case's first record and end the offset of
+    the next test case (None for the last one). A record without a test_id raises
+    ValueError rather than being merged into its neighbours.
+    """
+    current: Optional[TestCase] = None
+    start = 0
+    for record, offset in records:
+        test_id = str(_record_field(record, "test_id", "id"))
+        if not test_id:
+            raise ValueError(f"Test suite record at byte {offset} has no test_id")
+        if current is not None and (test_id != current.test_id or "runs" in record):
+            yield current, start, offset
+            current = None
+        if current is None:
+            current = TestCase(
+                test_id=test_id,
+                input_text=str(_record_field(record, "input", "input_text")),
+                reference_output=str(_record_field(record, "reference", "reference_output", "expected_output")),
+                runs=[]
+            )
+            start = offset
+        runs = record.get("runs")
+        if isinstance(runs, str):
+            runs = json.loads(runs) if runs.strip() else []
+        if runs is not None:
+            current.runs.extend(_record_run(run, number) for number, run in enumerate(runs, 1))
+        else:
+            current.runs.append(_record_run(record, len(current.runs) + 1))
+    if current is not None:
+        yield current, start, None
+
+def iter_jsonl_test_case_records(lines: Iterable[Tuple[int, str]]) -> Iterator[Tuple[TestCase, int, Optional[int]]]:
+    """Parse a JSONL test suite (one run or one test case per line)"""
+    return group_suite_records((json.loads(line), offset) for offset, line in lines if line.strip())
+
+def iter_csv_test_case_records(lines: Iterable[Tuple[int, str]],
+                               fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[TestCase, int, Optional[int]]]:
+    """Parse a CSV test suite: one run per row, or one test case per row with its runs as a JSON "runs" column.
+    
+    The first row is the header unless fieldnames are given (when re-reading a slice).
+    """
+    import csv
+    
+    row_start = {"offset": None}
+    
+    def text_lines():
+        for offset, line in lines:
+            # Quoted fields may span lines; a row starts at the first line the reader pulls for it
+            if row_start["offset"] is None:
+                row_start["offset"] = offset
+            yield line
+    
+    def rows():
+        reader = csv.DictReader(text_lines(), fieldnames=fieldnames)
+        if not reader.fieldnames:
+            return
+        while True:
+            row_start["offset"] = None
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            yield row, row_start["offset"]
+    
+    return group_suite_records(rows())
+
+def iter_suite_records(file_format: str, lines: Iterable[Tuple[int, str]],
+                       fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[TestCase, int, Optional[int]]]:
+    """(TestCase, start, end) records of a test suite in the given format"""
+    if file_format == "jsonl":
+        return iter_jsonl_test_case_records(lines)
+    if file_format == "csv":
+        return iter_csv_test_case_records(lines, fieldnames)
+    return iter_test_case_records(lines)
+
+def iter_offset_lines(lines: Iterable[bytes], start: int = 0) -> Iterator[Tuple[int, str]]:
+    """Decode UTF-8 byte lines, pairing each with its byte offset.
+    
+    A byte order mark at the start of the file (as saved by spreadsheet tools) is dropped
+    from the text but still counted in the offsets.
+    """
+    offset = start
+    for raw_line in lines:
+        yield offset, raw_line.decode("utf-8-sig" if offset == 0 else "utf-8")
+        offset += len(raw_line)
+
+@lru_cache(maxsize=None)
+def test_data_parser_fingerprint() -> str:
+    """Hash of the source of the code that turns a test data file into TestCases.
+    
+    Part of the parsed-suite cache key: the cache holds parse_actual_output results
+    and parsed test cases, so an edit to any of these parsers invalidates it.
+    Reading the source takes ~0.1s, so it is computed once per process.
+    """
+    import inspect
+    
+    parsers = (TestRun, parse_actual_output, iter_offset_lines, iter_test_case_records,
+               iter_jsonl_test_case_records, iter_csv_test_case_records, group_suite_records,
+               _record_field, _record_run, _record_response)
+    digest = hashlib.sha256(str(TEST_DATA_CACHE_VERSION).encode("utf-8"))
+    for parser in parsers:
+        try:
+            digest.update(inspect.getsource(parser).encode("utf-8"))
+        except (OSError, TypeError):
+            # No source on disk (e.g. a bytecode-only install): fall back to the compiled code
+            code = getattr(parser, "__code__", None)
+            digest.update(code.co_code if code is not None else parser.__qualname__.encode("utf-8"))
+    return digest.hexdigest()
+
+def in_shard(test_id: str, shard_index: int, shard_count: int) -> bool:
+    """Whether test_id belongs to shard shard_index (1-based) out of shard_count, by a stable hash"""
+    return int(hashlib.sha256(test_id.encode("utf-8")).hexdigest()[:8], 16) % shard_count == shard_index - 1
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """Parse a 1-based "i/n" shard spec"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"Invalid shard '{spec}': expected i/n with 1 <= i <= n")
+    return int(match.group(1)), int(match.group(2))
+
+def shard_test_cases(test_cases: List[TestCase], shard_index: int, shard_count: int) -> List[TestCase]:
+    """Test cases of shard shard_index (1-based) out of shard_count, by a stable hash of test_id"""
+    return [test_case for test_case in test_cases if in_shard(test_case.test_id, shard_index, shard_count)]
+
+@dataclass
+class Backend:
+    """One LM Studio server in the judge backend pool"""
+    base_url: str
+    client: Any
+    weight: float = 1.0
+    max_concurrency: int = 1
+    outstanding: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    ejections: int = 0
+    total_latency: float = 0.0
+    completion_tokens: int = 0
+    first_request_at: Optional[float] = None
+    last_response_at: Optional[float] = None
+    probing: bool = False  # A thread is health-checking this ejected backend
+    streaming: bool = True  # Cleared when the server rejects stream=True but serves the plain request
+
+class BackendPool:
+    """Dispatch judge requests across LM Studio backends.
+    
+    Requests go to the healthy backend with the fewest outstanding requests
+    relative to its weight, never exceeding its max_concurrency. Backends that
+    time out or fail a health check are ejected for eject_seconds and only
+    re-admitted after passing a health check.
+    """
+    
+    def __init__(self, backends: List[Backend], eject_seconds: float = 30.0,
+                 health_check: Optional[Callable[[str], bool]] = None):
+        for backend in backends:
+            if backend.weight <= 0:
+                raise ValueError(f"Backend {backend.base_url}: weight must be positive, got {backend.weight}")
+            if backend.max_concurrency < 1:
+                raise ValueError(f"Backend {backend.base_url}: max_concurrency must be at least 1, got {backend.max_concurrency}")
+        self.backends = backends
+        self.eject_seconds = eject_seconds
+        self.health_check = health_check
+        self._condition = threading.Condition()
+    
+    def eject(self, backend: Backend, reason: str):
+        """Take a backend out of rotation for eject_seconds"""
+        with self._condition:
+            backend.ejected_until = time.time() + self.eject_seconds
+            backend.ejections += 1
+        logger.warning(f"Backend {backend.base_url} ejected for {self.eject_seconds:.0f}s: {reason}")
+    
+    def _readmit_expired(self):
+        """Health-check backends whose ejection has expired (called without the lock held).
+        
+        Each backend is claimed under the lock first, so concurrent callers never
+        probe the same backend at once or count its failed check twice.
+        """
+        with self._condition:
+            now = time.time()
+            expired = [b for b in self.backends if 0 < b.ejected_until <= now and not b.probing]
+            for backend in expired:
+                backend.probing = True
+        for backend in expired:
+            try:
+                healthy = self.health_check is None or self.health_check(backend.base_url)
+            except Exception:
+                healthy = False
+            if healthy:
+                with self._condition:
+                    backend.ejected_until = 0.0
+                    backend.probing = False
+                    self._condition.notify_all()
+                logger.info(f"Backend {backend.base_url} re-admitted")
+            else:
+                with self._condition:
+                    backend.probing = False
+                    self.eject(backend, "health check failed")
+    
+    def acquire(self, timeout: float, avoid: Optional[str] = None) -> Backend:
+        """Reserve a slot on the least loaded healthy backend, waiting up to timeout seconds
+        
+        A backend whose base_url equals avoid is only used when no other one has capacity.
+        """
+        deadline = time.time() + timeout
+        while True:
+            self._readmit_expired()
+            with self._condition:
+                now = time.time()
+                candidates = [b for b in self.backends if b.ejected_until <= now and b.outstanding < b.max_concurrency]
+                if candidates:
+                    candidates = [b for b in candidates if b.base_url != avoid] or candidates
+                    backend = min(candidates, key=lambda b: (b.outstanding + 1) / b.weight)
+                    backend.outstanding += 1
+                    backend.requests += 1
+                    if backend.first_request_at is None:
+                        backend.first_request_at = now
+                    return backend
+                if now >= deadline:
+                    raise ConnectionError("No healthy LM Studio backend available")
+                # Wake up when a slot is released or the next ejection expires
+                next_expiry = min((b.ejected_until for b in self.backends if b.ejected_until > now), default=deadline)
+                self._condition.wait(timeout=max(0.05, min(deadline, next_expiry) - now))
+    
+    def release(self, backend: Backend, latency: float, success: bool):
+        """Return a slot and record the request outcome"""
+        with self._condition:
+            backend.outstanding -= 1
+            backend.total_latency += latency
+            backend.last_response_at = time.time()
+            if not success:
+                backend.failures += 1
+            self._condition.notify_all()
+    
+    @contextmanager
+    def lease(self, timeout: float, avoid: Optional[str] = None):
+        """Hold a backend for one request; timeouts and connection errors eject it"""
+        backend = self.acquire(timeout, avoid)
+        start_time = time.time()
+        success = False
+        try:
+            yield backend
+            success = True
+        except (APITimeoutError, APIConnectionError) as e:
+            self.eject(backend, f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.release(backend, time.time() - start_time, success)
+    
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-backend request counts, latency and throughput"""
+        rows = []
+        for backend in self.backends:
+            active = (backend.last_response_at or 0) - (backend.first_request_at or 0)
+            completed = backend.requests - backend.outstanding - backend.failures
+            rows.append({
+                "base_url": backend.base_url,
+                "weight": backend.weight,
+                "max_concurrency": backend.max_concurrency,
+                "requests": backend.requests,
+                "failures": backend.failures,
+                "ejections": backend.ejections,
+                "avg_latency": backend.total_latency / (backend.requests - backend.outstanding) if backend.requests > backend.outstanding else 0.0,
+                "requests_per_minute": completed / active * 60 if active > 0 else 0.0,
+                "tokens_per_second": backend.completion_tokens / active if active > 0 else 0.0
+            })
+        return rows
+
+class EvaluationJournal:
+    """Crash-safe, append-only JSONL journal of completed run evaluations.
+    
+    Every record is flushed to the OS immediately, which survives a crash of the
+    evaluator; fsync (surviving power loss or a sleeping laptop) is batched every
+    fsync_every records or fsync_interval seconds.
+    """
+    
+    def __init__(self, path: str, fsync_every: int = 10, fsync_interval: float = 5.0, truncate: bool = False):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        if not truncate:
+            self._drop_torn_tail(path)
+        self._file = open(path, "w" if truncate else "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.time()
+    
+    @staticmethod
+    def _drop_torn_tail(path: str):
+        """Cut a partial last line left by a crash, so the next record starts on a line of its own"""
+        try:
+            with open(path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                # Search backwards for the end of the last complete record
+                end = size
+                while end > 0:
+                    start = max(0, end - 65536)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline != -1:
+                        end = start + newline + 1
+                        break
+                    end = start
+                logger.warning(f"Dropping a torn last record ({size - end} bytes) from journal {path}")
+                f.truncate(end)
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def run_identity(test_id: str, run_number: int, timestamp: str, content_hash: str) -> tuple:
+        """Key of a journaled verdict; the content hash keeps verdicts of edited runs from being restored"""
+        return (str(test_id), int(run_number), timestamp, content_hash)
+    
+    def append(self, result: RunEvaluationResult):
+        line = json.dumps(result.to_dict(), ensure_ascii=False)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+    
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+    
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+    
+    @classmethod
+    def load(cls, path: str) -> Dict[tuple, Dict[str, Any]]:
+        """Read journaled verdicts by run identity; a torn last line from a crash is ignored"""
+        records: Dict[tuple, Dict[str, Any]] = {}
+        if not Path(path).exists():
+            return records
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable journal line {line_number} in {path}")
+                    continue
+                records[cls.run_identity(record["test_id"], record["run_number"], record["timestamp"],
+                                         record.get("content_hash", ""))] = record
+        return records
+
+class WorkQueue:
+    """SQLite work queue of judge jobs shared by a coordinator and workers.
+    
+    Workers on any node that shares the database file claim jobs under a lease;
+    a job whose lease expires (crashed or stalled worker) can be claimed again.
+    Results are only accepted from the current lease holder. The database uses
+    SQLite's rollback journal rather than WAL so it also works on shared filesystems.
+    """
+    
+    def __init__(self, path: str, lease_seconds: float = 600.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                priority REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                updated_at REAL
+            )""")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation keeps the queue safe to use from threads
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 60000")
+        return conn
+    
+    def enqueue(self, jobs: List[Dict[str, Any]]) -> int:
+        """Add jobs ({"job_id", "payload", "priority"}); changed payloads are reset to pending.
+        
+        Returns the number of jobs that are new or were reset.
+        """
+        added = 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job in jobs:
+                payload = json.dumps(job["payload"], ensure_ascii=False, sort_keys=True)
+                row = conn.execute("SELECT payload FROM jobs WHERE job_id = ?", (job["job_id"],)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO jobs (job_id, payload, priority, updated_at) VALUES (?, ?, ?, ?)",
+                                 (job["job_id"], payload, job.get("priority", 0.0), time.time()))
+                    added += 1
+                elif row[0] != payload:
+                    conn.execute("""UPDATE jobs SET payload = ?, priority = ?, status = 'pending', lease_owner = NULL,
+                                    lease_expires = NULL, attempts = 0, result = NULL, updated_at = ? WHERE job_id = ?""",
+                                 (payload, job.get("priority", 0.0), time.time(), job["job_id"]))
+                    added += 1
+            # Tells workers that a coordinator has loaded the queue
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('enqueued_at', ?)", (str(time.time()),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return added
+    
+    def enqueued_at(self) -> Optional[float]:
+        """When a coordinator last loaded jobs into the queue, or None if none has yet"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'enqueued_at'").fetchone()
+            return float(row[0]) if row else None
+        finally:
+            conn.close()
+    
+    def claim(self, owner: str, limit: int = 1) -> List[Tuple[str, Dict[str, Any]]]:
+        """Lease up to limit pending (or lease-expired) jobs, highest priority first"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("""SELECT job_id, payload FROM jobs
+                                   WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                                   ORDER BY priority DESC, job_id LIMIT ?""", (now, limit)).fetchall()
+            for job_id, _ in rows:
+                conn.execute("""UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                attempts = attempts + 1, updated_at = ? WHERE job_id = ?""",
+                             (owner, now + self.lease_seconds, now, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [(job_id, json.loads(payload)) for job_id, payload in rows]
+    
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any], retry: bool = False) -> bool:
+        """Store a result (or return the job to the queue when retry); False if the lease was lost"""
+        conn = self._connect()
+        try:
+            if retry:
+                cursor = conn.execute("""UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL,
+                                         result = ?, updated_at = ? WHERE job_id = ? AND status = 'leased' AND lease_owner = ?""",
+                                      (json.dumps(result, ensure_ascii=False), time.time(), job_id, owner))
+            else:
+                cursor = conn.execute("""UPDATE jobs SET status = 'done', lease_expires = NULL, result = ?, updated_at = ?
+                                         WHERE job_id = ? AND status = 'leased' AND lease_owner = ?""",
+                                      (json.dumps(result, ensure_ascii=False), time.time(), job_id, owner))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+    
+    def renew(self, job_ids: List[str], owner: str) -> int:
+        """Extend the leases this owner still holds on job_ids; returns how many were renewed"""
+        conn = self._connect()
+        try:
+            renewed = 0
+            for job_id in job_ids:
+                cursor = conn.execute("""UPDATE jobs SET lease_expires = ?, updated_at = ?
+                                         WHERE job_id = ? AND status = 'leased' AND lease_owner = ?""",
+                                      (time.time() + self.lease_seconds, time.time(), job_id, owner))
+                renewed += cursor.rowcount
+            return renewed
+        finally:
+            conn.close()
+    
+    def attempts(self, job_id: str) -> int:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            conn.close()
+    
+    def done_ids(self) -> set:
+        conn = self._connect()
+        try:
+            return {row[0] for row in conn.execute("SELECT job_id FROM jobs WHERE status = 'done'")}
+        finally:
+            conn.close()
+    
+    def results(self) -> Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(payload, result) of every finished job by job_id"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT job_id, payload, result FROM jobs WHERE status = 'done'").fetchall()
+        finally:
+            conn.close()
+        return {job_id: (json.loads(payload), json.loads(result)) for job_id, payload, result in rows}
+
 class LMStudioEvaluator:
     """Main evaluator class for LM Studio integration"""
     
@@ -115,9 +1344,33 @@ class LMStudioEvaluator:
         """Initialize the evaluator with configuration"""
         self.config = self._load_config(config_path)
         self.client = self._initialize_client()
+        self.backend_pool = self._initialize_backend_pool()
         self.prompt_template = self._load_prompt_template()
+        self.judge_system_prompt = self._build_judge_system_prompt()
         self.evaluation_timestamp = datetime.now()
         self.version_string = self._generate_version_string()
+        self.dedup_stats = {"total_runs": 0, "unique_runs": 0, "llm_calls_saved": 0}
+        self._kb_index: Optional[KnowledgeBaseIndex] = None
+        self._kb_lock = threading.Lock()
+        hedging = self.config["evaluation"].get("hedging", {})
+        self._judge_latencies = deque(maxlen=int(hedging.get("window", 100)))
+        self._hedge_lock = threading.Lock()
+        self.hedge_stats = {"judge_calls": 0, "hedged": 0, "hedge_wins": 0, "time_saved": 0.0}
+        self._cascade_lock = threading.Lock()
+        self.cascade_stats: Dict[str, Any] = {"judged": 0, "escalated": 0, "reasons": {}, "cheap_seconds": 0.0, "heavy_seconds": 0.0}
+        self._record_lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._journal: Optional[EvaluationJournal] = None
+        self.schedule_stats: Dict[str, Any] = {}
+        # Baseline file and reused/judged unique runs of an incremental evaluation
+        self.incremental_stats: Dict[str, Any] = {}
+        # Estimate and confidence intervals of a sampled evaluation
+        self.sampling_stats: Dict[str, Any] = {}
+        # Running totals of the last streaming evaluation
+        self.stream_totals: Dict[str, Any] = {}
+        # Appended to output file names, e.g. "_shard1of4" when evaluating one shard
+        self.output_suffix = ""
+        self._inflight_lock = threading.Lock()
         
         # Create archive folder if versioning is enabled
         if self.config["evaluation"]["versioning"]["enabled"]:
@@ -140,6 +1393,11 @@ class LMStudioEvaluator:
         name, ext = os.path.splitext(base_filename)
         return f"{name}_{self.version_string}{ext}"
     
+    def _suffixed(self, filename: str) -> str:
+        """Apply output_suffix to a file name (evaluation_results.json -> evaluation_results_shard1of4.json)"""
+        name, ext = os.path.splitext(filename)
+        return f"{name}{self.output_suffix}{ext}"
+    
     def _get_archive_path(self, filename: str) -> str:
         """Get path in archive folder"""
         if self.config["evaluation"]["versioning"]["enabled"]:
@@ -222,6 +1480,51 @@ class LMStudioEvaluator:
             logger.error(f"Failed to initialize LM Studio client: {e}")
             raise
     
+    def _initialize_backend_pool(self) -> BackendPool:
+        """Build the judge backend pool from lm_studio.backends (or the single base_url)"""
+        lm_config = self.config["lm_studio"]
+        backend_configs = lm_config.get("backends") or []
+        transport = self.config.get("transport", {})
+        if transport.get("mode", "live") == "replay":
+            # Serve judge requests from recordings via a local OpenAI-compatible stub
+            from mock_lm_studio_server import MockLMStudioServer
+            recording_file = transport.get("recording_file", "judge_recordings.jsonl")
+            self.mock_server = MockLMStudioServer(
+                port=0,
+                model_name=lm_config["model_name"],
+                recordings_file=recording_file if Path(recording_file).exists() else None,
+                latency=transport.get("replay_latency", "recorded"),
+                seed=transport.get("seed")
+            ).start()
+            logger.info(f"Replaying {len(self.mock_server.store)} recorded judge responses from {self.mock_server.base_url}")
+            backend_configs = [{"base_url": self.mock_server.base_url,
+                                "max_concurrency": max(1, int(self.config["evaluation"].get("max_concurrency", 1)))}]
+        if not backend_configs:
+            backends = [Backend(
+                base_url=lm_config["base_url"],
+                client=self.client,
+                max_concurrency=max(1, int(self.config["evaluation"].get("max_concurrency", 1)))
+            )]
+        else:
+            backends = [
+                Backend(
+                    base_url=backend_config["base_url"],
+                    client=OpenAI(
+                        base_url=backend_config["base_url"],
+                        api_key=backend_config.get("api_key") or lm_config["api_key"] or "not-needed"
+                    ),
+                    weight=float(backend_config.get("weight", 1.0)),
+                    max_concurrency=int(backend_config.get("max_concurrency", 1))
+                )
+                for backend_config in backend_configs
+            ]
+            logger.info(f"Judge backend pool: {', '.join(b.base_url for b in backends)}")
+        return BackendPool(
+            backends,
+            eject_seconds=float(lm_config.get("eject_seconds", 30)),
+            health_check=self._check_server_health
+        )
+    
     def _load_prompt_template(self) -> str:
         """Load the evaluation prompt template"""
         try:
@@ -235,32 +1538,234 @@ class LMStudioEvaluator:
             logger.error(f"System prompt file {prompt_file} not found")
             raise
     
-    def _check_server_health(self) -> bool:
-        """Check if LM Studio server is responding"""
+    def _build_judge_system_prompt(self) -> str:
+        """Build the judge system message once so every request shares the same prefix"""
+        system_prompt = self.prompt_template
+        if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
+            system_prompt += "\n\nIMPORTANT: This is a fresh evaluation. Ignore any previous chat history and evaluate this specific case independently using current knowledge base citations."
+        if self._pre_retrieval_enabled():
+            system_prompt += "\n\nThe knowledge base search has already been run for you and its citations are included in the evaluation request. Do NOT call any tools; use those citations for RAG verification."
+        if self.config["evaluation"].get("structured_output", False):
+            system_prompt += ("\n\nWhen a JSON response format is requested, return a single JSON object instead of the text format: "
+                              "\"evaluation\" (CORRECT/PARTIAL/INCORRECT), \"scores\" with integer factual_accuracy, completeness, "
+                              "order_sequence, relevance and overall_quality, and the \"rag_verification\", \"reasoning\" and "
+                              "\"recommendation\" sections as strings.")
+        return system_prompt
+    
+    def _check_server_health(self, base_url: Optional[str] = None) -> bool:
+        """Check if LM Studio server is responding
+        
+        Without a base_url every pooled backend is checked, unhealthy ones are
+        ejected, and the result is True when at least one backend is healthy.
+        """
+        if base_url is None:
+            healthy = False
+            for backend in self.backend_pool.backends:
+                if self._check_server_health(backend.base_url):
+                    healthy = True
+                elif len(self.backend_pool.backends) > 1:
+                    self.backend_pool.eject(backend, "health check failed")
+            return healthy
         try:
-            base_url = self.config["lm_studio"]["base_url"].replace("/v1", "")
-            response = requests.get(f"{base_url}/health", timeout=5)
+            response = requests.get(f"{base_url.replace('/v1', '')}/health", timeout=5)
             if response.status_code == 200:
-                logger.info("LM Studio server is healthy")
+                logger.info(f"LM Studio server is healthy ({base_url})")
                 return True
             else:
-                logger.warning(f"LM Studio server returned status {response.status_code}")
+                logger.warning(f"LM Studio server {base_url} returned status {response.status_code}")
                 return False
         except requests.exceptions.RequestException as e:
-            logger.error(f"Cannot connect to LM Studio server: {e}")
+            logger.error(f"Cannot connect to LM Studio server {base_url}: {e}")
             return False
     
-    def _create_evaluation_prompt(self, test_case: TestCase, test_run: TestRun) -> str:
-        """Create the evaluation prompt for a specific test case run"""
-        # The system prompt is used as system message, user message contains the evaluation request
-        evaluation_request = f"""Now evaluate the following:
+    def _get_kb_index(self) -> KnowledgeBaseIndex:
+        """Load and index the knowledge base on first use"""
+        with self._kb_lock:
+            if self._kb_index is None:
+                self._kb_index = KnowledgeBaseIndex.from_file(self.config["evaluation"]["knowledge_base_file"])
+                logger.info(f"Knowledge base indexed: {len(self._kb_index.offers)} offers")
+            return self._kb_index
+    
+    def _pre_judge(self, test_case: TestCase, test_run: TestRun) -> RuleCheckResult:
+        """Check the actual output's offer IDs against the reference and knowledge base.
+        
+        Violations of the rules listed in rules.decisive decide the run as INCORRECT
+        without calling the LLM, unless the reference is conditional ("If ...", "unless",
+        "when"); everything else is only reported as findings.
+        """
+        rules_config = self.config.get("rules", {})
+        decisive = set(rules_config.get("decisive", [
+            "unknown_offer_ids", "offers_forbidden", "cap_exceeded", "excluded_ids",
+            "country_mismatch", "category_mismatch"
+        ]))
+        kb_index = self._get_kb_index()
+        offer_ids = test_run.offer_ids
+        constraints = parse_reference_constraints(test_case.reference_output, kb_index)
+        findings = []
+        violations = []
+        
+        def flag(rule: str, message: str):
+            findings.append(message)
+            if rule in decisive:
+                violations.append(message)
+        
+        if test_run.parsed_response is None:
+            findings.append("Actual output is not valid JSON; offer IDs could not be checked")
+            return RuleCheckResult(findings=findings, violations=violations)
+        
+        findings.append(f"Actual output lists {len(offer_ids)} offer ID(s): {', '.join(offer_ids) or 'none'}")
+        if len(set(offer_ids)) < len(offer_ids):
+            findings.append("Actual output repeats offer IDs")
+        
+        if kb_index.offers:
+            unknown = kb_index.unknown_ids(offer_ids)
+            if unknown:
+                flag("unknown_offer_ids", f"Offer IDs not found in knowledge base: {', '.join(sorted(unknown, key=str))}")
+        
+        if constraints.offers_forbidden:
+            if offer_ids:
+                flag("offers_forbidden", "Reference says no offers should be shown, but the output lists offers")
+            else:
+                findings.append("Reference says no offers should be shown and the output lists none")
+        
+        if constraints.cap is not None and len(offer_ids) > constraints.cap:
+            flag("cap_exceeded", f"Output lists {len(offer_ids)} offers, exceeding the cap of {constraints.cap}")
+        
+        excluded = constraints.excluded_ids & set(offer_ids)
+        if excluded:
+            flag("excluded_ids", f"Output includes offer IDs the reference excludes: {', '.join(sorted(excluded, key=str))}")
+        
+        if offer_ids and not constraints.offers_forbidden and kb_index.offers:
+            if len(constraints.countries) == 1:
+                country = next(iter(constraints.countries))
+                outside = kb_index.ids_outside_country(offer_ids, country)
+                if outside:
+                    flag("country_mismatch", f"Offer IDs outside {country}: {', '.join(sorted(outside, key=str))}")
+                else:
+                    findings.append(f"All known offer IDs are in {country}")
+            if len(constraints.categories) == 1:
+                category = next(iter(constraints.categories))
+                outside = kb_index.ids_outside_category(offer_ids, category)
+                if outside:
+                    flag("category_mismatch", f"Offer IDs outside {category}: {', '.join(sorted(outside, key=str))}")
+                else:
+                    findings.append(f"All known offer IDs are in {category}")
+        
+        if violations and constraints.conditional:
+            findings.append("Reference is conditional; rule violations are left to the judge")
+        return RuleCheckResult(
+            findings=findings,
+            violations=violations,
+            verdict="INCORRECT" if violations and not constraints.conditional else None
+        )
+    
+    def _pre_retrieval_enabled(self) -> bool:
+        """Whether citations are retrieved locally up front instead of via a tool call"""
+        return self.config["rag"]["enabled"] and self.config["rag"].get("pre_retrieval", False)
+    
+    def _build_retrieval_queries(self, test_case: TestCase, test_run: TestRun) -> Dict[str, str]:
+        """Derive knowledge base queries from the test case instead of letting the judge choose one.
+        
+        One query looks up the offer IDs in the actual output; another scopes the
+        search by the country, category and merchant terms found in the input and
+        reference.
+        """
+        kb_index = self._get_kb_index()
+        queries = {}
+        if test_run.offer_ids:
+            queries["offer_ids"] = "logic:or " + " ".join(dict.fromkeys(test_run.offer_ids))
+        
+        case_text = f"{test_case.input_text}\n{test_case.reference_output}"
+        countries = sorted(kb_index.countries_in(case_text))
+        categories = sorted(kb_index.categories_in(test_case.reference_output))
+        merchants = sorted(kb_index.merchants_in(case_text))
+        terms = countries + [word for category in categories for word in category.split() if word != "&"]
+        terms += [word for merchant in merchants for word in re.findall(r"[A-Za-z][A-Za-z0-9_]+", merchant)]
+        if terms:
+            directives = []
+            if len(countries) == 1:
+                directives.append(f"require:OfferCountry={countries[0]}")
+            if len(categories) == 1:
+                directives.append(f"require:OfferCategoryTrained={categories[0].split()[0]}")
+            queries["scope"] = " ".join(directives + ["logic:or"] + list(dict.fromkeys(terms)))
+        return queries
+    
+    def _retrieve_citations(self, queries: Dict[str, str], exclude: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Run local knowledge base searches and merge their citations by offer ID"""
+        limit = self.config["rag"].get("plugin_config", {}).get("retrievalLimit", 20)
+        citations: Dict[str, Dict[str, Any]] = {}
+        for kind, query in queries.items():
+            id_filter = set(query.split()[1:]) if kind == "offer_ids" else None
+            for citation in self._search_knowledge_base(query)["citations"]:
+                cid = str(citation["id"])
+                # ID lookups also match numbers inside offer text; keep only the exact offers
+                if id_filter is not None and cid not in id_filter:
+                    continue
+                if exclude and cid in exclude:
+                    continue
+                citations.setdefault(cid, citation)
+        return list(citations.values())[:limit]
+    
+    def _pre_retrieve_citations(self, test_case: TestCase, test_run: TestRun) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Run the local knowledge base search for a run before contacting the judge.
+        
+        Returns (case_citations, run_citations): citations scoped by the test case
+        are shared by all of its runs, the offer ID lookups are specific to the run.
+        """
+        queries = self._build_retrieval_queries(test_case, test_run)
+        case_citations = self._retrieve_citations({k: v for k, v in queries.items() if k != "offer_ids"})
+        run_citations = self._retrieve_citations(
+            {k: v for k, v in queries.items() if k == "offer_ids"},
+            exclude={str(c["id"]) for c in case_citations}
+        )
+        return case_citations, run_citations
+    
+    def _format_citations(self, citations: List[Dict[str, Any]]) -> str:
+        """Render pre-retrieved citations one JSON object per line"""
+        return "\n".join(json.dumps(c, ensure_ascii=False) for c in citations) or "(no matching knowledge base entries)"
+    
+    def _create_case_prompt(self, test_case: TestCase, case_citations: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Create the part of the evaluation request shared by every run of a test case.
+        
+        Together with the system prompt and tool schema it forms a byte-identical
+        prefix, so LM Studio's prompt cache can reuse it across runs.
+        """
+        case_prompt = f"""Now evaluate the following:
 Input: {test_case.input_text}
 Reference Behavior: {test_case.reference_output}
-Actual Output (Run {test_run.run_number}): {test_run.response}
+"""
+        if case_citations is not None:
+            case_prompt += f"""
+Knowledge base citations for this test case (pre-retrieved):
+{self._format_citations(case_citations)}
+"""
+        return case_prompt
+    
+    def _create_evaluation_prompt(self, test_case: TestCase, test_run: TestRun,
+                                  rule_check: Optional[RuleCheckResult] = None,
+                                  citations: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Create the run-specific part of the evaluation request (actual output and its checks)"""
+        return self._create_run_section(test_run, rule_check, citations) + "\nBegin evaluation:"
+    
+    def _create_run_section(self, test_run: TestRun, rule_check: Optional[RuleCheckResult] = None,
+                            citations: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Describe one actual output together with its rule findings and citations"""
+        evaluation_request = f"""Actual Output (Run {test_run.run_number}): {test_run.response}
 Timestamp: {test_run.timestamp}
-
-Begin evaluation:"""
+"""
         
+        if rule_check and rule_check.findings:
+            findings = "\n".join(f"- {finding}" for finding in rule_check.findings)
+            evaluation_request += f"""
+Rule-based pre-checks (deterministic, against the knowledge base):
+{findings}
+"""
+        
+        if citations is not None:
+            evaluation_request += f"""
+Knowledge base citations for the offer IDs in this output (pre-retrieved):
+{self._format_citations(citations)}
+"""
         return evaluation_request
     
     def _get_model_response(self, input_text: str) -> str:
@@ -296,25 +1801,7 @@ Begin evaluation:"""
             # Add RAG tools if using RAG-v1 plugin
             if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
                 # RAG-v1 plugin still needs tools parameter to trigger
-                request_params["tools"] = [
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_knowledge_base",
-                            "description": "Search the knowledge base for offer information, IDs, and factual data",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {
-                                        "type": "string",
-                                        "description": "The search query for the knowledge base"
-                                    }
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    }
-                ]
+                request_params["tools"] = [SEARCH_KNOWLEDGE_BASE_TOOL]
                 request_params["tool_choice"] = "auto"
             
             # Add timeout to prevent hanging on incomplete responses
@@ -333,54 +1820,54 @@ Begin evaluation:"""
                 logger.error(f"Error getting model response: {e}")
                 return f"Error: {e}"
     
-    def _evaluate_response(self, test_case: TestCase, test_run: TestRun) -> tuple[str, DetailedScores, str, str, str]:
+    def _build_judge_request(self, messages: list[dict], run_count: int = 1) -> dict:
+        """Prepare judge request parameters; max_tokens scales with the number of runs judged"""
+        request_params = {
+            "model": self.config["lm_studio"]["model_name"],
+            "messages": messages,
+            "temperature": 0.1,  # Lower temperature for more consistent evaluation
+            "max_tokens": self.config.get("model_parameters", {}).get("max_tokens", 5500) * run_count
+        }
+        
+        # Add RAG tools if using RAG-v1 plugin (not needed when citations are pre-retrieved)
+        if not self._pre_retrieval_enabled() and self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
+            request_params["tools"] = [SEARCH_KNOWLEDGE_BASE_TOOL]
+            request_params["tool_choice"] = "auto"
+        
+        # Batched requests keep the text format: their output holds one block per run. So do
+        # requests offering tools, as a strict schema leaves the judge no way to call them.
+        if run_count == 1 and "tools" not in request_params and self.config["evaluation"].get("structured_output", False):
+            request_params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "judge_verdict", "strict": True, "schema": JUDGE_VERDICT_SCHEMA}
+            }
+        return request_params
+    
+    def _build_judge_messages(self, test_case: TestCase, test_run: TestRun,
+                              rule_check: Optional[RuleCheckResult] = None) -> tuple[list[dict], dict]:
+        """Build the judge messages and request parameters for one run"""
+        pre_retrieval = self._pre_retrieval_enabled()
+        case_citations, run_citations = self._pre_retrieve_citations(test_case, test_run) if pre_retrieval else (None, None)
+        
+        # Create fresh messages for each evaluation to avoid chat history contamination.
+        # Stable content comes first (system prompt, then test case) and only the last
+        # message varies between runs, keeping the shared prefix cacheable.
+        messages = [
+            {"role": "system", "content": self.judge_system_prompt},
+            {"role": "user", "content": self._create_case_prompt(test_case, case_citations)},
+            {"role": "user", "content": self._create_evaluation_prompt(test_case, test_run, rule_check, run_citations)}
+        ]
+        return messages, self._build_judge_request(messages)
+    
+    def _evaluate_response(self, test_case: TestCase, test_run: TestRun,
+                           rule_check: Optional[RuleCheckResult] = None,
+                           stats: Optional[JudgeCallStats] = None) -> tuple[str, DetailedScores, str, str, str]:
         """Evaluate the model's response against expected output with detailed breakdown"""
         try:
-            evaluation_prompt = self._create_evaluation_prompt(test_case, test_run)
-            
-            # Create fresh messages for each evaluation to avoid chat history contamination
-            messages = [
-                {"role": "system", "content": self.prompt_template},
-                {"role": "user", "content": evaluation_prompt}
-            ]
-            
-            # Add explicit instruction to start fresh evaluation
-            if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
-                messages[0]["content"] += "\n\nIMPORTANT: This is a fresh evaluation. Ignore any previous chat history and evaluate this specific case independently using current knowledge base citations."
-            
-            # Prepare request parameters
-            request_params = {
-                "model": self.config["lm_studio"]["model_name"],
-                "messages": messages,
-                "temperature": 0.1,  # Lower temperature for more consistent evaluation
-                "max_tokens": self.config.get("model_parameters", {}).get("max_tokens", 5500)
-            }
-            
-            # Add RAG tools if using RAG-v1 plugin
-            if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
-                request_params["tools"] = [
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "search_knowledge_base", 
-                            "description": "Search the knowledge base for offer information, IDs, and factual data",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {
-                                        "type": "string",
-                                        "description": "The search query for the knowledge base"
-                                    }
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    }
-                ]
-                request_params["tool_choice"] = "auto"
+            messages, request_params = self._build_judge_messages(test_case, test_run, rule_check)
             
             # Tool-call handling loop: continue until model returns final content
-            evaluation_text = self._run_chat_with_tools(messages, request_params).strip()
+            evaluation_text = self._judge_with_cascade(messages, request_params, rule_check, stats)
 
             # Parse structured response
             return self._parse_structured_evaluation(evaluation_text)
@@ -390,10 +1877,82 @@ Begin evaluation:"""
             default_scores = DetailedScores(0, 0, 0, 0, 0)
             return "ERROR", default_scores, "", f"Evaluation failed: {str(e)}", "Fix technical issues"
     
-    def _parse_structured_evaluation(self, evaluation_text: str) -> tuple[str, DetailedScores, str, str, str]:
-        """Parse the structured evaluation response"""
-        import re
+    def _escalation_reason(self, evaluation_text: str, rule_check: Optional[RuleCheckResult]) -> Optional[str]:
+        """Why a cheap-tier verdict should be judged again by the heavy model (None to keep it)"""
+        cascade = self.config["evaluation"].get("cascade", {})
+        fields = extract_judge_fields(evaluation_text)
+        if not fields["evaluation"] or len(fields["scores"]) < len(_SCORE_FIELDS):
+            return "parse_failure"
+        
+        avg_score = DetailedScores(*(fields["scores"][name.lower()] for name in _SCORE_FIELDS)).weighted_average
+        band = "CORRECT" if avg_score >= 7 else "PARTIAL" if avg_score >= 4 else "INCORRECT"
+        if fields["evaluation"] != band:
+            return "score_mismatch"
+        margin = float(cascade.get("boundary_margin", 0.5))
+        if min(abs(avg_score - 4.0), abs(avg_score - 7.0)) < margin:
+            return "boundary"
+        if cascade.get("escalate_on_rule_disagreement", True) and rule_check and rule_check.violations and band != "INCORRECT":
+            return "rule_disagreement"
+        return None
+    
+    def _judge_with_cascade(self, messages: list[dict], request_params: dict,
+                            rule_check: Optional[RuleCheckResult] = None,
+                            stats: Optional[JudgeCallStats] = None) -> str:
+        """Judge with the cheap tier first and escalate unclear verdicts to the heavy model.
+        
+        With evaluation.cascade disabled this is a plain judge call. Otherwise the
+        request is first sent with the cascade's model_name / reasoning_effort /
+        max_tokens overrides; the verdict is kept unless it fails to parse, lands
+        within boundary_margin of the 4.0/7.0 category boundaries, contradicts its
+        own scores, or passes a run the rule checks flagged.
+        """
+        cascade = self.config["evaluation"].get("cascade", {})
+        if not cascade.get("enabled", False):
+            return self._run_chat_with_tools(messages, request_params, stats).strip()
+        if stats is None:
+            stats = JudgeCallStats()
         
+        cheap_params = {**request_params, "messages": list(messages)}
+        if cascade.get("model_name"):
+            cheap_params["model"] = cascade["model_name"]
+        if cascade.get("reasoning_effort"):
+            cheap_params["reasoning_effort"] = cascade["reasoning_effort"]
+        if cascade.get("max_tokens"):
+            cheap_params["max_tokens"] = int(cascade["max_tokens"])
+        
+        cheap_stats = JudgeCallStats()
+        cheap_start = time.time()
+        try:
+            evaluation_text = self._run_chat_with_tools(cheap_params["messages"], cheap_params, cheap_stats).strip()
+            reason = self._escalation_reason(evaluation_text, rule_check)
+        except Exception as e:
+            logger.warning(f"Cheap judge failed, escalating: {e}")
+            evaluation_text, reason = "", "cheap_error"
+        cheap_seconds = time.time() - cheap_start
+        
+        heavy_seconds = 0.0
+        if reason:
+            logger.info(f"Escalating to the heavy judge: {reason}")
+            heavy_start = time.time()
+            try:
+                evaluation_text = self._run_chat_with_tools(messages, request_params, stats).strip()
+            finally:
+                heavy_seconds = time.time() - heavy_start
+        stats.absorb(cheap_stats)
+        stats.cascade_tier = "heavy" if reason else "cheap"
+        stats.escalation_reason = reason
+        
+        with self._cascade_lock:
+            self.cascade_stats["judged"] += 1
+            self.cascade_stats["cheap_seconds"] += cheap_seconds
+            if reason:
+                self.cascade_stats["escalated"] += 1
+                self.cascade_stats["heavy_seconds"] += heavy_seconds
+                self.cascade_stats["reasons"][reason] = self.cascade_stats["reasons"].get(reason, 0) + 1
+        return evaluation_text
+    
+    def _parse_structured_evaluation(self, evaluation_text: str) -> tuple[str, DetailedScores, str, str, str]:
+        """Parse the structured evaluation response (JSON object or text format)"""
         # Default values
         evaluation = "INCORRECT"
         scores = DetailedScores(0, 0, 0, 0, 0)
@@ -402,35 +1961,13 @@ Begin evaluation:"""
         recommendation = ""
         
         try:
-            # Extract evaluation result
-            eval_match = re.search(r'EVALUATION_RESULT:\s*(\w+)', evaluation_text, re.IGNORECASE)
-            if eval_match:
-                evaluation = eval_match.group(1).upper()
-            
-            # Extract detailed scores
-            factual_match = re.search(r'Factual_Accuracy:\s*(\d+)', evaluation_text, re.IGNORECASE)
-            completeness_match = re.search(r'Completeness:\s*(\d+)', evaluation_text, re.IGNORECASE)
-            order_match = re.search(r'Order_Sequence:\s*(\d+)', evaluation_text, re.IGNORECASE)
-            relevance_match = re.search(r'Relevance:\s*(\d+)', evaluation_text, re.IGNORECASE)
-            overall_match = re.search(r'Overall_Quality:\s*(\d+)', evaluation_text, re.IGNORECASE)
-            
-            scores = DetailedScores(
-                factual_accuracy=int(factual_match.group(1)) if factual_match else 0,
-                completeness=int(completeness_match.group(1)) if completeness_match else 0,
-                order_sequence=int(order_match.group(1)) if order_match else 0,
-                relevance=int(relevance_match.group(1)) if relevance_match else 0,
-                overall_quality=int(overall_match.group(1)) if overall_match else 0
-            )
+            fields = extract_judge_fields(evaluation_text)
+            if fields["evaluation"]:
+                evaluation = fields["evaluation"]
+            scores = DetailedScores(*(fields["scores"].get(name.lower(), 0) for name in _SCORE_FIELDS))
             
             # Verify evaluation consistency with numerical scores
-            # Calculate weighted average manually since scores is a DetailedScores object
-            avg_score = (
-                scores.factual_accuracy * 0.60 +  # 60%
-                scores.completeness * 0.10 +       # 10%
-                scores.order_sequence * 0.10 +     # 10%
-                scores.relevance * 0.10 +          # 10%
-                scores.overall_quality * 0.10      # 10%
-            )
+            avg_score = scores.weighted_average
             if avg_score >= 7 and evaluation not in ["CORRECT"]:
                 logger.warning(f"Score {avg_score:.1f} suggests CORRECT but got {evaluation}. Adjusting to CORRECT.")
                 evaluation = "CORRECT"
@@ -441,20 +1978,9 @@ Begin evaluation:"""
                 logger.warning(f"Score {avg_score:.1f} suggests INCORRECT but got {evaluation}. Adjusting to INCORRECT.")
                 evaluation = "INCORRECT"
             
-            # Extract RAG verification section
-            rag_match = re.search(r'RAG_VERIFICATION:(.*?)REASONING:', evaluation_text, re.DOTALL | re.IGNORECASE)
-            if rag_match:
-                rag_verification = rag_match.group(1).strip()
-            
-            # Extract reasoning section
-            reasoning_match = re.search(r'REASONING:(.*?)RECOMMENDATION:', evaluation_text, re.DOTALL | re.IGNORECASE)
-            if reasoning_match:
-                reasoning = reasoning_match.group(1).strip()
-            
-            # Extract recommendation section
-            rec_match = re.search(r'RECOMMENDATION:(.*?)$', evaluation_text, re.DOTALL | re.IGNORECASE)
-            if rec_match:
-                recommendation = rec_match.group(1).strip()
+            rag_verification = fields["rag_verification"]
+            reasoning = fields["reasoning"]
+            recommendation = fields["recommendation"]
             
         except Exception as e:
             logger.warning(f"Error parsing structured evaluation: {e}")
@@ -468,333 +1994,1824 @@ Begin evaluation:"""
         
         return evaluation, scores, rag_verification, reasoning, recommendation
 
-    def _run_chat_with_tools(self, messages: list[dict], request_params: dict) -> str:
-        """Run chat, executing function tool calls locally until a final assistant message is produced.
+    def _search_knowledge_base(self, query: str) -> dict:
+        """Structured search with JSON parsing, exact field matching, AND semantics, and ranking.
 
-        This prevents infinite server loops by:
-        - Intercepting tool_calls
-        - Executing search_knowledge_base locally against knowledge_base_file
-        - Appending the tool result as a function message
-        - Repeating until the assistant returns content with finish_reason == 'stop'
+        - Parses knowledge_base.txt into JSON objects when possible
+        - Matches exact OfferId, booleans (true/false/yes/no), and keywords across key fields
+        - AND semantics for small queries, soft-AND (>=80% tokens) for larger ones
+        - Returns top 20 citations with matched tokens and a compact field summary
         """
-        import json
-        from pathlib import Path
+        import re as _re
+        import json as _json
+        entries = self._get_kb_index().entries
+        if not entries:
+            return {"citations": [], "summary": "No knowledge base available."}
 
-        # Load knowledge base once
-        kb_path = self.config["evaluation"]["knowledge_base_file"]
-        try:
-            with open(kb_path, "r", encoding="utf-8") as f:
-                kb_text = f.read()
-        except Exception as e:
-            logger.warning(f"Failed to read knowledge base '{kb_path}': {e}")
-            kb_text = ""
+        # Parse directives
+        logic_match = _re.search(r"\blogic:(and|or)\b", query, flags=_re.I)
+        logic_mode = logic_match.group(1).lower() if logic_match else "auto"
+        require_pairs = _re.findall(r"\brequire:([A-Za-z][A-Za-z0-9_]+)=([^\s]+)", query)
+        any_pairs = _re.findall(r"\bany:([A-Za-z][A-Za-z0-9_]+)=([^\s]+)", query)
 
-        def local_search_knowledge_base(query: str) -> dict:
-            """Structured search with JSON parsing, exact field matching, AND semantics, and ranking.
-
-            - Parses knowledge_base.txt into JSON objects when possible
-            - Matches exact OfferId, booleans (true/false/yes/no), and keywords across key fields
-            - AND semantics for small queries, soft-AND (>=80% tokens) for larger ones
-            - Returns top 20 citations with matched tokens and a compact field summary
-            """
-            import re as _re
-            import json as _json
-            if not kb_text:
-                return {"citations": [], "summary": "No knowledge base available."}
-
-            # Attempt to parse as multiple JSON objects by brace balancing
-            entries = []
-            buf = []
-            depth = 0
-            for line in kb_text.splitlines():
-                if '{' in line:
-                    depth += line.count('{')
-                if depth > 0:
-                    buf.append(line)
-                if '}' in line and depth > 0:
-                    depth -= line.count('}')
-                    if depth == 0 and buf:
-                        raw = '\n'.join(buf).strip()
-                        buf = []
-                        try:
-                            obj = _json.loads(raw)
-                            entries.append(obj)
-                        except Exception:
-                            # Fallback: keep raw text entry
-                            entries.append(raw)
-            if not entries:
-                # Fallback: naive split
-                entries = [c.strip() for c in _re.split(r"\n\s*\n|}\s*,?\s*{", kb_text) if c.strip()]
-
-            # Parse directives
-            logic_match = _re.search(r"\blogic:(and|or)\b", query, flags=_re.I)
-            logic_mode = logic_match.group(1).lower() if logic_match else "auto"
-            require_pairs = _re.findall(r"\brequire:([A-Za-z][A-Za-z0-9_]+)=([^\s]+)", query)
-            any_pairs = _re.findall(r"\bany:([A-Za-z][A-Za-z0-9_]+)=([^\s]+)", query)
-
-            # Tokenize query (excluding directives)
-            cleaned_query = _re.sub(r"\b(?:logic:(?:and|or)|require:[^\s]+|any:[^\s]+)\b", " ", query)
-            number_tokens = _re.findall(r"\b\d+\b", cleaned_query)
-            bool_tokens = [t.lower() for t in _re.findall(r"\b(true|false|yes|no)\b", cleaned_query, flags=_re.I)]
-            word_tokens = [w.lower() for w in _re.findall(r"[A-Za-z][A-Za-z0-9_]+", cleaned_query)]
-            # Drop noise tokens
-            noise = {"offer", "offers", "id", "ids", "offerid", "offerids"}
-            word_tokens = [w for w in word_tokens if w not in noise]
-
-            def _dedupe(seq):
-                seen = set()
-                out = []
-                for x in seq:
-                    if x not in seen:
-                        seen.add(x)
-                        out.append(x)
-                return out
-            number_tokens = _dedupe(number_tokens)
-            bool_tokens = _dedupe(bool_tokens)
-            word_tokens = _dedupe(word_tokens)
-
-            all_tokens = number_tokens + bool_tokens + word_tokens
-            and_required = len(all_tokens) <= 12
-            # For multi-ID queries, require at least one ID match (OR) plus AND/OR on others based on logic_mode
-            multi_id_mode = len(number_tokens) >= 2
-            non_id_tokens = bool_tokens + word_tokens
-            if logic_mode == "and":
-                min_required_non_id = len(non_id_tokens)
-            elif logic_mode == "or":
-                min_required_non_id = 1 if non_id_tokens else 0
+        # Tokenize query (excluding directives)
+        cleaned_query = _re.sub(r"\b(?:logic:(?:and|or)|require:[^\s]+|any:[^\s]+)\b", " ", query)
+        number_tokens = _re.findall(r"\b\d+\b", cleaned_query)
+        bool_tokens = [t.lower() for t in _re.findall(r"\b(true|false|yes|no)\b", cleaned_query, flags=_re.I)]
+        word_tokens = [w.lower() for w in _re.findall(r"[A-Za-z][A-Za-z0-9_]+", cleaned_query)]
+        # Drop noise tokens
+        noise = {"offer", "offers", "id", "ids", "offerid", "offerids"}
+        word_tokens = [w for w in word_tokens if w not in noise]
+
+        def _dedupe(seq):
+            seen = set()
+            out = []
+            for x in seq:
+                if x not in seen:
+                    seen.add(x)
+                    out.append(x)
+            return out
+        number_tokens = _dedupe(number_tokens)
+        bool_tokens = _dedupe(bool_tokens)
+        word_tokens = _dedupe(word_tokens)
+
+        all_tokens = number_tokens + bool_tokens + word_tokens
+        and_required = len(all_tokens) <= 12
+        # For multi-ID queries, require at least one ID match (OR) plus AND/OR on others based on logic_mode
+        multi_id_mode = len(number_tokens) >= 2
+        non_id_tokens = bool_tokens + word_tokens
+        if logic_mode == "and":
+            min_required_non_id = len(non_id_tokens)
+        elif logic_mode == "or":
+            min_required_non_id = 1 if non_id_tokens else 0
+        else:
+            min_required_non_id = max(0, int(len(non_id_tokens) * (0.8 if not and_required else 1.0)))
+
+        key_priority = {k.lower() for k in [
+            "OfferId", "Merchant", "OfferCategoryTrained", "OfferCountry",
+            "Keywords", "OfferDescription", "OfferDetails", "ApplicableCards"
+        ]}
+
+        # Simple synonyms for categories and locations
+        synonyms = {
+            "dining": ["dining", "food", "food & drink", "restaurant"],
+            "entertainment": ["entertainment", "theme park", "cinema", "movie"],
+            "uae": ["uae", "united arab emirates"]
+        }
+
+        def _norm_bool(val):
+            if isinstance(val, bool):
+                return 'true' if val else 'false'
+            if isinstance(val, str):
+                v = val.strip().lower()
+                if v in ('true', 'yes', 'y', '1'):
+                    return 'true'
+                if v in ('false', 'no', 'n', '0'):
+                    return 'false'
+            return None
+
+        citations = []
+        for idx, entry in enumerate(entries, start=1):
+            # Unified accessors
+            if isinstance(entry, dict):
+                entry_lower_map = {str(k).lower(): str(v).lower() for k, v in entry.items()}
+                entry_text = ' '.join(str(v) for v in entry.values())
+                entry_lower = entry_text.lower()
+                offer_id_val = str(entry.get('OfferId', '')).strip()
             else:
-                min_required_non_id = max(0, int(len(non_id_tokens) * (0.8 if not and_required else 1.0)))
-
-            key_priority = {k.lower() for k in [
-                "OfferId", "Merchant", "OfferCategoryTrained", "OfferCountry",
-                "Keywords", "OfferDescription", "OfferDetails", "ApplicableCards"
-            ]}
-
-            # Simple synonyms for categories and locations
-            synonyms = {
-                "dining": ["dining", "food", "food & drink", "restaurant"],
-                "entertainment": ["entertainment", "theme park", "cinema", "movie"],
-                "uae": ["uae", "united arab emirates"]
-            }
+                entry_lower_map = {}
+                entry_lower = entry.lower()
+                # Try to extract OfferId from raw text
+                m = _re.search(r"\bofferid\s*:\s*(\d+)\b", entry_lower)
+                offer_id_val = m.group(1) if m else ''
 
-            def _norm_bool(val):
-                if isinstance(val, bool):
-                    return 'true' if val else 'false'
-                if isinstance(val, str):
-                    v = val.strip().lower()
-                    if v in ('true', 'yes', 'y', '1'):
-                        return 'true'
-                    if v in ('false', 'no', 'n', '0'):
-                        return 'false'
-                return None
+            score = 0
+            matched = []
+            matched_id_count = 0
+
+            # OfferId exact match gets high weight
+            for n in number_tokens:
+                if offer_id_val and n == offer_id_val:
+                    score += 10
+                    matched_id_count += 1
+                    matched.append(f"OfferId={n}")
+                elif n in entry_lower:
+                    score += 1
+                    matched_id_count += 1
+                    matched.append(n)
 
-            citations = []
-            for idx, entry in enumerate(entries, start=1):
-                # Unified accessors
+            # Boolean tokens across any field
+            for b in bool_tokens:
+                found_bool = False
                 if isinstance(entry, dict):
-                    entry_lower_map = {str(k).lower(): str(v).lower() for k, v in entry.items()}
-                    entry_text = ' '.join(str(v) for v in entry.values())
-                    entry_lower = entry_text.lower()
-                    offer_id_val = str(entry.get('OfferId', '')).strip()
-                else:
-                    entry_lower_map = {}
-                    entry_lower = entry.lower()
-                    # Try to extract OfferId from raw text
-                    m = _re.search(r"\bofferid\s*:\s*(\d+)\b", entry_lower)
-                    offer_id_val = m.group(1) if m else ''
-
-                score = 0
-                matched = []
-                matched_id_count = 0
-
-                # OfferId exact match gets high weight
-                for n in number_tokens:
-                    if offer_id_val and n == offer_id_val:
-                        score += 10
-                        matched_id_count += 1
-                        matched.append(f"OfferId={n}")
-                    elif n in entry_lower:
-                        score += 1
-                        matched_id_count += 1
-                        matched.append(n)
-
-                # Boolean tokens across any field
-                for b in bool_tokens:
-                    found_bool = False
-                    if isinstance(entry, dict):
-                        for v in entry.values():
-                            nb = _norm_bool(v)
-                            if nb == b:
-                                score += 3
-                                matched.append(b)
-                                found_bool = True
+                    for v in entry.values():
+                        nb = _norm_bool(v)
+                        if nb == b:
+                            score += 3
+                            matched.append(b)
+                            found_bool = True
+                            break
+                if not found_bool and b in entry_lower:
+                    score += 1
+                    matched.append(b)
+
+            # Word tokens across key fields get priority
+            for w in word_tokens:
+                if isinstance(entry, dict):
+                    hit = False
+                    wlist = synonyms.get(w, [w])
+                    for k, v in entry_lower_map.items():
+                        for needle in wlist:
+                            if needle in v:
+                                score += 2 if k in key_priority else 1
+                                matched.append(w)
+                                hit = True
                                 break
-                    if not found_bool and b in entry_lower:
-                        score += 1
-                        matched.append(b)
-
-                # Word tokens across key fields get priority
-                for w in word_tokens:
-                    if isinstance(entry, dict):
-                        hit = False
-                        wlist = synonyms.get(w, [w])
-                        for k, v in entry_lower_map.items():
-                            for needle in wlist:
-                                if needle in v:
-                                    score += 2 if k in key_priority else 1
-                                    matched.append(w)
-                                    hit = True
-                                    break
-                        if not hit:
-                            for needle in wlist:
-                                if needle in entry_lower:
-                                    score += 1
-                                    matched.append(w)
-                                    break
-                    else:
-                        wlist = synonyms.get(w, [w])
+                    if not hit:
                         for needle in wlist:
                             if needle in entry_lower:
                                 score += 1
                                 matched.append(w)
                                 break
+                else:
+                    wlist = synonyms.get(w, [w])
+                    for needle in wlist:
+                        if needle in entry_lower:
+                            score += 1
+                            matched.append(w)
+                            break
 
-                # Field-level requires/any matches
-                def _field_contains(field: str, value: str) -> bool:
-                    fld = field.lower()
-                    val = value.lower()
-                    if isinstance(entry, dict):
-                        for k, v in entry_lower_map.items():
-                            if k == fld and val in v:
-                                return True
-                        return False
-                    return (fld in entry_lower) and (val in entry_lower)
-
-                requires_ok = True
-                for f, v in require_pairs:
-                    if not _field_contains(f, v):
-                        requires_ok = False
-                        break
-                if not requires_ok:
+            # Field-level requires/any matches
+            def _field_contains(field: str, value: str) -> bool:
+                fld = field.lower()
+                val = value.lower()
+                if isinstance(entry, dict):
+                    for k, v in entry_lower_map.items():
+                        if k == fld and val in v:
+                            return True
+                    return False
+                return (fld in entry_lower) and (val in entry_lower)
+
+            requires_ok = True
+            for f, v in require_pairs:
+                if not _field_contains(f, v):
+                    requires_ok = False
+                    break
+            if not requires_ok:
+                continue
+
+            any_ok = True
+            for f, vlist in any_pairs:
+                options = [p.strip() for p in vlist.split('|') if p.strip()]
+                if not options:
                     continue
+                if not any(_field_contains(f, opt) for opt in options):
+                    any_ok = False
+                    break
+            if not any_ok:
+                continue
 
-                any_ok = True
-                for f, vlist in any_pairs:
-                    options = [p.strip() for p in vlist.split('|') if p.strip()]
-                    if not options:
+            # Token gating
+            if len(all_tokens) > 0:
+                unique_matched_non_id = set([m.lower() for m in matched if not m.lower().startswith("offerid=") and not m.isdigit()])
+                if multi_id_mode:
+                    if matched_id_count < 1:
                         continue
-                    if not any(_field_contains(f, opt) for opt in options):
-                        any_ok = False
-                        break
-                if not any_ok:
+                    if len(unique_matched_non_id) < min_required_non_id:
+                        continue
+                else:
+                    if logic_mode == "and":
+                        min_required = len(all_tokens)
+                    elif logic_mode == "or":
+                        min_required = 1
+                    else:
+                        min_required = max(1, int(len(all_tokens) * (0.8 if not and_required else 1.0)))
+                    unique_matched_all = set([m.lower() for m in matched])
+                    if len(unique_matched_all) < min_required:
+                        continue
+
+            if score > 0:
+                fields_summary = {}
+                if isinstance(entry, dict):
+                    for key in ["OfferId", "Merchant", "OfferCategoryTrained", "OfferCountry", "Gems", "Cashback", "Indulge", "Popular"]:
+                        if key in entry:
+                            fields_summary[key] = entry[key]
+                    text_out = _json.dumps(fields_summary or entry, ensure_ascii=False)[:1200]
+                    cid = entry.get('OfferId', idx)
+                else:
+                    text_out = entry[:1200]
+                    cid = idx
+
+                citations.append({
+                    "id": cid,
+                    "score": score,
+                    "matched": sorted(set(matched)),
+                    "text": text_out
+                })
+
+        citations.sort(key=lambda c: c["score"], reverse=True)
+        return {
+            "citations": citations[:20],
+            "summary": f"Query='{query}' tokens={len(all_tokens)} results={len(citations)}"
+        }
+    
+    def _stream_chat_completion(self, client: OpenAI, request_params: dict, stats: JudgeCallStats,
+                                completion_check: Callable[[str], bool] = structured_output_complete,
+                                first_token: Optional[threading.Event] = None,
+                                cancel: Optional[threading.Event] = None,
+                                timeout: Optional[float] = None) -> tuple[str, list, str]:
+        """Stream a chat completion, assembling content and tool-call deltas incrementally.
+        
+        Generation is cancelled as soon as the structured evaluation is complete
+        (evaluation.early_stop) so the model cannot ramble until max_tokens, or
+        when cancel is set by a competing hedge request. first_token is set when
+        the first token arrives. Returns (content, tool_calls, finish_reason).
+        """
+        early_stop = self.config["evaluation"].get("early_stop", True)
+        start_time = time.time()
+        first_token_time = None
+        content_parts: List[str] = []
+        tool_calls: Dict[int, SimpleNamespace] = {}
+        finish_reason = "stop"
+        chunk_count = 0
+        usage_tokens = None
+        
+        stream = client.chat.completions.create(
+            timeout=timeout or self.config["evaluation"]["timeout_seconds"],
+            stream=True,
+            stream_options={"include_usage": True},
+            **request_params
+        )
+        try:
+            for chunk in stream:
+                if cancel is not None and cancel.is_set():
+                    logger.debug("Hedge request won; cancelling generation")
+                    break
+                if getattr(chunk, "usage", None):
+                    usage_tokens = chunk.usage.completion_tokens or usage_tokens
+                    stats.record_usage(chunk.usage)
+                if not chunk.choices:
                     continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                
+                reasoning = getattr(delta, "reasoning", None) or getattr(delta, "reasoning_content", None)
+                if delta.content or delta.tool_calls or reasoning:
+                    chunk_count += 1
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                        if first_token is not None:
+                            first_token.set()
+                
+                for tc_delta in delta.tool_calls or []:
+                    call = tool_calls.setdefault(tc_delta.index, SimpleNamespace(
+                        id=None, function=SimpleNamespace(name="", arguments="")
+                    ))
+                    if tc_delta.id:
+                        call.id = tc_delta.id
+                    if tc_delta.function and tc_delta.function.name:
+                        call.function.name += tc_delta.function.name
+                    if tc_delta.function and tc_delta.function.arguments:
+                        call.function.arguments += tc_delta.function.arguments
+                
+                if delta.content:
+                    content_parts.append(delta.content)
+                    if early_stop and not tool_calls and "\n" in delta.content and completion_check("".join(content_parts)):
+                        logger.debug("Structured evaluation complete; cancelling generation")
+                        stats.early_stopped = True
+                        break
+        finally:
+            # Closing the stream drops the connection, which stops generation server-side
+            stream.close()
+        
+        end_time = time.time()
+        if first_token_time is not None and stats.time_to_first_token is None:
+            stats.time_to_first_token = first_token_time - start_time
+        stats.completion_tokens += usage_tokens or chunk_count
+        stats.generation_time += end_time - (first_token_time or start_time)
+        return "".join(content_parts), [tool_calls[i] for i in sorted(tool_calls)], finish_reason
+    
+    def _parse_batched_evaluation(self, evaluation_text: str, run_numbers: List[int]) -> Dict[int, tuple[str, DetailedScores, str, str, str]]:
+        """Split a batched judge output into run sections and parse each one.
+        
+        Runs whose section is missing or lacks a verdict are left out, so the
+        caller can judge just those runs one by one.
+        """
+        sections = split_run_sections(evaluation_text)
+        parsed = {}
+        for run_number in run_numbers:
+            section = sections.get(run_number)
+            if not section or not re.search(r"EVALUATION_RESULT:\s*\w+", section, re.IGNORECASE):
+                logger.warning(f"Batched evaluation is missing a parsable section for Run {run_number}")
+                continue
+            parsed[run_number] = self._parse_structured_evaluation(section)
+        return parsed
+    
+    def _complete_chat(self, client: OpenAI, request_params: dict, stats: JudgeCallStats,
+                       timeout: Optional[float] = None) -> tuple[str, list, str]:
+        """Run a non-streaming chat completion. Returns (content, tool_calls, finish_reason)."""
+        call_start = time.time()
+        response = client.chat.completions.create(
+            timeout=timeout or self.config["evaluation"]["timeout_seconds"],
+            **request_params
+        )
+        stats.generation_time += time.time() - call_start
+        usage = getattr(response, "usage", None)
+        stats.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        stats.record_usage(usage)
+        choice = response.choices[0]
+        tool_calls = getattr(choice.message, "tool_calls", []) or []
+        return choice.message.content, tool_calls, getattr(choice, "finish_reason", "stop")
+    
+    def _judge_attempt(self, request_params: dict, stats: JudgeCallStats,
+                       completion_check: Callable[[str], bool] = structured_output_complete,
+                       avoid: Optional[str] = None,
+                       first_token: Optional[threading.Event] = None,
+                       cancel: Optional[threading.Event] = None,
+                       deadline: Optional[float] = None) -> Optional[tuple[str, list, str]]:
+        """Send one judge completion through the backend pool.
+        
+        Timeouts and connection errors eject the backend; with several backends
+        the request is retried elsewhere up to evaluation.retry_attempts times.
+        Each call waits at most evaluation.timeout_seconds, and never past deadline.
+        A backend that rejects streaming is sent a plain request instead, and is not
+        streamed to again once that succeeds.
+        Returns None when cancel was set before the request could be sent.
+        """
+        pool = self.backend_pool
+        stream = self.config["model_parameters"].get("stream", False)
+        attempts = max(1, self.config["evaluation"].get("retry_attempts", 1)) if len(pool.backends) > 1 else 1
+        for attempt in range(1, attempts + 1):
+            call_stats = JudgeCallStats()
+            try:
+                with pool.lease(self._call_timeout(deadline), avoid) as backend:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    call_stats.backend = stats.backend = backend.base_url
+                    call_start = time.time()
+                    streamed = stream and backend.streaming
+                    if streamed:
+                        try:
+                            result = self._stream_chat_completion(backend.client, request_params, call_stats,
+                                                                  completion_check, first_token, cancel,
+                                                                  self._call_timeout(deadline))
+                        except APIStatusError as e:
+                            if e.status_code not in _STREAMING_UNSUPPORTED_STATUS:
+                                raise
+                            result = self._complete_chat(backend.client, request_params, call_stats, self._call_timeout(deadline))
+                            logger.warning(f"{backend.base_url} rejected a streaming request ({e.status_code}); "
+                                           f"using non-streaming requests for this backend")
+                            backend.streaming = streamed = False
+                    else:
+                        result = self._complete_chat(backend.client, request_params, call_stats, self._call_timeout(deadline))
+                    backend.completion_tokens += call_stats.completion_tokens
+                # Hedging triggers on time to first token when streaming, on completion otherwise
+                latency = call_stats.time_to_first_token if streamed and call_stats.time_to_first_token is not None else time.time() - call_start
+                if cancel is None or not cancel.is_set():
+                    # A hedge loser's latency is cut short (or never used), so it would skew the hedge delay
+                    with self._hedge_lock:
+                        self._judge_latencies.append(latency)
+                stats.merge(call_stats)
+                return result
+            except (APITimeoutError, APIConnectionError) as e:
+                if attempt == attempts:
+                    raise
+                logger.warning(f"Judge request failed on {call_stats.backend} ({e}); retrying on another backend ({attempt}/{attempts})")
+    
+    def _call_timeout(self, deadline: Optional[float] = None) -> float:
+        """Timeout of one judge call: evaluation.timeout_seconds, capped by the time left until deadline"""
+        timeout = float(self.config["evaluation"]["timeout_seconds"])
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise TimeoutError("Judge deadline passed before the request could be sent")
+        return min(timeout, remaining)
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while too few latencies have been observed"""
+        hedging = self.config["evaluation"].get("hedging", {})
+        with self._hedge_lock:
+            samples = sorted(self._judge_latencies)
+        if len(samples) < int(hedging.get("min_samples", 10)):
+            return None
+        index = min(len(samples) - 1, max(0, int(len(samples) * float(hedging.get("percentile", 95)) / 100 + 0.999) - 1))
+        return max(float(hedging.get("min_delay_seconds", 1.0)), samples[index])
+    
+    def _judge_completion(self, request_params: dict, stats: JudgeCallStats,
+                          completion_check: Callable[[str], bool] = structured_output_complete,
+                          deadline: Optional[float] = None) -> tuple[str, list, str]:
+        """Send one judge completion, coalescing identical requests already in flight.
+        
+        With evaluation.coalesce_requests, concurrent calls with the same request
+        parameters (ignoring run numbers and timestamps, see coalescing_key) share
+        a single future: the first caller sends the request and the others wait
+        for its response instead of calling the LLM again.
+        """
+        if not self.config["evaluation"].get("coalesce_requests", True):
+            stats.llm_calls += 1
+            return self._recorded_judge_completion(request_params, stats, completion_check, deadline)
+        
+        key = coalescing_key(request_params, self.config["evaluation"].get("offer_order_significant", True))
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future = Future()
+                self._inflight[key] = future
+        if inflight is not None:
+            logger.info("Identical judge request already in flight; waiting for its response")
+            stats.coalesced_calls += 1
+            return inflight.result(timeout=self._call_timeout(deadline) if deadline is not None else None)
+        
+        stats.llm_calls += 1
+        try:
+            result = self._recorded_judge_completion(request_params, stats, completion_check, deadline)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+    
+    def _recorded_judge_completion(self, request_params: dict, stats: JudgeCallStats,
+                                   completion_check: Callable[[str], bool] = structured_output_complete,
+                                   deadline: Optional[float] = None) -> tuple[str, list, str]:
+        """Send one judge completion, recording the exchange when transport.mode is "record" """
+        if self.config.get("transport", {}).get("mode", "live") != "record":
+            return self._hedged_judge_completion(request_params, stats, completion_check, deadline)
+        before = (stats.prompt_tokens, stats.completion_tokens, stats.cached_tokens)
+        start_time = time.time()
+        content, tool_calls, finish_reason = self._hedged_judge_completion(request_params, stats, completion_check, deadline)
+        self._record_exchange(request_params, {
+            "content": content,
+            "tool_calls": [
+                {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                for call in tool_calls
+            ],
+            "finish_reason": finish_reason
+        }, {
+            "prompt_tokens": stats.prompt_tokens - before[0],
+            "completion_tokens": stats.completion_tokens - before[1],
+            "cached_tokens": stats.cached_tokens - before[2]
+        }, time.time() - start_time)
+        return content, tool_calls, finish_reason
+    
+    def _record_exchange(self, request_params: dict, response: dict, usage: dict, latency: float):
+        """Append one judge request/response pair to the transport recording file"""
+        record = {
+            "request": request_params,
+            "response": response,
+            "usage": usage,
+            "latency": round(latency, 4),
+            "recorded_at": datetime.now().isoformat()
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._record_lock:
+            with open(self.config["transport"].get("recording_file", "judge_recordings.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    
+    def _hedged_judge_completion(self, request_params: dict, stats: JudgeCallStats,
+                                 completion_check: Callable[[str], bool] = structured_output_complete,
+                                 deadline: Optional[float] = None) -> tuple[str, list, str]:
+        """Send one judge completion, hedging it when evaluation.hedging is enabled.
+        
+        If the request has not produced a first token (streaming) or completed
+        (non-streaming) within the configured percentile of recent latencies, a
+        duplicate is sent, preferably to another backend. The first successful
+        response wins and the loser is cancelled; non-streaming losers cannot be
+        interrupted and are left to finish in the background.
+        """
+        with self._hedge_lock:
+            self.hedge_stats["judge_calls"] += 1
+        if not self.config["evaluation"].get("hedging", {}).get("enabled", False):
+            return self._judge_attempt(request_params, stats, completion_check, deadline=deadline)
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._judge_attempt(request_params, stats, completion_check, deadline=deadline)
+        
+        outcomes = queue.Queue()
+        call = {"winner": None, "winner_end": 0.0}
+        
+        def launch(label: str, avoid: Optional[str]) -> Tuple[threading.Event, threading.Event, JudgeCallStats]:
+            progressed, cancel, attempt_stats = threading.Event(), threading.Event(), JudgeCallStats()
+            
+            def run():
+                result, error = None, None
+                try:
+                    result = self._judge_attempt(request_params, attempt_stats, completion_check, avoid, progressed, cancel, deadline)
+                except Exception as e:
+                    error = e
+                progressed.set()
+                end = time.time()
+                with self._hedge_lock:
+                    if call["winner"] is None and result is not None:
+                        call["winner"], call["winner_end"] = label, end
+                    elif call["winner"] == "hedge" and label == "primary":
+                        # Lower bound: a cancelled primary stops at its first chunk
+                        self.hedge_stats["time_saved"] += end - call["winner_end"]
+                    outcomes.put((label, result, error))
+            
+            threading.Thread(target=run, daemon=True).start()
+            return progressed, cancel, attempt_stats
+        
+        primary_progressed, primary_cancel, primary_stats = launch("primary", None)
+        attempts = {"primary": (primary_cancel, primary_stats)}
+        if not primary_progressed.wait(delay):
+            logger.info(f"Judge call exceeded hedge delay ({delay:.2f}s); sending hedge request")
+            _, hedge_cancel, hedge_stats = launch("hedge", primary_stats.backend)
+            attempts["hedge"] = (hedge_cancel, hedge_stats)
+            stats.hedged_calls += 1
+            with self._hedge_lock:
+                self.hedge_stats["hedged"] += 1
+        
+        first_error = None
+        for _ in range(len(attempts)):
+            label, result, error = outcomes.get()
+            if result is not None:
+                for other, (cancel, _) in attempts.items():
+                    if other != label:
+                        cancel.set()
+                if label == "hedge":
+                    with self._hedge_lock:
+                        self.hedge_stats["hedge_wins"] += 1
+                stats.merge(attempts[label][1])
+                return result
+            first_error = first_error or error
+        raise first_error or RuntimeError("Judge request was cancelled")
+    
+    def _execute_tool_call(self, tool_call: Any) -> Dict[str, Any]:
+        """Run one function tool call locally and return its result"""
+        fn_name = tool_call.function.name
+        try:
+            fn_args = json.loads(tool_call.function.arguments or "{}")
+        except Exception:
+            fn_args = {}
+        
+        if fn_name == "search_knowledge_base":
+            return self._search_knowledge_base(fn_args.get("query", ""))
+        return {"error": f"Unknown tool: {fn_name}"}
+    
+    def _run_chat_with_tools(self, messages: list[dict], request_params: dict,
+                             stats: Optional[JudgeCallStats] = None,
+                             completion_check: Callable[[str], bool] = structured_output_complete) -> str:
+        """Run chat, executing function tool calls locally until a final assistant message is produced.
 
-                # Token gating
-                if len(all_tokens) > 0:
-                    unique_matched_non_id = set([m.lower() for m in matched if not m.lower().startswith("offerid=") and not m.isdigit()])
-                    if multi_id_mode:
-                        if matched_id_count < 1:
-                            continue
-                        if len(unique_matched_non_id) < min_required_non_id:
-                            continue
+        The loop is a small state machine:
+        - REQUEST: send the judge request
+        - TOOLS: execute every tool call of the assistant message concurrently,
+          append the assistant message and one tool message per call
+        - FINALIZE: a budget is spent, so request a final answer without tools
+        - DONE: return the assistant content
+        
+        Budgets come from evaluation.tool_loop: max_iterations (tool rounds),
+        max_completion_tokens and deadline_seconds (wall clock, which also caps
+        the timeout of each request; exceeding it raises TimeoutError). Without
+        deadline_seconds only evaluation.timeout_seconds bounds each request. stats
+        records round trips, tool calls and per-iteration timings.
+        """
+        if stats is None:
+            stats = JudgeCallStats()
+        loop_config = self.config["evaluation"].get("tool_loop", {})
+        max_iterations = int(loop_config.get("max_iterations", 4))
+        max_completion_tokens = loop_config.get("max_completion_tokens")
+        deadline_seconds = loop_config.get("deadline_seconds")
+        # Without a deadline the loop is unbounded in time; each request still waits at most timeout_seconds
+        deadline = time.time() + float(deadline_seconds) if deadline_seconds else None
+        tokens_at_start = stats.completion_tokens
+        
+        state = "REQUEST"
+        iteration = 0
+        content, tool_calls = None, []
+        while True:
+            if state == "DONE":
+                return content or ""
+            
+            if deadline is not None and time.time() > deadline:
+                stats.budget_exhausted = "deadline"
+                raise TimeoutError(f"Judge tool loop exceeded its {deadline_seconds:.0f}s deadline after {stats.round_trips} round trips")
+            
+            iteration_start = time.time()
+            if state in ("REQUEST", "FINALIZE"):
+                if state == "FINALIZE":
+                    request_params = {key: value for key, value in request_params.items() if key not in ("tools", "tool_choice")}
+                stats.round_trips += 1
+                try:
+                    content, tool_calls, finish_reason = self._judge_completion(request_params, stats, completion_check, deadline)
+                except (APITimeoutError, TimeoutError):
+                    if deadline is None or time.time() < deadline:
+                        raise
+                    stats.budget_exhausted = "deadline"
+                    raise TimeoutError(f"Judge tool loop exceeded its {deadline_seconds:.0f}s deadline after {stats.round_trips} round trips")
+                
+                if not tool_calls or state == "FINALIZE":
+                    # Final content (or nothing usable; an empty answer avoids a hang)
+                    stats.iteration_times.append(time.time() - iteration_start)
+                    state = "DONE"
+                    continue
+                state = "TOOLS"
+            
+            if state == "TOOLS":
+                iteration += 1
+                tool_calls = list(tool_calls)
+                if len(tool_calls) > 1:
+                    with ThreadPoolExecutor(max_workers=len(tool_calls)) as tool_executor:
+                        results = list(tool_executor.map(self._execute_tool_call, tool_calls))
+                else:
+                    results = [self._execute_tool_call(tool_calls[0])]
+                stats.tool_calls += len(tool_calls)
+                
+                call_ids = [getattr(call, "id", None) or f"call_{iteration}_{index}" for index, call in enumerate(tool_calls)]
+                messages.append({
+                    "role": "assistant",
+                    "content": content or None,
+                    "tool_calls": [
+                        {"id": call_id, "type": "function",
+                         "function": {"name": call.function.name, "arguments": call.function.arguments or "{}"}}
+                        for call_id, call in zip(call_ids, tool_calls)
+                    ]
+                })
+                for call_id, call, result in zip(call_ids, tool_calls, results):
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": call_id,
+                        "name": call.function.name,
+                        "content": json.dumps(result, ensure_ascii=False)
+                    })
+                request_params = {**request_params, "messages": messages}
+                stats.iteration_times.append(time.time() - iteration_start)
+                
+                if iteration >= max_iterations:
+                    stats.budget_exhausted = "max_iterations"
+                elif max_completion_tokens and stats.completion_tokens - tokens_at_start >= max_completion_tokens:
+                    stats.budget_exhausted = "max_completion_tokens"
+                if stats.budget_exhausted:
+                    logger.warning(f"Tool loop budget '{stats.budget_exhausted}' reached after {iteration} tool rounds; requesting a final answer")
+                    state = "FINALIZE"
+                else:
+                    state = "REQUEST"
+    
+    def _apply_rules(self, test_case: TestCase, test_run: TestRun,
+                     start_time: float) -> tuple[Optional[RunEvaluationResult], Optional[RuleCheckResult]]:
+        """Run the rule-based pre-judge when enabled.
+        
+        Returns (result, rule_check): result is set when the rules decide the run,
+        rule_check carries findings to attach to the judge prompt otherwise.
+        """
+        rules_config = self.config.get("rules", {})
+        if not rules_config.get("enabled", False):
+            return None, None
+        
+        rule_check = self._pre_judge(test_case, test_run)
+        if rule_check.verdict:
+            logger.info(f"Run {test_run.run_number} decided by rules: {rule_check.verdict} ({'; '.join(rule_check.violations)})")
+            return RunEvaluationResult(
+                test_case=test_case,
+                test_run=test_run,
+                evaluation=rule_check.verdict,
+                # Minimum scores keep the weighted average inside the INCORRECT band
+                detailed_scores=DetailedScores(1, 1, 1, 1, 1),
+                rag_verification="\n".join(f"- {finding}" for finding in rule_check.findings),
+                reasoning=f"Decided by rule-based pre-judge: {'; '.join(rule_check.violations)}",
+                recommendation="Return only offer IDs that exist in the knowledge base and satisfy the reference constraints",
+                processing_time=time.time() - start_time,
+                success=True,
+                judged_by="rules"
+            ), rule_check
+        
+        if not rules_config.get("attach_findings", True):
+            return None, None
+        return None, rule_check
+    
+    def _evaluate_runs_batched(self, test_case: TestCase, test_runs: List[TestRun]) -> List[RunEvaluationResult]:
+        """Judge several distinct runs of one test case with a single LLM request.
+        
+        The judge is asked for one structured block per run. Runs decided by the
+        rules are skipped; if the batched output cannot be parsed, the remaining
+        runs are judged one by one.
+        """
+        start_time = time.time()
+        results: Dict[int, RunEvaluationResult] = {}
+        pending: List[Tuple[TestRun, Optional[RuleCheckResult]]] = []
+        for test_run in test_runs:
+            rule_result, rule_check = self._apply_rules(test_case, test_run, start_time)
+            if rule_result:
+                results[id(test_run)] = rule_result
+            else:
+                pending.append((test_run, rule_check))
+        
+        if len(pending) == 1:
+            results[id(pending[0][0])] = self.evaluate_single_run(test_case, pending[0][0])
+        elif pending:
+            run_numbers = [test_run.run_number for test_run, _ in pending]
+            logger.info(f"Processing test case {test_case.test_id}, Runs {', '.join(map(str, run_numbers))} in one batched request")
+            stats = JudgeCallStats(batch_size=len(pending))
+            parsed: Dict[int, tuple] = {}
+            try:
+                pre_retrieval = self._pre_retrieval_enabled()
+                case_citations = None
+                sections = []
+                for test_run, rule_check in pending:
+                    run_citations = None
+                    if pre_retrieval:
+                        case_citations, run_citations = self._pre_retrieve_citations(test_case, test_run)
+                    sections.append(f"--- Run {test_run.run_number} ---\n" + self._create_run_section(test_run, rule_check, run_citations))
+                
+                batch_request = (
+                    f"Evaluate each of the following {len(pending)} actual outputs independently against the test case above. "
+                    f"For each one, first write a line '=== RUN <number> ===' and then the complete REQUIRED OUTPUT FORMAT for that run. "
+                    f"Do not compare the runs with each other.\n\n" + "\n".join(sections) + "\nBegin evaluation:"
+                )
+                messages = [
+                    {"role": "system", "content": self.judge_system_prompt},
+                    {"role": "user", "content": self._create_case_prompt(test_case, case_citations)},
+                    {"role": "user", "content": batch_request}
+                ]
+                evaluation_text = self._run_chat_with_tools(
+                    messages,
+                    self._build_judge_request(messages, len(pending)),
+                    stats,
+                    completion_check=lambda text: batched_output_complete(text, run_numbers)
+                )
+                parsed = self._parse_batched_evaluation(evaluation_text, run_numbers)
+            except Exception as e:
+                logger.error(f"Batched evaluation of test case {test_case.test_id} failed: {e}")
+            
+            missing = [test_run for test_run, _ in pending if test_run.run_number not in parsed]
+            if missing:
+                logger.warning(f"Falling back to per-run evaluation for test case {test_case.test_id}, "
+                               f"Runs {', '.join(str(test_run.run_number) for test_run in missing)}")
+            if parsed:
+                # Each batched run is charged an equal share of the batched request time
+                processing_time = (time.time() - start_time) / len(pending)
+                for test_run, _ in pending:
+                    if test_run.run_number not in parsed:
+                        continue
+                    evaluation, detailed_scores, rag_verification, reasoning, recommendation = parsed[test_run.run_number]
+                    result = RunEvaluationResult(
+                        test_case=test_case,
+                        test_run=test_run,
+                        evaluation=evaluation,
+                        detailed_scores=detailed_scores,
+                        rag_verification=rag_verification,
+                        reasoning=reasoning,
+                        recommendation=recommendation,
+                        processing_time=processing_time,
+                        success=True,
+                        judge_stats=stats
+                    )
+                    logger.info(f"Run {test_run.run_number} completed: {evaluation} (Avg Score: {result.average_score:.1f}/10) (batched)")
+                    results[id(test_run)] = result
+            for test_run in missing:
+                results[id(test_run)] = self.evaluate_single_run(test_case, test_run)
+        
+        return [results[id(test_run)] for test_run in test_runs]
+    
+    def evaluate_single_run(self, test_case: TestCase, test_run: TestRun) -> RunEvaluationResult:
+        """Evaluate a single run of a test case"""
+        start_time = time.time()
+        
+        try:
+            # Clear any previous chat context for fresh evaluation
+            if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
+                logger.debug("Starting fresh evaluation session")
+            
+            logger.info(f"Processing test case {test_case.test_id}, Run {test_run.run_number}")
+            
+            # Deterministic rule checks decide clear-cut runs without an LLM call
+            rule_result, rule_check = self._apply_rules(test_case, test_run, start_time)
+            if rule_result:
+                return rule_result
+            
+            # Evaluate the response with detailed breakdown
+            stats = JudgeCallStats()
+            evaluation, detailed_scores, rag_verification, reasoning, recommendation = self._evaluate_response(test_case, test_run, rule_check, stats)
+            
+            processing_time = time.time() - start_time
+            success = True
+            
+            result = RunEvaluationResult(
+                test_case=test_case,
+                test_run=test_run,
+                evaluation=evaluation,
+                detailed_scores=detailed_scores,
+                rag_verification=rag_verification,
+                reasoning=reasoning,
+                recommendation=recommendation,
+                processing_time=processing_time,
+                success=success,
+                judge_stats=stats
+            )
+            
+            logger.info(f"Run {test_run.run_number} completed: {evaluation} (Avg Score: {result.average_score:.1f}/10) ({processing_time:.2f}s)")
+            return result
+            
+        except Exception as e:
+            return self._failed_run_result(test_case, test_run, e, start_time)
+    
+    def _failed_run_result(self, test_case: TestCase, test_run: TestRun, error: Exception, start_time: float) -> RunEvaluationResult:
+        """Result of a run whose evaluation raised before a verdict was produced"""
+        processing_time = time.time() - start_time
+        logger.error(f"Run {test_run.run_number} failed: {error}")
+        
+        default_scores = DetailedScores(0, 0, 0, 0, 0)
+        return RunEvaluationResult(
+            test_case=test_case,
+            test_run=test_run,
+            evaluation="ERROR",
+            detailed_scores=default_scores,
+            rag_verification="",
+            reasoning=f"Test execution failed: {str(error)}",
+            recommendation="Fix technical issues and retry",
+            processing_time=processing_time,
+            success=False
+        )
+    
+    def _dedup_key(self, test_case: TestCase, test_run: TestRun) -> tuple:
+        """Key identifying runs that are guaranteed to receive the same verdict"""
+        if not self.config["evaluation"].get("deduplicate_runs", True):
+            # Every run is unique when deduplication is disabled
+            return ("run", id(test_case), id(test_run))
+        return (
+            test_case.input_text.strip(),
+            test_case.reference_output.strip(),
+            test_run.canonical_key(self.config["evaluation"].get("offer_order_significant", True))
+        )
+    
+    def _group_identical_runs(self, test_cases: List[TestCase]) -> Dict[tuple, List[Tuple[TestCase, TestRun]]]:
+        """Group runs across the whole suite by (input, reference, canonical response).
+        
+        Groups keep suite order, so the first member of each group is its representative.
+        """
+        groups: Dict[tuple, List[Tuple[TestCase, TestRun]]] = {}
+        for test_case in test_cases:
+            for test_run in test_case.runs:
+                groups.setdefault(self._dedup_key(test_case, test_run), []).append((test_case, test_run))
+        return groups
+    
+    def _duplicate_result(self, source: RunEvaluationResult, test_case: TestCase, test_run: TestRun) -> RunEvaluationResult:
+        """Fan out a judged verdict to an identical run without calling the LLM again"""
+        if source.test_case is test_case:
+            origin = f"Run {source.test_run.run_number}"
+        else:
+            origin = f"test case {source.test_case.test_id} Run {source.test_run.run_number}"
+        return RunEvaluationResult(
+            test_case=test_case,
+            test_run=test_run,
+            evaluation=source.evaluation,
+            detailed_scores=source.detailed_scores,
+            rag_verification=source.rag_verification,
+            reasoning=f"Duplicated from {origin}: {source.reasoning}",
+            recommendation=source.recommendation,
+            processing_time=0.0,
+            success=source.success,
+            judged_by=source.judged_by,
+            duplicate=True
+        )
+    
+    def evaluate_test_case(self, test_case: TestCase, verdicts: Optional[Dict[tuple, Any]] = None) -> TestCaseResult:
+        """Evaluate all runs of a test case
+        
+        verdicts maps dedup keys to already judged results (or futures of in-flight
+        judgements) shared across the suite. When omitted, identical runs are only
+        deduplicated within this test case.
+        """
+        logger.info(f"Evaluating test case {test_case.test_id} with {len(test_case.runs)} runs")
+        
+        if verdicts is None:
+            verdicts = {}
+        run_results = []
+        judged_any = False
+        delay = self.config["evaluation"]["delay_between_tests"]
+        
+        if self.config["evaluation"].get("batch_judging", False):
+            # Judge all not-yet-judged distinct runs of this test case in one request
+            pending: Dict[tuple, TestRun] = {}
+            for test_run in test_case.runs:
+                key = self._dedup_key(test_case, test_run)
+                if key not in verdicts:
+                    pending.setdefault(key, test_run)
+            if pending:
+                batch_results = self._evaluate_runs_batched(test_case, list(pending.values()))
+                verdicts.update(zip(pending.keys(), batch_results))
+                for batch_result in batch_results:
+                    self._journal_result(batch_result)
+        
+        for test_run in test_case.runs:
+            key = self._dedup_key(test_case, test_run)
+            source = verdicts.get(key)
+            if isinstance(source, Future):
+                source = source.result()
+                verdicts[key] = source
+            
+            if source is None:
+                # Add delay between judged runs to avoid overwhelming the system
+                if judged_any and delay > 0:
+                    logger.debug(f"Waiting {delay}s before next run...")
+                    time.sleep(delay)
+                result = self.evaluate_single_run(test_case, test_run)
+                verdicts[key] = result
+                self._journal_result(result)
+                judged_any = True
+            elif source.test_run is test_run:
+                # This run is the representative judged for its group
+                result = source
+            else:
+                logger.info(f"Run {test_run.run_number}: response identical to {source.test_case.test_id} Run {source.test_run.run_number}; reusing its evaluation")
+                result = self._duplicate_result(source, test_case, test_run)
+                self.dedup_stats["llm_calls_saved"] += 1
+            
+            run_results.append(result)
+        
+        return TestCaseResult(
+            test_case=test_case,
+            run_results=run_results
+        )
+    
+    def _journal_result(self, result: RunEvaluationResult):
+        """Append a freshly judged verdict to the checkpoint journal, if one is open"""
+        if self._journal is not None:
+            self._journal.append(result)
+    
+    def _journal_future(self, future: Future):
+        """Done-callback journaling the verdict of a parallel judging job"""
+        if not future.cancelled() and future.exception() is None:
+            self._journal_result(future.result())
+    
+    def _restore_from_journal(self, groups: Dict[tuple, List[Tuple[TestCase, TestRun]]],
+                              journal_file: str) -> Dict[tuple, RunEvaluationResult]:
+        """Verdicts from a previous journal for groups whose representative run finished successfully"""
+        records = EvaluationJournal.load(journal_file)
+        restored = {}
+        for key, members in groups.items():
+            test_case, test_run = members[0]
+            content_hash = run_content_hash(test_case.input_text, test_case.reference_output, test_run.response)
+            record = records.get(EvaluationJournal.run_identity(test_case.test_id, test_run.run_number,
+                                                                test_run.timestamp, content_hash))
+            # Failed runs are judged again
+            if record and record.get("success"):
+                restored[key] = RunEvaluationResult.from_dict(record, test_case, test_run)
+        return restored
+    
+    def _latest_archived_results(self) -> Optional[str]:
+        """Most recent archived evaluation_results_<version>.json of this output (shard) set"""
+        archive_folder = self.config["evaluation"]["versioning"].get("archive_folder", "evaluation_history")
+        name = f"evaluation_results{self.output_suffix}_"
+        candidates = [
+            path for path in glob.glob(os.path.join(archive_folder, f"{name}*.json"))
+            # Skip other shard sets (evaluation_results_shard1of4_<version>.json when unsharded)
+            if re.fullmatch(r"[\d_]+", os.path.basename(path)[len(name):-len(".json")])
+        ]
+        return max(candidates, key=os.path.getmtime) if candidates else None
+    
+    def _restore_from_archive(self, groups: Dict[tuple, List[Tuple[TestCase, TestRun]]],
+                              results_file: str) -> Dict[tuple, RunEvaluationResult]:
+        """Verdicts from an archived result set for groups with an unchanged, successfully judged run.
+        
+        Runs match on (test_id, run_number, timestamp, content hash), so new runs and
+        runs whose input, reference or response changed are judged again.
+        """
+        with open(results_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        previous = {}
+        for entry in entries:
+            if entry.get("success"):
+                content_hash = run_content_hash(entry.get("input", ""), entry.get("reference_output", ""),
+                                                entry.get("actual_output", ""))
+                previous[(str(entry["test_id"]), entry["run_number"], entry.get("timestamp", ""), content_hash)] = entry
+        
+        restored = {}
+        for key, members in groups.items():
+            for test_case, test_run in members:
+                content_hash = run_content_hash(test_case.input_text, test_case.reference_output, test_run.response)
+                entry = previous.get((test_case.test_id, test_run.run_number, test_run.timestamp, content_hash))
+                if entry:
+                    # Members of a group are identical, so any unchanged member carries the verdict
+                    representative_case, representative_run = members[0]
+                    restored[key] = self._run_result_from_entry(entry, representative_case, representative_run)
+                    break
+        return restored
+    
+    def _load_processing_time_history(self) -> tuple[Dict[str, float], Optional[float]]:
+        """Mean judged processing_time per test_id from archived evaluation_results_*.json files.
+        
+        Also returns the seconds per prompt character observed across those runs,
+        used to predict runs without history (None when there is no history).
+        """
+        scheduling = self.config["evaluation"].get("scheduling", {})
+        archive_folder = self.config["evaluation"]["versioning"].get("archive_folder", "evaluation_history")
+        files = sorted(glob.glob(os.path.join(archive_folder, "evaluation_results_*.json")))
+        files = files[-int(scheduling.get("history_files", 5)):]
+        
+        times: Dict[str, List[float]] = {}
+        total_time, total_chars = 0.0, 0
+        for path in files:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Skipping unreadable history file {path}: {e}")
+                continue
+            for entry in entries:
+                processing_time = entry.get("processing_time", 0)
+                # Duplicated runs say nothing about judging cost (older archives only mark them by 0s)
+                if not entry.get("success") or entry.get("duplicate") or processing_time <= 0:
+                    continue
+                times.setdefault(str(entry.get("test_id")), []).append(processing_time)
+                total_time += processing_time
+                total_chars += len(entry.get("input", "")) + len(entry.get("reference_output", "")) + len(entry.get("actual_output", ""))
+        
+        history = {test_id: sum(values) / len(values) for test_id, values in times.items()}
+        seconds_per_char = total_time / total_chars if total_chars else None
+        logger.info(f"Scheduling history: {len(history)} test cases from {len(files)} archived result files")
+        return history, seconds_per_char
+    
+    def _predict_run_costs(self, pending: Dict[tuple, Tuple[TestCase, TestRun]]) -> tuple[Dict[tuple, float], int]:
+        """Predicted judging seconds per pending group and the number predicted from history"""
+        history, seconds_per_char = self._load_processing_time_history()
+        if seconds_per_char is None:
+            seconds_per_char = float(self.config["evaluation"].get("scheduling", {}).get("default_seconds_per_char", 0.01))
+        costs = {}
+        history_hits = 0
+        for key, (test_case, test_run) in pending.items():
+            if test_case.test_id in history:
+                costs[key] = history[test_case.test_id]
+                history_hits += 1
+            else:
+                # Longer prompts and responses take longer to judge
+                chars = len(test_case.input_text) + len(test_case.reference_output) + len(test_run.response)
+                costs[key] = chars * seconds_per_char
+        return costs, history_hits
+    
+    @staticmethod
+    def _predict_makespan(costs: List[float], workers: int) -> float:
+        """Makespan of running jobs in the given order on a pool of workers (each job goes to the first free worker)"""
+        finish_times = [0.0] * max(1, workers)
+        for cost in costs:
+            earliest = heapq.heappop(finish_times)
+            heapq.heappush(finish_times, earliest + cost)
+        return max(finish_times)
+    
+    def _submit_batched_judging(self, executor: ThreadPoolExecutor, test_case: TestCase,
+                                batch: List[Tuple[tuple, TestRun]]) -> Dict[tuple, Future]:
+        """Judge a test case's runs as one batched job, exposing a future per dedup key"""
+        futures = {key: Future() for key, _ in batch}
+        
+        def job():
+            try:
+                batch_results = self._evaluate_runs_batched(test_case, [test_run for _, test_run in batch])
+                for (key, _), result in zip(batch, batch_results):
+                    futures[key].set_result(result)
+            except Exception as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+        
+        executor.submit(job)
+        return futures
+    
+    def evaluate_batch(self, test_cases: List[TestCase], resume: bool = False, incremental: bool = False) -> List[TestCaseResult]:
+        """Evaluate multiple test cases with suite-wide deduplication and progressive reporting
+        
+        Identical runs are grouped before evaluation and only one representative per
+        group is judged. With evaluation.max_concurrency > 1 the representatives are
+        judged in parallel while results are still reported in test case order.
+        
+        Judged verdicts are appended to the evaluation.journal file as they complete;
+        with resume=True, verdicts already in the journal are reused instead of
+        judging those runs again. With incremental=True, verdicts of unchanged runs are
+        taken from the latest archived result set and only new or changed runs are judged.
+        """
+        if not self._check_server_health():
+            raise ConnectionError("LM Studio server is not available")
+        
+        total_runs = sum(len(tc.runs) for tc in test_cases)
+        logger.info(f"Starting batch evaluation of {len(test_cases)} test cases with {total_runs} total runs")
+        
+        groups = self._group_identical_runs(test_cases)
+        self.dedup_stats = {"total_runs": total_runs, "unique_runs": len(groups), "llm_calls_saved": 0}
+        logger.info(f"Deduplication: {len(groups)} unique runs to judge out of {total_runs}")
+        
+        results = []
+        verdicts: Dict[tuple, Any] = {}
+        journal_config = self.config["evaluation"].get("journal", {})
+        if journal_config.get("enabled", True):
+            journal_file = self._suffixed(journal_config.get("file", "evaluation_journal.jsonl"))
+            if resume:
+                verdicts.update(self._restore_from_journal(groups, journal_file))
+                logger.info(f"Resuming: {len(verdicts)} of {len(groups)} unique runs restored from {journal_file}")
+            self._journal = EvaluationJournal(
+                journal_file,
+                fsync_every=int(journal_config.get("fsync_every", 10)),
+                fsync_interval=float(journal_config.get("fsync_interval_seconds", 5.0)),
+                truncate=not resume
+            )
+        elif resume:
+            logger.warning("--resume ignored: evaluation.journal is disabled")
+        if incremental:
+            baseline = self._latest_archived_results()
+            reused = {}
+            if baseline:
+                reused = {key: result for key, result in self._restore_from_archive(groups, baseline).items()
+                          if key not in verdicts}
+                verdicts.update(reused)
+                logger.info(f"Incremental: {len(reused)} of {len(groups)} unique runs unchanged since {baseline}")
+            else:
+                logger.warning("--incremental: no archived evaluation results found, judging all runs")
+            self.incremental_stats = {"baseline": baseline, "reused_runs": len(reused),
+                                      "judged_runs": len(groups) - len(verdicts)}
+        delay = self.config["evaluation"]["delay_between_tests"]
+        max_concurrency = max(1, int(self.config["evaluation"].get("max_concurrency", 1)))
+        executor = ThreadPoolExecutor(max_workers=max_concurrency) if max_concurrency > 1 else None
+        
+        # Longest-expected-first: start the slowest judging jobs early so none is left for last
+        pending = {key: members[0] for key, members in groups.items() if key not in verdicts}
+        costs, history_hits = self._predict_run_costs(pending)
+        longest_first = executor is not None and self.config["evaluation"].get("scheduling", {}).get("longest_first", True)
+        if longest_first:
+            pending = dict(sorted(pending.items(), key=lambda item: costs[item[0]], reverse=True))
+        if executor and self.config["evaluation"].get("batch_judging", False):
+            case_costs: Dict[int, float] = {}
+            for key, (test_case, _) in pending.items():
+                case_costs[id(test_case)] = case_costs.get(id(test_case), 0.0) + costs[key]
+            job_costs = list(case_costs.values())
+            if longest_first:
+                job_costs.sort(reverse=True)
+        else:
+            job_costs = [costs[key] for key in pending]
+        self.schedule_stats = {
+            "scheduled_runs": len(pending),
+            "history_hits": history_hits,
+            "workers": max_concurrency,
+            "longest_first": longest_first,
+            "predicted_makespan": self._predict_makespan(job_costs, max_concurrency),
+            "actual_makespan": None
+        }
+        logger.info(f"Predicted judging makespan: {self.schedule_stats['predicted_makespan']:.1f}s for {len(pending)} runs "
+                    f"({history_hits} predicted from history)")
+        schedule_start = time.time()
+        
+        try:
+            if executor and self.config["evaluation"].get("batch_judging", False):
+                logger.info(f"Judging unique runs in per-test-case batches with {max_concurrency} parallel workers")
+                by_case: Dict[int, Tuple[TestCase, List[Tuple[tuple, TestRun]]]] = {}
+                for key, (test_case, test_run) in pending.items():
+                    by_case.setdefault(id(test_case), (test_case, []))[1].append((key, test_run))
+                batches = list(by_case.values())
+                if longest_first:
+                    batches.sort(key=lambda batch: sum(costs[key] for key, _ in batch[1]), reverse=True)
+                for test_case, batch in batches:
+                    futures = self._submit_batched_judging(executor, test_case, batch)
+                    for future in futures.values():
+                        future.add_done_callback(self._journal_future)
+                    verdicts.update(futures)
+            elif executor:
+                logger.info(f"Judging unique runs with {max_concurrency} parallel workers")
+                for key, (test_case, test_run) in pending.items():
+                    verdicts[key] = executor.submit(self.evaluate_single_run, test_case, test_run)
+                    verdicts[key].add_done_callback(self._journal_future)
+            
+            for i, test_case in enumerate(test_cases, 1):
+                logger.info(f"Processing test case {i}/{len(test_cases)}: {test_case.test_id}")
+                
+                # Add delay between test cases to avoid overwhelming the system
+                if executor is None and i > 1 and delay > 0:
+                    logger.debug(f"Waiting {delay}s before next test case...")
+                    time.sleep(delay)
+                
+                result = self.evaluate_test_case(test_case, verdicts)
+                results.append(result)
+                
+                # Progressive report update after each test case
+                self.update_progressive_report(results, i, len(test_cases))
+            self.schedule_stats["actual_makespan"] = time.time() - schedule_start
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            journal, self._journal = self._journal, None
+            if journal is not None:
+                journal.close()
+        
+        logger.info(f"Batch evaluation completed: {len(results)} test cases evaluated")
+        logger.info(f"Deduplication saved {self.dedup_stats['llm_calls_saved']} of {total_runs} LLM calls")
+        logger.info(f"Judging makespan: predicted {self.schedule_stats['predicted_makespan']:.1f}s, actual {self.schedule_stats['actual_makespan']:.1f}s")
+        return results
+    
+    def _stratified_run_order(self, test_cases: List[TestCase], rng: random.Random) -> Dict[str, List[Tuple[TestCase, TestRun]]]:
+        """Runs per reference type, in sampling order.
+        
+        Within a stratum, test cases are shuffled and their shuffled runs are
+        interleaved, so any prefix spreads over as many test cases as possible.
+        """
+        kb_index = self._get_kb_index()
+        by_type: Dict[str, List[List[Tuple[TestCase, TestRun]]]] = {}
+        for test_case in test_cases:
+            if not test_case.runs:
+                continue
+            runs = [(test_case, test_run) for test_run in test_case.runs]
+            rng.shuffle(runs)
+            stratum = reference_type(parse_reference_constraints(test_case.reference_output, kb_index))
+            by_type.setdefault(stratum, []).append(runs)
+        
+        order = {}
+        for stratum, case_runs in sorted(by_type.items()):
+            rng.shuffle(case_runs)
+            interleaved = []
+            for position in range(max(len(runs) for runs in case_runs)):
+                interleaved.extend(runs[position] for runs in case_runs if position < len(runs))
+            order[stratum] = interleaved
+        return order
+    
+    @staticmethod
+    def _sample_size(spec: str, total_runs: int) -> int:
+        """Number of runs for a sample size given as a count ("50") or a share of the suite ("10%")"""
+        spec = str(spec).strip()
+        if spec.endswith("%"):
+            size = round(total_runs * float(spec[:-1]) / 100)
+        else:
+            size = int(spec)
+        return max(1, min(total_runs, size))
+    
+    def _estimate_from_sample(self, order: Dict[str, List[Tuple[TestCase, TestRun]]], taken: Dict[str, int],
+                              results_by_run: Dict[int, RunEvaluationResult], rng: random.Random) -> Dict[str, Any]:
+        """Suite-wide verdict rates and weighted average score estimated from the sampled runs"""
+        sampling = self.config["evaluation"].get("sampling", {})
+        confidence = float(sampling.get("confidence", 0.95))
+        population = sum(len(runs) for runs in order.values())
+        sampled = {stratum: [results_by_run[id(test_run)] for _, test_run in runs[:taken[stratum]] if id(test_run) in results_by_run]
+                   for stratum, runs in order.items()}
+        weights = {stratum: len(runs) / population for stratum, runs in order.items()}
+        observed_weight = sum(weights[stratum] for stratum, results in sampled.items() if results)
+        sample_size = sum(len(results) for results in sampled.values())
+        
+        rates = {}
+        for label in ("CORRECT", "PARTIAL", "INCORRECT"):
+            estimate = sum(weights[stratum] / observed_weight * sum(1 for r in results if r.evaluation == label) / len(results)
+                           for stratum, results in sampled.items() if results) if observed_weight else 0.0
+            low, high = wilson_interval(estimate, sample_size, confidence, population)
+            rates[label] = {"estimate": estimate, "low": low, "high": high}
+        
+        scores = {stratum: [r.average_score for r in results if r.success] for stratum, results in sampled.items()}
+        score_weight = sum(weights[stratum] for stratum, values in scores.items() if values)
+        score = sum(weights[stratum] / score_weight * sum(values) / len(values)
+                    for stratum, values in scores.items() if values) if score_weight else 0.0
+        score_low, score_high = stratified_bootstrap_interval(scores, weights, confidence,
+                                                              int(sampling.get("bootstrap_samples", 2000)), rng)
+        return {
+            "population": population,
+            "sampled": sample_size,
+            "confidence": confidence,
+            "strata": {stratum: {"population": len(runs), "sampled": len(sampled[stratum])} for stratum, runs in order.items()},
+            "rates": rates,
+            "score": {"estimate": score, "low": score_low, "high": score_high},
+            "max_ci_width": max(rate["high"] - rate["low"] for rate in rates.values())
+        }
+    
+    def evaluate_sample(self, test_cases: List[TestCase], size: Optional[str] = None, target_ci_width: Optional[float] = None,
+                        resume: bool = False, incremental: bool = False) -> List[TestCaseResult]:
+        """Judge a stratified random sample of runs and estimate suite-wide pass rates.
+        
+        Runs are stratified by reference type with proportional allocation and spread
+        across test cases within each stratum. With target_ci_width, further rounds of
+        evaluation.sampling.round_size runs are judged until every verdict rate's
+        confidence interval is at most that wide (or the whole suite is judged).
+        Returns the results of the sampled runs; the estimate is kept in sampling_stats.
+        """
+        sampling = self.config["evaluation"].get("sampling", {})
+        rng = random.Random(sampling.get("seed"))
+        order = self._stratified_run_order(test_cases, rng)
+        population = {stratum: len(runs) for stratum, runs in order.items()}
+        total_runs = sum(population.values())
+        sample_size = self._sample_size(size or sampling.get("size", "10%"), total_runs)
+        min_per_stratum = int(sampling.get("min_per_stratum", 2))
+        round_size = max(1, int(sampling.get("round_size", 20)))
+        logger.info(f"Sampling {sample_size} of {total_runs} runs across strata "
+                    f"{', '.join(f'{stratum}={count}' for stratum, count in population.items())}")
+        
+        taken = {stratum: 0 for stratum in order}
+        results_by_run: Dict[int, RunEvaluationResult] = {}
+        dedup_totals = {"total_runs": 0, "unique_runs": 0, "llm_calls_saved": 0}
+        rounds = 0
+        while True:
+            batch = set()
+            for stratum, runs in order.items():
+                allocation = min(len(runs), max(min_per_stratum, round(sample_size * len(runs) / total_runs)))
+                batch.update(id(test_run) for _, test_run in runs[taken[stratum]:allocation])
+                taken[stratum] = max(taken[stratum], allocation)
+            
+            if batch:
+                rounds += 1
+                # Judge the new runs as a suite of their own, in test case order
+                round_cases = [TestCase(test_id=tc.test_id, input_text=tc.input_text, reference_output=tc.reference_output,
+                                        runs=[tr for tr in tc.runs if id(tr) in batch])
+                               for tc in test_cases if any(id(tr) in batch for tr in tc.runs)]
+                logger.info(f"Sampling round {rounds}: judging {len(batch)} runs")
+                # Later rounds append to the journal of the earlier ones
+                for tc_result in self.evaluate_batch(round_cases, resume=resume or rounds > 1, incremental=incremental):
+                    for run_result in tc_result.run_results:
+                        results_by_run[id(run_result.test_run)] = run_result
+                for key in dedup_totals:
+                    dedup_totals[key] += self.dedup_stats[key]
+            
+            estimate = self._estimate_from_sample(order, taken, results_by_run, rng)
+            judged = sum(taken.values())
+            logger.info(f"Sample estimate after {judged} runs: largest {estimate['confidence']:.0%} CI width {estimate['max_ci_width']:.3f}")
+            if target_ci_width is None or estimate["max_ci_width"] <= target_ci_width or judged >= total_runs:
+                break
+            sample_size = min(total_runs, sample_size + round_size)
+        
+        self.dedup_stats = dedup_totals
+        self.sampling_stats = {**estimate, "rounds": rounds, "target_ci_width": target_ci_width}
+        
+        results = []
+        for test_case in test_cases:
+            runs = [test_run for test_run in test_case.runs if id(test_run) in results_by_run]
+            if runs:
+                sampled_case = TestCase(test_id=test_case.test_id, input_text=test_case.input_text,
+                                        reference_output=test_case.reference_output, runs=runs)
+                results.append(TestCaseResult(test_case=sampled_case, run_results=[results_by_run[id(run)] for run in runs]))
+        return results
+    
+    def _judge_output_result(self, test_case: TestCase, test_run: TestRun, outcome: Any,
+                             stats: JudgeCallStats, start_time: float) -> RunEvaluationResult:
+        """Turn the judge's final text (or the exception it raised) into a run verdict"""
+        if isinstance(outcome, Exception):
+            evaluation, detailed_scores, rag_verification, reasoning, recommendation = (
+                "ERROR", DetailedScores(0, 0, 0, 0, 0), "", f"Evaluation failed: {str(outcome)}", "Fix technical issues")
+        else:
+            evaluation, detailed_scores, rag_verification, reasoning, recommendation = self._parse_structured_evaluation(outcome)
+        result = RunEvaluationResult(
+            test_case=test_case,
+            test_run=test_run,
+            evaluation=evaluation,
+            detailed_scores=detailed_scores,
+            rag_verification=rag_verification,
+            reasoning=reasoning,
+            recommendation=recommendation,
+            processing_time=time.time() - start_time,
+            success=True,
+            judge_stats=stats
+        )
+        logger.info(f"Run {test_run.run_number} completed: {evaluation} (Avg Score: {result.average_score:.1f}/10) ({result.processing_time:.2f}s)")
+        return result
+    
+    def evaluate_stream(self, test_cases: Iterable[TestCase]) -> str:
+        """Evaluate test cases as a stream through stages connected by bounded queues.
+        
+        parse -> dedup -> retrieve -> judge -> parse verdict -> sinks. Each stage runs in
+        its own thread (the judge stage in evaluation.max_concurrency threads) and the
+        queues hold at most evaluation.pipeline.queue_size items, so a slow judge holds
+        back the parser instead of letting work pile up. The sinks append every result
+        to the JSONL and CSV outputs and refresh the progressive report as results
+        arrive; nothing is collected in memory. Returns the archived JSON results file.
+        """
+        import csv
+        
+        if not self._check_server_health():
+            raise ConnectionError("LM Studio server is not available")
+        
+        pipeline = self.config["evaluation"].get("pipeline", {})
+        queue_size = max(1, int(pipeline.get("queue_size", 64)))
+        dedup_cache_size = max(0, int(pipeline.get("dedup_cache_size", 10000)))
+        progress_every = max(1, int(pipeline.get("progress_every", 25)))
+        workers = max(1, int(self.config["evaluation"].get("max_concurrency", 1)))
+        runs_queue, retrieve_queue, judge_queue, verdict_queue, sink_queue = (queue.Queue(maxsize=queue_size) for _ in range(5))
+        cancelled = threading.Event()
+        failures: List[Exception] = []
+        
+        # Verdicts of recently judged unique runs, and duplicates waiting for an in-flight judgement
+        verdict_cache: "OrderedDict[str, RunEvaluationResult]" = OrderedDict()
+        waiting: Dict[str, List[Tuple[TestCase, TestRun]]] = {}
+        dedup_lock = threading.Lock()
+        totals = {"test_cases": 0, "runs": 0, "unique_runs": 0, "duplicates": 0, "rules": 0,
+                  "CORRECT": 0, "PARTIAL": 0, "INCORRECT": 0, "ERROR": 0,
+                  "successes": 0, "score_sum": 0.0, "time_sum": 0.0, "llm_calls": 0}
+        recent: deque = deque(maxlen=20)
+        
+        def put(target: queue.Queue, item: Any):
+            # Blocks while the next stage is busy; gives up once the pipeline is cancelled
+            while not cancelled.is_set():
+                try:
+                    target.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+        
+        def get(source: queue.Queue) -> Any:
+            while not cancelled.is_set():
+                try:
+                    return source.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            return _STREAM_END
+        
+        def parse_stage():
+            for test_case in test_cases:
+                if cancelled.is_set():
+                    break
+                totals["test_cases"] += 1
+                for test_run in test_case.runs:
+                    put(runs_queue, (test_case, test_run))
+            put(runs_queue, _STREAM_END)
+        
+        def dedup_stage():
+            while (item := get(runs_queue)) is not _STREAM_END:
+                test_case, test_run = item
+                key = hashlib.sha256(repr(self._dedup_key(test_case, test_run)).encode("utf-8")).hexdigest()
+                with dedup_lock:
+                    source = verdict_cache.get(key)
+                    if source is not None:
+                        verdict_cache.move_to_end(key)
+                    elif key in waiting:
+                        waiting[key].append(item)
+                        continue
                     else:
-                        if logic_mode == "and":
-                            min_required = len(all_tokens)
-                        elif logic_mode == "or":
-                            min_required = 1
-                        else:
-                            min_required = max(1, int(len(all_tokens) * (0.8 if not and_required else 1.0)))
-                        unique_matched_all = set([m.lower() for m in matched])
-                        if len(unique_matched_all) < min_required:
-                            continue
-
-                if score > 0:
-                    fields_summary = {}
-                    if isinstance(entry, dict):
-                        for key in ["OfferId", "Merchant", "OfferCategoryTrained", "OfferCountry", "Gems", "Cashback", "Indulge", "Popular"]:
-                            if key in entry:
-                                fields_summary[key] = entry[key]
-                        text_out = _json.dumps(fields_summary or entry, ensure_ascii=False)[:1200]
-                        cid = entry.get('OfferId', idx)
+                        waiting[key] = []
+                if source is not None:
+                    put(sink_queue, self._duplicate_result(source, test_case, test_run))
+                else:
+                    put(retrieve_queue, (key, test_case, test_run))
+            put(retrieve_queue, _STREAM_END)
+            put(sink_queue, _STREAM_END)
+        
+        def retrieve_stage():
+            while (item := get(retrieve_queue)) is not _STREAM_END:
+                key, test_case, test_run = item
+                start_time = time.time()
+                logger.info(f"Processing test case {test_case.test_id}, Run {test_run.run_number}")
+                try:
+                    rule_result, rule_check = self._apply_rules(test_case, test_run, start_time)
+                    if rule_result:
+                        put(verdict_queue, (key, rule_result))
+                        continue
+                    messages, request_params = self._build_judge_messages(test_case, test_run, rule_check)
+                    put(judge_queue, (key, test_case, test_run, rule_check, messages, request_params, time.time() - start_time))
+                except Exception as e:
+                    put(verdict_queue, (key, self._failed_run_result(test_case, test_run, e, start_time)))
+            for _ in range(workers):
+                put(judge_queue, _STREAM_END)
+            put(verdict_queue, _STREAM_END)
+        
+        def judge_stage():
+            while (item := get(judge_queue)) is not _STREAM_END:
+                key, test_case, test_run, rule_check, messages, request_params, retrieve_seconds = item
+                # Time spent queued for a judge worker is not part of the run's processing time
+                start_time = time.time() - retrieve_seconds
+                stats = JudgeCallStats()
+                try:
+                    outcome = self._judge_with_cascade(messages, request_params, rule_check, stats)
+                except Exception as e:
+                    logger.error(f"Error during evaluation: {e}")
+                    outcome = e
+                put(verdict_queue, (key, (test_case, test_run, outcome, stats, start_time)))
+            put(verdict_queue, _STREAM_END)
+        
+        def verdict_stage():
+            producers = workers + 1
+            while producers:
+                item = get(verdict_queue)
+                if item is _STREAM_END:
+                    producers -= 1
+                    continue
+                key, outcome = item
+                result = outcome if isinstance(outcome, RunEvaluationResult) else self._judge_output_result(*outcome)
+                self._journal_result(result)
+                with dedup_lock:
+                    members = waiting.pop(key, [])
+                    if dedup_cache_size:
+                        verdict_cache[key] = result
+                        while len(verdict_cache) > dedup_cache_size:
+                            verdict_cache.popitem(last=False)
+                put(sink_queue, result)
+                for test_case, test_run in members:
+                    put(sink_queue, self._duplicate_result(result, test_case, test_run))
+            put(sink_queue, _STREAM_END)
+        
+        jsonl_file = self._suffixed("evaluation_results.jsonl")
+        csv_file = self._suffixed("evaluation_results.csv")
+        csv_archive = self._get_archive_path(self._get_versioned_filename(csv_file))
+        
+        def sink_stage():
+            producers = 2  # dedup (cached duplicates) and verdict stages
+            with open(jsonl_file, "w", encoding="utf-8") as jsonl, open(csv_archive, "w", newline="", encoding="utf-8") as csv_out:
+                writer = csv.DictWriter(csv_out, fieldnames=RESULT_CSV_FIELDS)
+                writer.writeheader()
+                while producers:
+                    result = get(sink_queue)
+                    if result is _STREAM_END:
+                        producers -= 1
+                        continue
+                    jsonl.write(json.dumps(self._result_json_entry(result.test_case, result), ensure_ascii=False) + "\n")
+                    writer.writerow(self._result_csv_row(result.test_case, result))
+                    
+                    totals["runs"] += 1
+                    totals[result.evaluation if result.evaluation in totals else "ERROR"] += 1
+                    totals["time_sum"] += result.processing_time
+                    if result.success:
+                        totals["successes"] += 1
+                        totals["score_sum"] += result.average_score
+                    if result.duplicate:
+                        totals["duplicates"] += 1
                     else:
-                        text_out = entry[:1200]
-                        cid = idx
-
-                    citations.append({
-                        "id": cid,
-                        "score": score,
-                        "matched": sorted(set(matched)),
-                        "text": text_out
-                    })
+                        totals["unique_runs"] += 1
+                        totals["rules"] += result.judged_by == "rules"
+                        totals["llm_calls"] += result.judge_stats.llm_calls if result.judge_stats else 0
+                    recent.append(result)
+                    
+                    if totals["runs"] % progress_every == 0:
+                        jsonl.flush()
+                        csv_out.flush()
+                        self._write_stream_progress(totals, recent)
+            self._write_stream_progress(totals, recent, finished=True)
+        
+        journal_config = self.config["evaluation"].get("journal", {})
+        if journal_config.get("enabled", True):
+            # A streaming run always starts over (it cannot be resumed), like evaluate_batch without resume
+            self._journal = EvaluationJournal(
+                self._suffixed(journal_config.get("file", "evaluation_journal.jsonl")),
+                fsync_every=int(journal_config.get("fsync_every", 10)),
+                fsync_interval=float(journal_config.get("fsync_interval_seconds", 5.0)),
+                truncate=True
+            )
+        
+        def start(name: str, body: Callable[[], None]) -> threading.Thread:
+            def run():
+                try:
+                    body()
+                except Exception as e:
+                    logger.error(f"Pipeline stage '{name}' failed: {e}")
+                    failures.append(e)
+                    cancelled.set()
+            thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            return thread
+        
+        logger.info(f"Streaming evaluation with {workers} judge workers and queues of {queue_size} items")
+        start_time = time.time()
+        threads = [start("parse", parse_stage), start("dedup", dedup_stage), start("retrieve", retrieve_stage)]
+        threads += [start(f"judge-{n}", judge_stage) for n in range(workers)]
+        threads += [start("verdict", verdict_stage), start("sink", sink_stage)]
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            cancelled.set()
+            raise
+        finally:
+            journal, self._journal = self._journal, None
+            if journal is not None:
+                journal.close()
+        if failures:
+            raise failures[0]
+        
+        self.dedup_stats = {"total_runs": totals["runs"], "unique_runs": totals["unique_runs"], "llm_calls_saved": totals["duplicates"]}
+        self.stream_totals = totals
+        logger.info(f"Streaming evaluation completed: {totals['runs']} runs of {totals['test_cases']} test cases "
+                    f"in {time.time() - start_time:.1f}s ({totals['duplicates']} duplicates, {totals['rules']} decided by rules)")
+        
+        # The JSON result set is rebuilt from the JSONL stream one line at a time
+        json_file = self._suffixed("evaluation_results.json")
+        json_archive = self._get_archive_path(self._get_versioned_filename(json_file))
+        with open(jsonl_file, "r", encoding="utf-8") as src, open(json_archive, "w", encoding="utf-8") as dst:
+            dst.write("[")
+            for n, line in enumerate(src):
+                dst.write(("," if n else "") + "\n  " + line.rstrip("\n"))
+            dst.write("\n]\n")
+        # The final report is the completed progressive report, built from the running totals
+        report_file = self._suffixed("evaluation_report.md")
+        report_archive = self._get_archive_path(self._get_versioned_filename(report_file))
+        shutil.copy2(self._suffixed("evaluation_report_progress.md"), report_archive)
+        if self.config["evaluation"]["versioning"]["enabled"] and self.config["evaluation"]["versioning"]["keep_latest_copy"]:
+            shutil.copy2(json_archive, json_file)
+            shutil.copy2(csv_archive, csv_file)
+            shutil.copy2(report_archive, report_file)
+        logger.info(f"Streamed results saved to {jsonl_file}, {json_archive}, {csv_archive} and {report_archive}")
+        return json_archive
+    
+    def print_stream_summary(self):
+        """Print the summary of the last streaming evaluation from its running totals"""
+        totals = self.stream_totals
+        runs = totals["runs"]
+        avg_time = totals["time_sum"] / runs if runs else 0
+        avg_score = totals["score_sum"] / totals["successes"] if totals["successes"] else 0
+        print("\n" + "="*140)
+        print("STREAMING EVALUATION SUMMARY")
+        print("="*140)
+        print(f"📊 Test Cases: {totals['test_cases']} | Total Runs: {runs}")
+        print(f"✅ Correct: {totals['CORRECT']} | ⚠️ Partial: {totals['PARTIAL']} | ❌ Incorrect: {totals['INCORRECT']} | 🚫 Errors: {totals['ERROR']}")
+        print(f"⏱️ Average Time: {avg_time:.2f}s | 📈 Success Rate: {(totals['CORRECT'] / runs * 100) if runs else 0:.1f}% | 🎯 Average Score: {avg_score:.1f}/10")
+        print(f"♻️ Deduplication: {totals['unique_runs']} unique runs judged | {totals['duplicates']} LLM calls saved | 📏 {totals['rules']} decided by rules")
+    
+    def _write_stream_progress(self, totals: Dict[str, Any], recent: deque, finished: bool = False):
+        """Rewrite the progressive report from the running totals of a streaming evaluation"""
+        filename = self._suffixed("evaluation_report_progress.md")
+        runs = totals["runs"]
+        avg_score = totals["score_sum"] / totals["successes"] if totals["successes"] else 0
+        avg_time = totals["time_sum"] / runs if runs else 0
+        report = f"""# LM Studio Evaluation Report - {"COMPLETE" if finished else "IN PROGRESS (streaming)"}
 
-            citations.sort(key=lambda c: c["score"], reverse=True)
-            return {
-                "citations": citations[:20],
-                "summary": f"Query='{query}' tokens={len(all_tokens)} results={len(citations)}"
-            }
+**Generated:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}  
+**Model:** gpt-oss-20b-mlx  
+**Evaluation System:** LM Studio Evaluator with RAG
 
-        # Run loop
-        while True:
-            response = self.client.chat.completions.create(
-                timeout=self.config["evaluation"]["timeout_seconds"],
-                **request_params
-            )
-            choice = response.choices[0]
-            msg = choice.message
+## Progress
 
-            # If we have final content, return it
-            if getattr(choice, "finish_reason", "stop") == "stop" and (msg.content and not getattr(msg, "tool_calls", None)):
-                return msg.content
+| Metric | Value |
+|--------|-------|
+| Test Cases Read | {totals['test_cases']} |
+| Runs Completed | {runs} |
+| Unique Runs Judged | {totals['unique_runs']} ({totals['rules']} decided by rules) |
+| LLM Calls | {totals['llm_calls']} |
+| LLM Calls Saved (deduplication) | {totals['duplicates']} |
+| Success Rate | {(totals['CORRECT'] / runs * 100) if runs else 0:.1f}% |
+| Average Score | {avg_score:.1f}/10 |
+| Average Processing Time | {avg_time:.2f}s |
+
+| Result Type | Count |
+|-------------|-------|
+| ✅ Correct | {totals['CORRECT']} |
+| ⚠️ Partial | {totals['PARTIAL']} |
+| ❌ Incorrect | {totals['INCORRECT']} |
+| 🚫 Errors | {totals['ERROR']} |
 
-            tool_calls = getattr(msg, "tool_calls", []) or []
-            if not tool_calls:
-                # Fallback: if no tools, but empty content, return empty to avoid hang
-                return msg.content or ""
+## Latest Results
 
-            # Execute only the first tool call to prevent loops
-            tool_call = tool_calls[0]
-            fn_name = tool_call.function.name
+| Test Case | Run | Result | Score | Time |
+|-----------|-----|--------|-------|------|
+"""
+        for result in reversed(recent):
+            report += f"| {result.test_case.test_id} | {result.test_run.run_number} | {result.evaluation} | {result.average_score:.1f} | {result.processing_time:.2f}s |\n"
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(report)
+    
+    @staticmethod
+    def _batch_job_id(test_case: TestCase, test_run: TestRun) -> str:
+        """Identifier of a run's judge job in batch job and result files.
+        
+        Like --incremental, it covers the run's timestamp and content hash, so results
+        of an older export never match a re-exported or edited run.
+        """
+        content_hash = run_content_hash(test_case.input_text, test_case.reference_output, test_run.response)
+        return f"{test_case.test_id}#run{test_run.run_number}@{test_run.timestamp}#{content_hash[:16]}"
+    
+    def batch_export(self, test_cases: List[TestCase], jobs_file: str = "judge_jobs.jsonl") -> int:
+        """Write one judge request per unique, not rule-decided run to a JSONL job file.
+        
+        Citations are always pre-retrieved so every job is a single request
+        without tools. Returns the number of jobs written.
+        """
+        if self.config["rag"]["enabled"] and not self._pre_retrieval_enabled():
+            logger.info("Batch export uses pre-retrieved citations (rag.pre_retrieval forced on)")
+            self.config["rag"]["pre_retrieval"] = True
+            self.judge_system_prompt = self._build_judge_system_prompt()
+        
+        groups = self._group_identical_runs(test_cases)
+        jobs_written = 0
+        rule_decided = 0
+        with open(jobs_file, "w", encoding="utf-8") as f:
+            for members in groups.values():
+                test_case, test_run = members[0]
+                rule_result, rule_check = self._apply_rules(test_case, test_run, time.time())
+                if rule_result:
+                    rule_decided += 1
+                    continue
+                _, request_params = self._build_judge_messages(test_case, test_run, rule_check)
+                job = {
+                    "custom_id": self._batch_job_id(test_case, test_run),
+                    "test_id": test_case.test_id,
+                    "run_number": test_run.run_number,
+                    "identical_runs": len(members),
+                    "request": request_params
+                }
+                f.write(json.dumps(job, ensure_ascii=False) + "\n")
+                jobs_written += 1
+        
+        logger.info(f"Exported {jobs_written} judge jobs to {jobs_file} "
+                    f"({sum(len(m) for m in groups.values())} runs, {len(groups)} unique, {rule_decided} decided by rules)")
+        return jobs_written
+    
+    def batch_run(self, jobs_file: str = "judge_jobs.jsonl", results_file: str = "judge_job_results.jsonl") -> Dict[str, int]:
+        """Process a judge job file at full concurrency, appending one result line per job.
+        
+        The results file doubles as the checkpoint: jobs that already have a
+        successful result are skipped, so an interrupted run can simply be restarted.
+        """
+        if not self._check_server_health():
+            raise ConnectionError("LM Studio server is not available")
+        
+        with open(jobs_file, "r", encoding="utf-8") as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+        
+        completed = set()
+        if Path(results_file).exists():
+            with open(results_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if not record.get("error"):
+                            completed.add(record["custom_id"])
+        pending = [job for job in jobs if job["custom_id"] not in completed]
+        logger.info(f"Batch run: {len(pending)} of {len(jobs)} jobs pending ({len(completed)} already completed)")
+        
+        write_lock = threading.Lock()
+        counts = {"completed": 0, "failed": 0, "skipped": len(jobs) - len(pending)}
+        
+        def run_job(job: Dict[str, Any]):
+            stats = JudgeCallStats()
+            start_time = time.time()
+            record = {"custom_id": job["custom_id"]}
             try:
-                fn_args = json.loads(tool_call.function.arguments or "{}")
-            except Exception:
-                fn_args = {}
-
-            if fn_name == "search_knowledge_base":
-                result = local_search_knowledge_base(fn_args.get("query", ""))
-            else:
-                result = {"error": f"Unknown tool: {fn_name}"}
-
-            # Append tool result as function message and continue
-            messages.append({
-                "role": "tool",
-                "tool_call_id": getattr(tool_call, "id", "1"),
-                "name": fn_name,
-                "content": json.dumps(result, ensure_ascii=False)
+                request_params = dict(job["request"])
+                record["content"] = self._run_chat_with_tools(list(request_params["messages"]), request_params, stats)
+            except Exception as e:
+                record["error"] = str(e)
+            record.update({
+                "latency": round(time.time() - start_time, 4),
+                "usage": {"prompt_tokens": stats.prompt_tokens, "completion_tokens": stats.completion_tokens,
+                          "cached_tokens": stats.cached_tokens},
+                "llm_calls": stats.llm_calls
             })
-            # Update request with new messages
-            request_params = {
-                **request_params,
-                "messages": messages
-            }
-    
-    def evaluate_single_run(self, test_case: TestCase, test_run: TestRun) -> RunEvaluationResult:
-        """Evaluate a single run of a test case"""
+            with write_lock:
+                with open(results_file, "a", encoding="utf-8") as out:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                counts["failed" if "error" in record else "completed"] += 1
+                done = counts["completed"] + counts["failed"]
+                if done % 10 == 0 or done == len(pending):
+                    logger.info(f"Batch run progress: {done}/{len(pending)} jobs ({counts['failed']} failed)")
+        
+        max_concurrency = max(1, int(self.config["evaluation"].get("max_concurrency", 1)))
         start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            list(executor.map(run_job, pending))
+        elapsed = time.time() - start_time
+        logger.info(f"Batch run finished in {elapsed:.1f}s: {counts['completed']} completed, {counts['failed']} failed, "
+                    f"{counts['skipped']} skipped ({counts['completed'] / elapsed * 60 if elapsed > 0 else 0:.1f} jobs/min)")
+        return counts
+    
+    def batch_import(self, test_cases: List[TestCase], results_file: str = "judge_job_results.jsonl") -> List[TestCaseResult]:
+        """Turn batch job results back into TestCaseResults.
         
-        try:
-            # Clear any previous chat context for fresh evaluation
-            if self.config["rag"]["enabled"] and self.config["rag"].get("use_plugin") == "rag-v1":
-                logger.debug("Starting fresh evaluation session")
-            
-            logger.info(f"Processing test case {test_case.test_id}, Run {test_run.run_number}")
-            
-            # Evaluate the response with detailed breakdown
-            evaluation, detailed_scores, rag_verification, reasoning, recommendation = self._evaluate_response(test_case, test_run)
+        Runs are regrouped exactly as in batch_export: rule-decided runs are
+        re-derived locally, judged runs take the verdict from their job result and
+        identical runs reuse it. Runs without a successful result are marked ERROR.
+        """
+        job_results: Dict[str, Dict[str, Any]] = {}
+        with open(results_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    # A later successful attempt replaces an earlier failure
+                    if record["custom_id"] not in job_results or not record.get("error"):
+                        job_results[record["custom_id"]] = record
+        
+        groups = self._group_identical_runs(test_cases)
+        total_runs = sum(len(tc.runs) for tc in test_cases)
+        self.dedup_stats = {"total_runs": total_runs, "unique_runs": len(groups), "llm_calls_saved": 0}
+        verdicts: Dict[tuple, Any] = {}
+        missing = 0
+        matched = set()
+        for key, members in groups.items():
+            test_case, test_run = members[0]
+            rule_result, _ = self._apply_rules(test_case, test_run, time.time())
+            if rule_result:
+                verdicts[key] = rule_result
+                continue
             
-            processing_time = time.time() - start_time
-            success = True
+            job_id = self._batch_job_id(test_case, test_run)
+            matched.add(job_id)
+            record = job_results.get(job_id)
+            if record is None or record.get("error") or not record.get("content"):
+                missing += 1
+                error = record.get("error", "empty response") if record else "no result in batch results file"
+                verdicts[key] = RunEvaluationResult(
+                    test_case=test_case,
+                    test_run=test_run,
+                    evaluation="ERROR",
+                    detailed_scores=DetailedScores(0, 0, 0, 0, 0),
+                    rag_verification="",
+                    reasoning=f"Batch job failed: {error}",
+                    recommendation="Re-run the batch job",
+                    processing_time=0.0,
+                    success=False
+                )
+                continue
             
-            result = RunEvaluationResult(
+            usage = record.get("usage", {})
+            stats = JudgeCallStats(
+                llm_calls=record.get("llm_calls", 1),
+                completion_tokens=usage.get("completion_tokens", 0),
+                generation_time=record.get("latency", 0.0),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                cached_tokens=usage.get("cached_tokens", 0)
+            )
+            evaluation, detailed_scores, rag_verification, reasoning, recommendation = self._parse_structured_evaluation(record["content"].strip())
+            verdicts[key] = RunEvaluationResult(
                 test_case=test_case,
                 test_run=test_run,
                 evaluation=evaluation,
@@ -802,191 +3819,168 @@ Begin evaluation:"""
                 rag_verification=rag_verification,
                 reasoning=reasoning,
                 recommendation=recommendation,
-                processing_time=processing_time,
-                success=success
-            )
-            
-            logger.info(f"Run {test_run.run_number} completed: {evaluation} (Avg Score: {result.average_score:.1f}/10) ({processing_time:.2f}s)")
-            return result
-            
-        except Exception as e:
-            processing_time = time.time() - start_time
-            logger.error(f"Run {test_run.run_number} failed: {e}")
-            
-            default_scores = DetailedScores(0, 0, 0, 0, 0)
-            return RunEvaluationResult(
-                test_case=test_case,
-                test_run=test_run,
-                evaluation="ERROR",
-                detailed_scores=default_scores,
-                rag_verification="",
-                reasoning=f"Test execution failed: {str(e)}",
-                recommendation="Fix technical issues and retry",
-                processing_time=processing_time,
-                success=False
+                processing_time=record.get("latency", 0.0),
+                success=True,
+                judge_stats=stats
             )
+        
+        stale = set(job_results) - matched
+        if stale:
+            logger.warning(f"{len(stale)} results in {results_file} match no run of the test data "
+                           f"(edited or re-exported since the batch ran); they are ignored")
+        if missing:
+            logger.warning(f"{missing} judged runs have no successful batch result and are marked ERROR")
+        results = [self.evaluate_test_case(test_case, verdicts) for test_case in test_cases]
+        logger.info(f"Imported batch results for {len(results)} test cases from {results_file}")
+        return results
     
-    def evaluate_test_case(self, test_case: TestCase) -> TestCaseResult:
-        """Evaluate all runs of a test case"""
-        logger.info(f"Evaluating test case {test_case.test_id} with {len(test_case.runs)} runs")
+    def _open_work_queue(self, queue_file: Optional[str] = None) -> WorkQueue:
+        queue_config = self.config["evaluation"].get("work_queue", {})
+        return WorkQueue(
+            queue_file or queue_config.get("file", "evaluation_queue.db"),
+            lease_seconds=float(queue_config.get("lease_seconds", 600))
+        )
+    
+    def coordinate(self, test_cases: List[TestCase], queue_file: Optional[str] = None) -> List[TestCaseResult]:
+        """Load the suite into the shared work queue, wait for workers and assemble the results.
         
-        run_results = []
-        last_response = None
-        last_result = None
+        One job is queued per group of identical runs, longest expected first.
+        Re-running the coordinator keeps finished jobs, so it can be restarted at any time.
+        """
+        work_queue = self._open_work_queue(queue_file)
+        poll_seconds = float(self.config["evaluation"].get("work_queue", {}).get("poll_seconds", 2))
         
-        for test_run in test_case.runs:
-            # If identical to previous run's response, duplicate the prior evaluation
-            if last_response is not None and test_run.response.strip() == str(last_response).strip() and last_result is not None:
-                logger.info(f"Run {test_run.run_number}: response identical to previous run; duplicating prior evaluation")
-                duplicated = RunEvaluationResult(
-                    test_case=test_case,
-                    test_run=test_run,
-                    evaluation=last_result.evaluation,
-                    detailed_scores=last_result.detailed_scores,
-                    rag_verification=last_result.rag_verification,
-                    reasoning=f"Duplicated from Run {last_result.test_run.run_number}: {last_result.reasoning}",
-                    recommendation=last_result.recommendation,
-                    processing_time=0.0,
-                    success=last_result.success
-                )
-                result = duplicated
-            else:
-                result = self.evaluate_single_run(test_case, test_run)
-                last_result = result
-                last_response = test_run.response
-            
-            run_results.append(result)
-            
-            # Add delay between runs to avoid overwhelming the system
-            delay = self.config["evaluation"]["delay_between_tests"]
-            if delay > 0 and test_run != test_case.runs[-1]:  # Don't delay after last run
-                logger.debug(f"Waiting {delay}s before next run...")
-                time.sleep(delay)
+        groups = self._group_identical_runs(test_cases)
+        representatives = {key: members[0] for key, members in groups.items()}
+        costs, _ = self._predict_run_costs(representatives)
+        jobs = [{
+            "job_id": self._batch_job_id(test_case, test_run),
+            "priority": costs[key],
+            "payload": {
+                "test_id": test_case.test_id,
+                "input": test_case.input_text,
+                "reference_output": test_case.reference_output,
+                "run_number": test_run.run_number,
+                "timestamp": test_run.timestamp,
+                "response": test_run.response
+            }
+        } for key, (test_case, test_run) in representatives.items()]
+        added = work_queue.enqueue(jobs)
+        logger.info(f"Work queue {work_queue.path}: {added} jobs queued, {len(jobs) - added} already present")
         
-        return TestCaseResult(
-            test_case=test_case,
-            run_results=run_results
-        )
+        start_time = time.time()
+        last_done = -1
+        job_ids = {job["job_id"] for job in jobs}
+        while True:
+            counts = work_queue.counts()
+            done = len(job_ids & work_queue.done_ids())
+            if done != last_done:
+                logger.info(f"Coordinator: {done}/{len(jobs)} jobs done, {counts.get('leased', 0)} leased, {counts.get('pending', 0)} pending")
+                last_done = done
+            if done >= len(jobs):
+                break
+            time.sleep(poll_seconds)
+        logger.info(f"All {len(jobs)} jobs finished in {time.time() - start_time:.1f}s")
+        
+        finished = work_queue.results()
+        total_runs = sum(len(tc.runs) for tc in test_cases)
+        self.dedup_stats = {"total_runs": total_runs, "unique_runs": len(groups), "llm_calls_saved": 0}
+        verdicts: Dict[tuple, Any] = {}
+        for key, (test_case, test_run) in representatives.items():
+            _, result = finished[self._batch_job_id(test_case, test_run)]
+            verdicts[key] = RunEvaluationResult.from_dict(result, test_case, test_run)
+        return [self.evaluate_test_case(test_case, verdicts) for test_case in test_cases]
     
-    def evaluate_batch(self, test_cases: List[TestCase]) -> List[TestCaseResult]:
-        """Evaluate multiple test cases sequentially with progressive reporting"""
+    def work(self, queue_file: Optional[str] = None, worker_id: Optional[str] = None) -> int:
+        """Claim and judge jobs from the shared work queue until none are left.
+        
+        Up to evaluation.max_concurrency jobs are judged at a time against this
+        node's backends, renewing their leases while they run. Failed runs
+        (including ERROR verdicts) go back to the queue until
+        work_queue.max_attempts is reached. A worker started before the
+        coordinator waits for it for up to work_queue.idle_timeout_seconds.
+        Returns the number of jobs judged.
+        """
         if not self._check_server_health():
             raise ConnectionError("LM Studio server is not available")
         
-        total_runs = sum(len(tc.runs) for tc in test_cases)
-        logger.info(f"Starting batch evaluation of {len(test_cases)} test cases with {total_runs} total runs")
-        results = []
-        delay = self.config["evaluation"]["delay_between_tests"]
+        work_queue = self._open_work_queue(queue_file)
+        queue_config = self.config["evaluation"].get("work_queue", {})
+        poll_seconds = float(queue_config.get("poll_seconds", 2))
+        max_attempts = int(queue_config.get("max_attempts", 3))
+        idle_timeout = float(queue_config.get("idle_timeout_seconds", 300))
+        renew_every = work_queue.lease_seconds / 3
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        max_concurrency = max(1, int(self.config["evaluation"].get("max_concurrency", 1)))
+        judged = 0
         
-        for i, test_case in enumerate(test_cases, 1):
-            logger.info(f"Processing test case {i}/{len(test_cases)}: {test_case.test_id}")
-            
-            # Add delay between test cases to avoid overwhelming the system
-            if i > 1 and delay > 0:
-                logger.debug(f"Waiting {delay}s before next test case...")
-                time.sleep(delay)
-            
-            result = self.evaluate_test_case(test_case)
-            results.append(result)
-            
-            # Progressive report update after each test case
-            self.update_progressive_report(results, i, len(test_cases))
+        def judge(job_id: str, payload: Dict[str, Any]) -> bool:
+            test_run = TestRun(run_number=payload["run_number"], timestamp=payload["timestamp"], response=payload["response"])
+            test_case = TestCase(test_id=payload["test_id"], input_text=payload["input"],
+                                 reference_output=payload["reference_output"], runs=[test_run])
+            result = self.evaluate_single_run(test_case, test_run)
+            # Judge errors (timeouts, lost connections) come back as ERROR verdicts
+            failed = not result.success or result.evaluation == "ERROR"
+            retry = failed and work_queue.attempts(job_id) < max_attempts
+            if not work_queue.complete(job_id, worker_id, result.to_dict(), retry=retry):
+                logger.warning(f"Worker {worker_id}: lease on {job_id} expired; result discarded")
+                return False
+            return True
         
-        logger.info(f"Batch evaluation completed: {len(results)} test cases evaluated")
-        return results
+        logger.info(f"Worker {worker_id} started on {work_queue.path} with {max_concurrency} parallel slots")
+        started = time.time()
+        last_renewal = time.time()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            running: Dict[Future, str] = {}
+            while True:
+                free_slots = max_concurrency - len(running)
+                if free_slots > 0:
+                    for job_id, payload in work_queue.claim(worker_id, free_slots):
+                        running[executor.submit(judge, job_id, payload)] = job_id
+                
+                if not running:
+                    counts = work_queue.counts()
+                    if not counts.get("pending", 0) and not counts.get("leased", 0):
+                        if work_queue.enqueued_at() is not None:
+                            break
+                        if time.time() - started >= idle_timeout:
+                            logger.info(f"Worker {worker_id}: no coordinator loaded the queue within {idle_timeout:.0f}s")
+                            break
+                    # Other workers hold the remaining leases (wait in case one expires),
+                    # or the coordinator has not queued the suite yet
+                    time.sleep(poll_seconds)
+                    continue
+                
+                if time.time() - last_renewal >= renew_every:
+                    work_queue.renew(list(running.values()), worker_id)
+                    last_renewal = time.time()
+                
+                finished = [future for future in running if future.done()]
+                if not finished:
+                    time.sleep(0.05)
+                    continue
+                for future in finished:
+                    job_id = running.pop(future)
+                    try:
+                        if future.result():
+                            judged += 1
+                    except Exception as e:
+                        logger.error(f"Worker {worker_id}: job {job_id} failed: {e}")
+        
+        logger.info(f"Worker {worker_id} finished: {judged} jobs judged")
+        return judged
     
     def parse_user_test_data(self, file_path: str = "user_test_data.txt") -> List[TestCase]:
-        """Parse the user test data file into TestCase objects"""
+        """Parse the user test data file into TestCase objects, reusing the parsed-suite cache when it is current"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            test_cases = []
-            lines = content.split('\n')
-            i = 0
-            
-            while i < len(lines):
-                line = lines[i].strip()
-                
-                # Look for "Test Case" followed by a number
-                if line == "Test Case" and i + 1 < len(lines):
-                    test_id = lines[i + 1].strip()
-                    i += 2
-                    
-                    # Parse Input
-                    if i < len(lines) and lines[i].strip() == "Input":
-                        i += 1
-                        input_text = lines[i].strip() if i < len(lines) else ""
-                        i += 1
-                    else:
-                        input_text = ""
-                    
-                    # Parse Reference
-                    if i < len(lines) and lines[i].strip() == "Reference":
-                        i += 1
-                        reference_output = lines[i].strip() if i < len(lines) else ""
-                        i += 1
-                    else:
-                        reference_output = ""
-                    
-                    # Parse Runs
-                    runs = []
-                    while i < len(lines):
-                        line = lines[i].strip()
-                        if line.startswith("Run "):
-                            try:
-                                run_number = int(line.split()[1])
-                                i += 1
-                                
-                                # Skip empty line
-                                if i < len(lines) and lines[i].strip() == "":
-                                    i += 1
-                                
-                                # Get timestamp
-                                timestamp = lines[i].strip() if i < len(lines) else ""
-                                i += 1
-                                
-                                # Get response (might be multi-line)
-                                response_lines = []
-                                while i < len(lines):
-                                    next_line = lines[i].strip()
-                                    if next_line.startswith("Run ") or next_line == "Test Case":
-                                        break
-                                    if next_line:  # Skip empty lines
-                                        response_lines.append(next_line)
-                                    i += 1
-                                
-                                response = " ".join(response_lines)
-                                
-                                runs.append(TestRun(
-                                    run_number=run_number,
-                                    timestamp=timestamp,
-                                    response=response
-                                ))
-                                
-                                # Don't increment i here as we're already at the next section
-                                continue
-                                
-                            except (ValueError, IndexError):
-                                i += 1
-                                continue
-                        elif line == "Test Case":
-                            # Start of next test case
-                            break
-                        else:
-                            i += 1
-                    
-                    if runs:  # Only add test case if it has runs
-                        test_cases.append(TestCase(
-                            test_id=test_id,
-                            input_text=input_text,
-                            reference_output=reference_output,
-                            runs=runs
-                        ))
-                else:
-                    i += 1
-            
+            with paused_gc():
+                test_cases = self._load_test_data_cache(file_path)
+                if test_cases is not None:
+                    logger.info(f"Loaded {len(test_cases)} test cases for {file_path} from cache")
+                    return test_cases
+                test_cases = list(self.iter_user_test_data(file_path))
             logger.info(f"Parsed {len(test_cases)} test cases from {file_path}")
+            self._write_test_data_cache(file_path, test_cases)
             return test_cases
             
         except FileNotFoundError:
@@ -996,6 +3990,178 @@ Begin evaluation:"""
             logger.error(f"Error parsing test data: {e}")
             raise
     
+    def iter_user_test_data(self, file_path: str = "user_test_data.txt") -> Iterator[TestCase]:
+        """Yield the test cases of the user test data file one at a time, reading it line by line.
+        
+        The format follows the extension: .jsonl/.ndjson and .csv suites (one record
+        per run or per test case), otherwise the scraped dashboard text export.
+        Once the whole file has been read, the byte range of every test case is
+        written to the sidecar offset index (see load_test_cases).
+        """
+        offsets: Dict[str, List[List[int]]] = {}
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            for test_case, start, end in iter_suite_records(test_data_format(file_path), iter_offset_lines(f)):
+                offsets.setdefault(test_case.test_id, []).append([start, end if end is not None else size])
+                yield test_case
+        if self.config["evaluation"].get("test_data_index", True):
+            self._write_test_data_index(file_path, offsets)
+    
+    @staticmethod
+    def _test_data_index_path(file_path: str) -> str:
+        return f"{file_path}.index.json"
+    
+    def _write_test_data_index(self, file_path: str, offsets: Dict[str, List[List[int]]]):
+        """Save test_id -> byte ranges of a test data file, stamped with its size and mtime"""
+        stat = os.stat(file_path)
+        index = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "test_cases": offsets}
+        try:
+            with open(self._test_data_index_path(file_path), "w", encoding="utf-8") as f:
+                json.dump(index, f)
+        except OSError as e:
+            logger.warning(f"Could not write test data index for {file_path}: {e}")
+    
+    def _load_test_data_index(self, file_path: str) -> Dict[str, List[List[int]]]:
+        """test_id -> byte ranges of a test data file, re-indexing it when the sidecar is missing or stale"""
+        stat = os.stat(file_path)
+        try:
+            with open(self._test_data_index_path(file_path), "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("size") == stat.st_size and index.get("mtime_ns") == stat.st_mtime_ns:
+                return index["test_cases"]
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        logger.info(f"Indexing {file_path}")
+        offsets: Dict[str, List[List[int]]] = {}
+        with open(file_path, "rb") as f:
+            for test_case, start, end in iter_suite_records(test_data_format(file_path), iter_offset_lines(f)):
+                offsets.setdefault(test_case.test_id, []).append([start, end if end is not None else stat.st_size])
+        self._write_test_data_index(file_path, offsets)
+        return offsets
+    
+    def load_test_cases(self, file_path: str, test_ids: List[str]) -> List[TestCase]:
+        """Parse only the given test cases, reading their byte ranges through mmap via the offset index"""
+        offsets = self._load_test_data_index(file_path)
+        test_cases = []
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                file_format = test_data_format(file_path)
+                fieldnames = None
+                if file_format == "csv":
+                    # Slices of a CSV suite are read with the file's header
+                    import csv
+                    fieldnames = next(csv.reader([data[:data.find(b"\n") + 1].decode("utf-8-sig")]), None)
+                for test_id in test_ids:
+                    if test_id not in offsets:
+                        logger.warning(f"Test case {test_id} not found in {file_path}")
+                        continue
+                    for start, end in offsets[test_id]:
+                        lines = data[start:end].splitlines(keepends=True)
+                        records = iter_suite_records(file_format, iter_offset_lines(lines, start), fieldnames)
+                        test_cases.extend(test_case for test_case, _, _ in records)
+        logger.info(f"Loaded {len(test_cases)} of {len(offsets)} test cases from {file_path} by offset")
+        return test_cases
+
+    def _test_data_cache_path(self, file_path: str) -> Optional[str]:
+        """Cache file for a test data file, or None when evaluation.test_data_cache is disabled"""
+        cache_config = self.config["evaluation"].get("test_data_cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+        absolute = os.path.abspath(file_path)
+        name = f"{Path(absolute).name}-{hashlib.sha256(absolute.encode('utf-8')).hexdigest()[:12]}.pickle"
+        return os.path.join(cache_config.get("folder", ".test_data_cache"), name)
+
+    def _load_test_data_cache(self, file_path: str) -> Optional[List[TestCase]]:
+        """Test cases from the parsed-suite cache, or None when it is missing or out of date.
+
+        A cache written by different parsing code (see test_data_parser_fingerprint) is
+        never used. A matching size and mtime is trusted as is. When only the mtime changed,
+        the content hash decides, so touching or re-copying an unchanged file keeps the cache.
+        """
+        cache_path = self._test_data_cache_path(file_path)
+        stat = os.stat(file_path)
+        if cache_path is None or not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "rb") as f:
+                cache = pickle.load(f)
+            if cache.get("parser") != test_data_parser_fingerprint() or cache.get("size") != stat.st_size:
+                return None
+            if cache.get("mtime_ns") != stat.st_mtime_ns:
+                if cache.get("sha256") != file_sha256(file_path):
+                    return None
+                cache["mtime_ns"] = stat.st_mtime_ns
+                self._store_test_data_cache(cache_path, cache)
+            return [
+                TestCase(test_id=test_id, input_text=input_text, reference_output=reference_output,
+                         runs=[TestRun.from_parsed(*run) for run in runs])
+                for test_id, input_text, reference_output, runs in cache["test_cases"]
+            ]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable test data cache {cache_path}: {e}")
+            return None
+
+    def _write_test_data_cache(self, file_path: str, test_cases: List[TestCase]):
+        """Save parsed test cases as plain tuples, stamped with the file's size, mtime and content hash"""
+        cache_path = self._test_data_cache_path(file_path)
+        if cache_path is None:
+            return
+        stat = os.stat(file_path)
+        cache = {
+            "version": TEST_DATA_CACHE_VERSION,
+            "parser": test_data_parser_fingerprint(),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(file_path),
+            "test_cases": [
+                (tc.test_id, tc.input_text, tc.reference_output,
+                 [(run.run_number, run.timestamp, run.response, run.parsed_response) for run in tc.runs])
+                for tc in test_cases
+            ]
+        }
+        self._store_test_data_cache(cache_path, cache)
+
+    @staticmethod
+    def _store_test_data_cache(cache_path: str, cache: Dict[str, Any]):
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write test data cache {cache_path}: {e}")
+    
+    def _summarize_judge_stats(self, results: List[TestCaseResult]) -> Dict[str, Any]:
+        """Aggregate per-run judge telemetry across all LLM-judged runs"""
+        judged = [run.judge_stats for tc in results for run in tc.run_results
+                  if run.judge_stats is not None and not run.duplicate]
+        # Runs judged in one batched request share a single stats object
+        stats = list({id(s): s for s in judged}.values())
+        ttfts = [s.time_to_first_token for s in stats if s.time_to_first_token is not None]
+        completion_tokens = sum(s.completion_tokens for s in stats)
+        generation_time = sum(s.generation_time for s in stats)
+        return {
+            "judged_runs": len(judged),
+            "llm_calls": sum(s.llm_calls for s in stats),
+            "avg_time_to_first_token": sum(ttfts) / len(ttfts) if ttfts else None,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": completion_tokens / generation_time if generation_time > 0 else 0.0,
+            "early_stopped": sum(1 for s in stats if s.early_stopped),
+            "prompt_tokens": sum(s.prompt_tokens for s in stats),
+            "cached_tokens": sum(s.cached_tokens for s in stats),
+            "coalesced_calls": sum(s.coalesced_calls for s in stats),
+            "round_trips": sum(s.round_trips for s in stats),
+            "max_round_trips": max((s.round_trips for s in stats), default=0),
+            "avg_round_trips": sum(s.round_trips for s in stats) / len(stats) if stats else 0.0,
+            "tool_calls": sum(s.tool_calls for s in stats),
+            "avg_iteration_time": sum(sum(s.iteration_times) for s in stats) / max(1, sum(len(s.iteration_times) for s in stats)),
+            "budget_exhausted": sum(1 for s in stats if s.budget_exhausted)
+        }
+    
     def print_results_summary(self, results: List[TestCaseResult]):
         """Print a comprehensive table summary of evaluation results with multiple runs"""
         total_test_cases = len(results)
@@ -1022,6 +4188,53 @@ Begin evaluation:"""
         print(f"📊 Test Cases: {total_test_cases} | Total Runs: {total_runs}")
         print(f"✅ Correct: {correct_runs} | ⚠️ Partial: {partial_runs} | ❌ Incorrect: {incorrect_runs} | 🚫 Errors: {error_runs}")
         print(f"⏱️ Average Time: {avg_time:.2f}s | 📈 Success Rate: {(correct_runs/total_runs)*100:.1f}% | 🎯 Average Score: {avg_score:.1f}/10")
+        if self.dedup_stats["total_runs"]:
+            print(f"♻️ Deduplication: {self.dedup_stats['unique_runs']} unique runs judged | {self.dedup_stats['llm_calls_saved']} LLM calls saved")
+        rule_runs = sum(1 for tc in results for run in tc.run_results if run.judged_by == "rules")
+        if rule_runs:
+            print(f"📏 Rule-based pre-judge: {rule_runs} runs decided without the LLM")
+        if self.sampling_stats:
+            sample = self.sampling_stats
+            rates = " | ".join(f"{label}: {rate['estimate']:.1%} [{rate['low']:.1%}, {rate['high']:.1%}]"
+                               for label, rate in sample["rates"].items())
+            print(f"🎲 Sample: {sample['sampled']}/{sample['population']} runs in {sample['rounds']} rounds | "
+                  f"{sample['confidence']:.0%} CI {rates}")
+            print(f"🎲 Estimated average score: {sample['score']['estimate']:.2f}/10 "
+                  f"[{sample['score']['low']:.2f}, {sample['score']['high']:.2f}]")
+        if self.incremental_stats:
+            incremental = self.incremental_stats
+            print(f"🧩 Incremental: {incremental['reused_runs']} unique runs reused from {incremental['baseline'] or 'no baseline'} | "
+                  f"{incremental['judged_runs']} judged")
+        if self.schedule_stats.get("actual_makespan") is not None:
+            schedule = self.schedule_stats
+            print(f"⏱️ Makespan: predicted {schedule['predicted_makespan']:.1f}s | actual {schedule['actual_makespan']:.1f}s | "
+                  f"{schedule['history_hits']}/{schedule['scheduled_runs']} runs predicted from history")
+        judge_summary = self._summarize_judge_stats(results)
+        if judge_summary["judged_runs"]:
+            ttft = judge_summary["avg_time_to_first_token"]
+            ttft_display = f"{ttft:.2f}s" if ttft is not None else "N/A"
+            print(f"🚀 Judge: {judge_summary['llm_calls']} LLM calls | TTFT: {ttft_display} | {judge_summary['tokens_per_second']:.1f} tokens/s | Early stops: {judge_summary['early_stopped']}")
+            if judge_summary["prompt_tokens"]:
+                cache_rate = judge_summary["cached_tokens"] / judge_summary["prompt_tokens"] * 100
+                print(f"🗄️ Prompt tokens: {judge_summary['prompt_tokens']} | Cached: {judge_summary['cached_tokens']} ({cache_rate:.1f}%)")
+            print(f"🔁 Round trips: {judge_summary['avg_round_trips']:.2f} avg / {judge_summary['max_round_trips']} max | "
+                  f"Tool calls: {judge_summary['tool_calls']} | Budgets exhausted: {judge_summary['budget_exhausted']}")
+            if judge_summary["coalesced_calls"]:
+                print(f"🔗 Coalesced requests: {judge_summary['coalesced_calls']} (served by an identical request already in flight)")
+        if self.cascade_stats["judged"]:
+            cascade = self.cascade_stats
+            speedup = self._cascade_speedup()
+            print(f"🪜 Cascade: {cascade['escalated']}/{cascade['judged']} escalated to the heavy judge "
+                  f"({cascade['escalated'] / cascade['judged'] * 100:.1f}%) | "
+                  f"Estimated speedup: {f'up to {speedup:.2f}x' if speedup else 'N/A'}")
+        if self.hedge_stats["hedged"]:
+            hedge = self.hedge_stats
+            print(f"🏁 Hedged: {hedge['hedged']}/{hedge['judge_calls']} calls ({hedge['hedged'] / hedge['judge_calls'] * 100:.1f}%) | "
+                  f"Hedge wins: {hedge['hedge_wins']} | Time saved: {hedge['time_saved']:.1f}s")
+        if len(self.backend_pool.backends) > 1:
+            for row in self.backend_pool.summary():
+                print(f"🖥️ {row['base_url']}: {row['requests']} requests | {row['failures']} failed | "
+                      f"{row['ejections']} ejections | avg {row['avg_latency']:.2f}s | {row['requests_per_minute']:.1f} req/min")
         print("="*140)
         
         # Print table header
@@ -1083,6 +4296,171 @@ Begin evaluation:"""
             
             print("─" * 80)
     
+    @staticmethod
+    def _result_json_entry(test_case: TestCase, run_result: RunEvaluationResult) -> Dict[str, Any]:
+        """One run's entry in the JSON (and streamed JSONL) results"""
+        result_dict = {
+            "test_id": test_case.test_id,
+            "run_number": run_result.test_run.run_number,
+            "timestamp": run_result.test_run.timestamp,
+            "input": test_case.input_text,
+            "reference_output": test_case.reference_output,
+            "actual_output": run_result.test_run.response,
+            "evaluation": run_result.evaluation,
+            "processing_time": run_result.processing_time,
+            "success": run_result.success,
+            "average_score": run_result.average_score if run_result.success else 0,
+            "judged_by": run_result.judged_by,
+            "duplicate": run_result.duplicate
+        }
+        
+        # Add detailed scores if available
+        if run_result.success and run_result.detailed_scores:
+            result_dict.update({
+                "detailed_scores": {
+                    "factual_accuracy": run_result.detailed_scores.factual_accuracy,
+                    "completeness": run_result.detailed_scores.completeness,
+                    "order_sequence": run_result.detailed_scores.order_sequence,
+                    "relevance": run_result.detailed_scores.relevance,
+                    "overall_quality": run_result.detailed_scores.overall_quality
+                },
+                "rag_verification": run_result.rag_verification,
+                "reasoning": run_result.reasoning,
+                "recommendation": run_result.recommendation
+            })
+        return result_dict
+    
+    def export_results_to_json(self, results: List[TestCaseResult], filename: str = "evaluation_results.json") -> str:
+        """Export results to JSON format with versioning; returns the archive path"""
+        results_data = [self._result_json_entry(tc_result.test_case, run_result)
+                        for tc_result in results for run_result in tc_result.run_results]
+        
+        # Save JSON with versioning
+        versioned_filename = self._get_versioned_filename(filename)
+        archive_path = self._get_archive_path(versioned_filename)
+        
+        with open(archive_path, "w") as f:
+            json.dump(results_data, f, indent=2)
+        
+        # Copy to current filename if keep_latest_copy is enabled
+        if self.config["evaluation"]["versioning"]["enabled"] and self.config["evaluation"]["versioning"]["keep_latest_copy"]:
+            shutil.copy2(archive_path, filename)
+        return archive_path
+    
+    @staticmethod
+    def _run_result_from_entry(entry: Dict[str, Any], test_case: TestCase, test_run: TestRun) -> RunEvaluationResult:
+        """Rebuild a run verdict from an evaluation_results JSON entry"""
+        scores = entry.get("detailed_scores") or {}
+        return RunEvaluationResult(
+            test_case=test_case,
+            test_run=test_run,
+            evaluation=entry["evaluation"],
+            detailed_scores=DetailedScores(**scores) if scores else DetailedScores(0, 0, 0, 0, 0),
+            rag_verification=entry.get("rag_verification", ""),
+            reasoning=entry.get("reasoning", ""),
+            recommendation=entry.get("recommendation", ""),
+            processing_time=entry.get("processing_time", 0.0),
+            success=entry.get("success", False),
+            judged_by=entry.get("judged_by", "llm"),
+            duplicate=entry.get("duplicate", False)
+        )
+    
+    def load_results_json(self, paths: List[str], test_cases: Optional[List[TestCase]] = None) -> List[TestCaseResult]:
+        """Rebuild TestCaseResults from one or more evaluation_results JSON files.
+        
+        Test cases follow the order of test_cases when given (e.g. the parsed test
+        data), otherwise their order of appearance in the files.
+        """
+        by_test_id: Dict[str, Tuple[TestCase, List[RunEvaluationResult]]] = {}
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            for entry in entries:
+                test_id = str(entry["test_id"])
+                if test_id not in by_test_id:
+                    by_test_id[test_id] = (TestCase(test_id=test_id, input_text=entry.get("input", ""),
+                                                    reference_output=entry.get("reference_output", ""), runs=[]), [])
+                test_case, run_results = by_test_id[test_id]
+                test_run = TestRun(run_number=entry["run_number"], timestamp=entry.get("timestamp", ""),
+                                   response=entry.get("actual_output", ""))
+                test_case.runs.append(test_run)
+                run_results.append(self._run_result_from_entry(entry, test_case, test_run))
+        
+        order = {tc.test_id: position for position, tc in enumerate(test_cases or [])}
+        ordered = sorted(by_test_id.values(), key=lambda item: order.get(item[0].test_id, len(order)))
+        return [TestCaseResult(test_case=test_case, run_results=sorted(run_results, key=lambda r: r.test_run.run_number))
+                for test_case, run_results in ordered]
+    
+    def merge_shards(self, paths: List[str], test_cases: Optional[List[TestCase]] = None) -> List[TestCaseResult]:
+        """Combine shard result files into one result set"""
+        if not paths:
+            raise FileNotFoundError("No shard result files to merge")
+        results = self.load_results_json(paths, test_cases)
+        total_runs = sum(len(tc.run_results) for tc in results)
+        logger.info(f"Merged {len(paths)} shard files: {len(results)} test cases, {total_runs} runs")
+        if test_cases:
+            missing = [tc.test_id for tc in test_cases if tc.test_id not in {r.test_case.test_id for r in results}]
+            if missing:
+                logger.warning(f"{len(missing)} test cases are missing from the shard files: {', '.join(missing[:10])}")
+        self.dedup_stats = {"total_runs": total_runs, "unique_runs": total_runs, "llm_calls_saved": 0}
+        return results
+    
+    def save_results(self, results: List[TestCaseResult]):
+        """Write the JSON, CSV and markdown outputs of a finished evaluation"""
+        json_archive_path = self.export_results_to_json(results, self._suffixed("evaluation_results.json"))
+        
+        # Export to CSV for easy analysis
+        self.export_results_to_csv(results, self._suffixed("evaluation_results.csv"))
+        
+        # Generate comprehensive final report
+        report_file = self.generate_final_report(results, self._suffixed("evaluation_report.md"))
+        
+        logger.info(f"Multi-run results saved with version {self.version_string}")
+        logger.info(f"Files: {json_archive_path}, CSV, and {report_file}")
+        if self.config["evaluation"]["versioning"]["enabled"] and self.config["evaluation"]["versioning"]["keep_latest_copy"]:
+            logger.info("Latest copies also saved without version suffix")
+    
+    @staticmethod
+    def _result_csv_row(test_case: TestCase, run_result: RunEvaluationResult) -> Dict[str, Any]:
+        """One run's row in the CSV results"""
+        row = {
+            'test_id': test_case.test_id,
+            'run_number': run_result.test_run.run_number,
+            'timestamp': run_result.test_run.timestamp,
+            'evaluation': run_result.evaluation,
+            'processing_time': run_result.processing_time,
+            'input': test_case.input_text,
+            'reference_output': test_case.reference_output,
+            'actual_output': run_result.test_run.response,
+            'success': run_result.success
+        }
+        
+        if run_result.success and run_result.detailed_scores:
+            row.update({
+                'factual_accuracy': run_result.detailed_scores.factual_accuracy,
+                'completeness': run_result.detailed_scores.completeness,
+                'order_sequence': run_result.detailed_scores.order_sequence,
+                'relevance': run_result.detailed_scores.relevance,
+                'overall_quality': run_result.detailed_scores.overall_quality,
+                'average_score': run_result.average_score,
+                'rag_verification': run_result.rag_verification,
+                'reasoning': run_result.reasoning,
+                'recommendation': run_result.recommendation
+            })
+        else:
+            row.update({
+                'factual_accuracy': 0,
+                'completeness': 0,
+                'order_sequence': 0,
+                'relevance': 0,
+                'overall_quality': 0,
+                'average_score': 0,
+                'rag_verification': '',
+                'reasoning': run_result.reasoning if hasattr(run_result, 'reasoning') else '',
+                'recommendation': run_result.recommendation if hasattr(run_result, 'recommendation') else ''
+            })
+        return row
+    
     def export_results_to_csv(self, results: List[TestCaseResult], filename: str = "evaluation_results.csv"):
         """Export results to CSV format for easy analysis with multi-run support"""
         import csv
@@ -1092,56 +4470,12 @@ Begin evaluation:"""
         archive_path = self._get_archive_path(versioned_filename)
         
         with open(archive_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'test_id', 'run_number', 'timestamp', 'evaluation', 'factual_accuracy', 'completeness', 
-                'order_sequence', 'relevance', 'overall_quality', 'average_score',
-                'processing_time', 'input', 'reference_output', 'actual_output',
-                'rag_verification', 'reasoning', 'recommendation', 'success'
-            ]
-            
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=RESULT_CSV_FIELDS)
             writer.writeheader()
             
             for tc_result in results:
                 for run_result in tc_result.run_results:
-                    row = {
-                        'test_id': tc_result.test_case.test_id,
-                        'run_number': run_result.test_run.run_number,
-                        'timestamp': run_result.test_run.timestamp,
-                        'evaluation': run_result.evaluation,
-                        'processing_time': run_result.processing_time,
-                        'input': tc_result.test_case.input_text,
-                        'reference_output': tc_result.test_case.reference_output,
-                        'actual_output': run_result.test_run.response,
-                        'success': run_result.success
-                    }
-                    
-                    if run_result.success and run_result.detailed_scores:
-                        row.update({
-                            'factual_accuracy': run_result.detailed_scores.factual_accuracy,
-                            'completeness': run_result.detailed_scores.completeness,
-                            'order_sequence': run_result.detailed_scores.order_sequence,
-                            'relevance': run_result.detailed_scores.relevance,
-                            'overall_quality': run_result.detailed_scores.overall_quality,
-                            'average_score': run_result.average_score,
-                            'rag_verification': run_result.rag_verification,
-                            'reasoning': run_result.reasoning,
-                            'recommendation': run_result.recommendation
-                        })
-                    else:
-                        row.update({
-                            'factual_accuracy': 0,
-                            'completeness': 0,
-                            'order_sequence': 0,
-                            'relevance': 0,
-                            'overall_quality': 0,
-                            'average_score': 0,
-                            'rag_verification': '',
-                            'reasoning': run_result.reasoning if hasattr(run_result, 'reasoning') else '',
-                            'recommendation': run_result.recommendation if hasattr(run_result, 'recommendation') else ''
-                        })
-                    
-                    writer.writerow(row)
+                    writer.writerow(self._result_csv_row(tc_result.test_case, run_result))
         
         # Copy to current filename if keep_latest_copy is enabled
         if self.config["evaluation"]["versioning"]["enabled"] and self.config["evaluation"]["versioning"]["keep_latest_copy"]:
@@ -1151,6 +4485,67 @@ Begin evaluation:"""
         if self.config["evaluation"]["versioning"]["enabled"] and self.config["evaluation"]["versioning"]["keep_latest_copy"]:
             logger.info(f"Latest copy saved as {filename}")
     
+    def _cascade_speedup(self) -> Optional[float]:
+        """Estimated judge-time speedup of the cascade over judging every run with the heavy model.
+        
+        The heavy-only time is extrapolated from the heavy calls of escalated runs
+        (None until a run was escalated). Those are the harder, slower runs, so the
+        extrapolation overstates heavy-only time and the estimate is an upper bound.
+        """
+        cascade = self.cascade_stats
+        spent = cascade["cheap_seconds"] + cascade["heavy_seconds"]
+        if not cascade["escalated"] or spent <= 0:
+            return None
+        return cascade["heavy_seconds"] / cascade["escalated"] * cascade["judged"] / spent
+    
+    def _cascade_report_section(self) -> str:
+        """Markdown section describing the judge cascade and its escalations"""
+        config = self.config["evaluation"].get("cascade", {})
+        cascade = self.cascade_stats
+        speedup = self._cascade_speedup()
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(cascade["reasons"].items())) or "none"
+        return f"""
+### Judge Cascade
+
+| Metric | Value |
+|--------|-------|
+| Cheap Tier | {config.get('model_name') or self.config['lm_studio']['model_name']} (reasoning effort: {config.get('reasoning_effort') or 'default'}, max tokens: {config.get('max_tokens') or 'default'}) |
+| Heavy Tier | {self.config['lm_studio']['model_name']} |
+| Boundary Margin | ±{float(config.get('boundary_margin', 0.5)):.2f} around 4.0 / 7.0 |
+| Runs Judged | {cascade['judged']} |
+| Escalated | {cascade['escalated']} ({cascade['escalated'] / cascade['judged'] * 100:.1f}%) |
+| Escalation Reasons | {reasons} |
+| Cheap Tier Time | {cascade['cheap_seconds']:.1f}s |
+| Heavy Tier Time | {cascade['heavy_seconds']:.1f}s |
+| Estimated Speedup vs Heavy Only | {f'up to {speedup:.2f}x' if speedup else 'N/A (no escalations to measure the heavy model)'} |
+"""
+    
+    def _sampling_report_section(self) -> str:
+        """Markdown section with the suite-wide estimate of a sampled evaluation (empty otherwise)"""
+        if not self.sampling_stats:
+            return ""
+        sample = self.sampling_stats
+        target = f"{sample['target_ci_width']:.3f}" if sample["target_ci_width"] is not None else "none"
+        section = f"""
+## Sampling Estimate
+
+Only a stratified random sample of runs was judged. Rates are estimated for the whole suite with {sample['confidence']:.0%} Wilson intervals; the average score with a stratified bootstrap interval.
+
+| Metric | Estimate | {sample['confidence']:.0%} CI |
+|--------|----------|--------|
+"""
+        for label, rate in sample["rates"].items():
+            section += f"| {label} Rate | {rate['estimate']:.1%} | {rate['low']:.1%} - {rate['high']:.1%} |\n"
+        section += f"| Average Score | {sample['score']['estimate']:.2f}/10 | {sample['score']['low']:.2f} - {sample['score']['high']:.2f} |\n"
+        section += f"""
+| Stratum (reference type) | Runs | Sampled |
+|--------------------------|------|---------|
+"""
+        for stratum, counts in sample["strata"].items():
+            section += f"| {stratum} | {counts['population']} | {counts['sampled']} |\n"
+        section += f"\nSampled {sample['sampled']} of {sample['population']} runs in {sample['rounds']} rounds (target CI width: {target}).\n"
+        return section
+    
     def generate_final_report(self, results: List[TestCaseResult], filename: str = "evaluation_report.md"):
         """Generate a comprehensive final report in Markdown format"""
         from datetime import datetime
@@ -1177,6 +4572,11 @@ Begin evaluation:"""
         successful_run_scores = [run.average_score for tc in results for run in tc.run_results if run.success]
         avg_score = sum(successful_run_scores) / len(successful_run_scores) if successful_run_scores else 0
         
+        incremental_row = ""
+        if self.incremental_stats.get("baseline"):
+            incremental_row = (f"| Unique Runs Reused (incremental) | {self.incremental_stats['reused_runs']} "
+                               f"from {os.path.basename(self.incremental_stats['baseline'])} |\n")
+        
         # Generate report
         report = f"""# LM Studio Evaluation Report
 
@@ -1193,7 +4593,10 @@ Begin evaluation:"""
 | Success Rate | {success_rate:.1f}% |
 | Average Score | {avg_score:.1f}/10 |
 | Average Processing Time | {avg_time:.2f}s |
-
+| Unique Runs Judged | {self.dedup_stats['unique_runs']} |
+| LLM Calls Saved (deduplication) | {self.dedup_stats['llm_calls_saved']} |
+| Runs Decided by Rules | {sum(1 for tc in results for run in tc.run_results if run.judged_by == "rules")} |
+{incremental_row}{self._sampling_report_section()}
 ## Results Breakdown
 
 | Result Type | Count | Percentage |
@@ -1290,6 +4693,64 @@ Begin evaluation:"""
         if avg_time > 5:
             report += "- ⏱️ **Performance:** Average processing time above 5s. Consider optimizing for speed.\n"
         
+        # Add judge telemetry
+        judge_summary = self._summarize_judge_stats(results)
+        ttft = judge_summary["avg_time_to_first_token"]
+        report += f"""
+### Judge Performance
+
+| Metric | Value |
+|--------|-------|
+| LLM-Judged Runs | {judge_summary['judged_runs']} |
+| LLM Calls | {judge_summary['llm_calls']} |
+| Average Time to First Token | {f"{ttft:.2f}s" if ttft is not None else "N/A"} |
+| Completion Tokens | {judge_summary['completion_tokens']} |
+| Generation Speed | {judge_summary['tokens_per_second']:.1f} tokens/s |
+| Early-Stopped Generations | {judge_summary['early_stopped']} |
+| Coalesced Requests | {judge_summary['coalesced_calls']} |
+| Round Trips per Judge Call | {judge_summary['avg_round_trips']:.2f} avg, {judge_summary['max_round_trips']} max |
+| Tool Calls Executed | {judge_summary['tool_calls']} |
+| Average Loop Iteration Time | {judge_summary['avg_iteration_time']:.2f}s |
+| Tool-Loop Budgets Exhausted | {judge_summary['budget_exhausted']} |
+| Prompt Tokens | {judge_summary['prompt_tokens']} |
+| Cached Prompt Tokens | {judge_summary['cached_tokens']} ({(judge_summary['cached_tokens'] / judge_summary['prompt_tokens'] * 100) if judge_summary['prompt_tokens'] else 0:.1f}%) |
+"""
+        if self.config["evaluation"].get("hedging", {}).get("enabled", False):
+            hedge = self.hedge_stats
+            hedge_rate = hedge["hedged"] / hedge["judge_calls"] * 100 if hedge["judge_calls"] else 0
+            report += f"""| Hedged Calls | {hedge['hedged']} of {hedge['judge_calls']} ({hedge_rate:.1f}%) |
+| Hedge Wins | {hedge['hedge_wins']} |
+| Time Saved by Hedging | {hedge['time_saved']:.1f}s (lower bound) |
+"""
+        
+        if self.cascade_stats["judged"]:
+            report += self._cascade_report_section()
+        
+        if self.schedule_stats.get("actual_makespan") is not None:
+            schedule = self.schedule_stats
+            report += f"""
+### Scheduling
+
+| Metric | Value |
+|--------|-------|
+| Order | {"Longest expected first" if schedule['longest_first'] else "Test case order"} |
+| Parallel Workers | {schedule['workers']} |
+| Runs Scheduled | {schedule['scheduled_runs']} ({schedule['history_hits']} predicted from history, others from prompt length) |
+| Predicted Makespan | {schedule['predicted_makespan']:.1f}s |
+| Actual Makespan | {schedule['actual_makespan']:.1f}s |
+"""
+        
+        # Per-backend breakdown when judging is spread over a pool
+        if len(self.backend_pool.backends) > 1:
+            report += """
+### Judge Backends
+
+| Backend | Weight | Max Concurrency | Requests | Failures | Ejections | Avg Latency | Throughput | Generation Speed |
+|---------|--------|-----------------|----------|----------|-----------|-------------|------------|------------------|
+"""
+            for row in self.backend_pool.summary():
+                report += f"| {row['base_url']} | {row['weight']:g} | {row['max_concurrency']} | {row['requests']} | {row['failures']} | {row['ejections']} | {row['avg_latency']:.2f}s | {row['requests_per_minute']:.1f} req/min | {row['tokens_per_second']:.1f} tokens/s |\n"
+        
         # Add file information
         report += f"""
 ## Files Generated
@@ -1320,10 +4781,10 @@ Begin evaluation:"""
         """Update the progressive report file as test cases complete"""
         from datetime import datetime
         
-        filename = "evaluation_report_progress.md"
+        filename = self._suffixed("evaluation_report_progress.md")
         # Generate a fresh, timestamped versioned filename on every update
         current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        versioned_filename = f"evaluation_report_progress_{current_time}.md"
+        versioned_filename = f"evaluation_report_progress{self.output_suffix}_{current_time}.md"
         archive_path = self._get_archive_path(versioned_filename)
         # Ensure history folder exists
         import os as _os
@@ -1458,7 +4919,7 @@ All test cases have been processed. Check the final report for complete analysis
         
         # Also create a progress snapshot with current timestamp
         if self.config["evaluation"]["versioning"]["enabled"]:
-            progress_snapshot = f"evaluation_progress_snapshot_{current_time}_{completed}of{total}.md"
+            progress_snapshot = f"evaluation_progress_snapshot{self.output_suffix}_{current_time}_{completed}of{total}.md"
             snapshot_path = self._get_archive_path(progress_snapshot)
             shutil.copy2(archive_path, snapshot_path)
             logger.info(f"Progress snapshot saved: {snapshot_path}")
@@ -1470,81 +4931,115 @@ All test cases have been processed. Check the final report for complete analysis
 
 def main():
     """Main function to run the evaluator"""
+    parser = argparse.ArgumentParser(description="Evaluate model outputs with an LM Studio judge")
+    parser.add_argument("command", nargs="?", default="evaluate",
+                        choices=["evaluate", "batch-export", "batch-run", "batch-import", "coordinate", "worker", "merge"],
+                        help="evaluate (default) judges live; batch-export writes judge jobs, "
+                             "batch-run processes them and batch-import builds the reports from their results; "
+                             "coordinate queues runs for worker processes and builds the reports once they are judged; "
+                             "merge combines shard result files into one result set")
+    parser.add_argument("--config", default="config.json", help="Configuration file")
+    parser.add_argument("--test-data", default="user_test_data.txt", help="Test data file")
+    parser.add_argument("--jobs", default="judge_jobs.jsonl", help="Batch job file")
+    parser.add_argument("--results", default="judge_job_results.jsonl", help="Batch results file")
+    parser.add_argument("--queue", help="Shared SQLite work queue (default: evaluation.work_queue.file)")
+    parser.add_argument("--worker-id", help="Worker name recorded on leases (default: hostname-pid)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reuse verdicts of unchanged runs from the latest archived results and judge only new or changed runs")
+    parser.add_argument("--sample", nargs="?", const="", metavar="SIZE",
+                        help="Judge only a stratified random sample of runs, as a count (50) or share (10%%); "
+                             "defaults to evaluation.sampling.size")
+    parser.add_argument("--target-ci-width", type=float,
+                        help="With --sample, keep sampling until every verdict rate's confidence interval is at most this wide (e.g. 0.1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Evaluate through the streaming pipeline, writing results as they arrive")
+    parser.add_argument("--cases", nargs="+", metavar="TEST_ID",
+                        help="Only these test cases, read through the test data offset index")
+    parser.add_argument("--shard", help="Evaluate only shard i of n (1-based, e.g. 2/4), writing shard-suffixed outputs")
+    parser.add_argument("--inputs", nargs="+",
+                        help="Shard result files to merge (default: evaluation_results_shard*of*.json)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse verdicts from the evaluation journal of an interrupted run")
+    args = parser.parse_args()
+    if args.stream and (args.command != "evaluate" or args.resume or args.incremental or args.sample is not None):
+        parser.error("--stream only applies to evaluate and cannot be combined with --resume, --incremental or --sample")
+    
     try:
         # Initialize evaluator
-        evaluator = LMStudioEvaluator()
+        evaluator = LMStudioEvaluator(args.config)
         
-        # Parse test cases from user data file
-        test_cases = evaluator.parse_user_test_data()
+        if args.command == "batch-run":
+            evaluator.batch_run(args.jobs, args.results)
+            return
         
-        if not test_cases:
-            logger.error("No test cases found in user_test_data.txt")
-            sys.exit(1)
+        if args.command == "worker":
+            evaluator.work(args.queue, args.worker_id)
+            return
         
-        logger.info(f"Loaded {len(test_cases)} test cases")
+        if args.command == "merge":
+            inputs = args.inputs or sorted(glob.glob("evaluation_results_shard*of*.json"))
+            test_cases = evaluator.parse_user_test_data(args.test_data) if Path(args.test_data).exists() else None
+            results = evaluator.merge_shards(inputs, test_cases)
+            evaluator.print_results_summary(results)
+            evaluator.save_results(results)
+            return
         
-        # Run evaluation
-        results = evaluator.evaluate_batch(test_cases)
+        if args.shard:
+            shard_index, shard_count = parse_shard_spec(args.shard)
+            evaluator.output_suffix = f"_shard{shard_index}of{shard_count}"
         
-        # Print results
-        evaluator.print_results_summary(results)
+        if args.stream:
+            # Test cases are parsed lazily, as the pipeline takes them
+            test_cases = iter(evaluator.load_test_cases(args.test_data, args.cases)) if args.cases else evaluator.iter_user_test_data(args.test_data)
+            if args.shard:
+                test_cases = (tc for tc in test_cases if in_shard(tc.test_id, shard_index, shard_count))
+            results_file = evaluator.evaluate_stream(test_cases)
+            if not evaluator.config["evaluation"].get("pipeline", {}).get("final_report", False):
+                evaluator.print_stream_summary()
+                return
+            # The detailed report needs the whole result set, read back from the streamed output
+            results = evaluator.load_results_json([results_file])
+            evaluator.print_results_summary(results)
+            evaluator.generate_final_report(results, evaluator._suffixed("evaluation_report.md"))
+            return
         
-        # Save results to file
-        results_data = []
-        for tc_result in results:
-            for run_result in tc_result.run_results:
-                result_dict = {
-                    "test_id": tc_result.test_case.test_id,
-                    "run_number": run_result.test_run.run_number,
-                    "timestamp": run_result.test_run.timestamp,
-                    "input": tc_result.test_case.input_text,
-                    "reference_output": tc_result.test_case.reference_output,
-                    "actual_output": run_result.test_run.response,
-                    "evaluation": run_result.evaluation,
-                    "processing_time": run_result.processing_time,
-                    "success": run_result.success,
-                    "average_score": run_result.average_score if run_result.success else 0
-                }
-                
-                # Add detailed scores if available
-                if run_result.success and run_result.detailed_scores:
-                    result_dict.update({
-                        "detailed_scores": {
-                            "factual_accuracy": run_result.detailed_scores.factual_accuracy,
-                            "completeness": run_result.detailed_scores.completeness,
-                            "order_sequence": run_result.detailed_scores.order_sequence,
-                            "relevance": run_result.detailed_scores.relevance,
-                            "overall_quality": run_result.detailed_scores.overall_quality
-                        },
-                        "rag_verification": run_result.rag_verification,
-                        "reasoning": run_result.reasoning,
-                        "recommendation": run_result.recommendation
-                    })
-                
-                results_data.append(result_dict)
+        # Parse test cases from user data file
+        if args.cases:
+            test_cases = evaluator.load_test_cases(args.test_data, args.cases)
+        else:
+            test_cases = evaluator.parse_user_test_data(args.test_data)
         
-        # Save JSON with versioning
-        json_filename = "evaluation_results.json"
-        versioned_json_filename = evaluator._get_versioned_filename(json_filename)
-        json_archive_path = evaluator._get_archive_path(versioned_json_filename)
+        if not test_cases:
+            logger.error(f"No test cases found in {args.test_data}")
+            sys.exit(1)
         
-        with open(json_archive_path, "w") as f:
-            json.dump(results_data, f, indent=2)
+        logger.info(f"Loaded {len(test_cases)} test cases")
         
-        # Copy to current filename if keep_latest_copy is enabled
-        if evaluator.config["evaluation"]["versioning"]["enabled"] and evaluator.config["evaluation"]["versioning"]["keep_latest_copy"]:
-            shutil.copy2(json_archive_path, json_filename)
+        if args.shard:
+            test_cases = shard_test_cases(test_cases, shard_index, shard_count)
+            logger.info(f"Shard {shard_index}/{shard_count}: {len(test_cases)} test cases")
         
-        # Export to CSV for easy analysis
-        evaluator.export_results_to_csv(results)
+        if args.command == "batch-export":
+            evaluator.batch_export(test_cases, args.jobs)
+            return
         
-        # Generate comprehensive final report
-        report_file = evaluator.generate_final_report(results)
+        if args.command == "batch-import":
+            results = evaluator.batch_import(test_cases, args.results)
+        elif args.command == "coordinate":
+            results = evaluator.coordinate(test_cases, args.queue)
+        else:
+            # Run evaluation
+            if args.sample is not None:
+                results = evaluator.evaluate_sample(test_cases, args.sample or None, args.target_ci_width,
+                                                    resume=args.resume, incremental=args.incremental)
+            else:
+                results = evaluator.evaluate_batch(test_cases, resume=args.resume, incremental=args.incremental)
         
-        logger.info(f"Multi-run results saved with version {evaluator.version_string}")
-        logger.info(f"Files: {json_archive_path}, CSV, and {report_file}")
-        if evaluator.config["evaluation"]["versioning"]["enabled"] and evaluator.config["evaluation"]["versioning"]["keep_latest_copy"]:
-            logger.info("Latest copies also saved without version suffix")
+        # Print results
+        evaluator.print_results_summary(results)
+        
+        # Save JSON, CSV and markdown outputs
+        evaluator.save_results(results)
         
     except Exception as e:
         logger.error(f"Evaluation failed: {e}")
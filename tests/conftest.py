@@ -0,0 +1,128 @@
+"""Shared fixtures: an LMStudioEvaluator wired to a scripted, in-process judge client."""
+
+import json
+import shutil
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import evaluator  # noqa: E402
+
+
+def judge_text(verdict="PARTIAL", scores=(5, 6, 7, 6, 5), recommendation="Improve the offer selection"):
+    """A complete judge reply in the text format of system_prompt.txt"""
+    names = ("Factual_Accuracy", "Completeness", "Order_Sequence", "Relevance", "Overall_Quality")
+    analysis = "".join(f"- {name}: {score}/10 – note\n" for name, score in zip(names, scores))
+    return (f"EVALUATION_RESULT: {verdict}\n\nDETAILED_ANALYSIS:\n{analysis}\n"
+            f"RAG_VERIFICATION:\n- Knowledge_Base_Check: ok\n\nREASONING:\nbecause\n\n"
+            f"RECOMMENDATION:\n{recommendation}\n\n")
+
+
+def search_call(query="offers", call_id="call_1"):
+    """An assistant message asking for one search_knowledge_base call"""
+    function = SimpleNamespace(name="search_knowledge_base", arguments=json.dumps({"query": query}))
+    return SimpleNamespace(content=None, tool_calls=[SimpleNamespace(id=call_id, type="function", function=function)])
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions; reply(request) returns the content (or message) or raises.
+
+    Set cached_tokens to report prefix-cache hits in usage.prompt_tokens_details.
+    """
+
+    def __init__(self, reply=None):
+        self.reply = reply or (lambda request: judge_text())
+        self.cached_tokens = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def create(self, timeout=None, **request):
+        with self._lock:
+            self.requests.append(dict(request, timeout=timeout))
+        content = self.reply(request)
+        # A reply may also be a whole assistant message, e.g. one with tool calls
+        message = content if isinstance(content, SimpleNamespace) else SimpleNamespace(content=content, tool_calls=None)
+        details = SimpleNamespace(cached_tokens=self.cached_tokens) if self.cached_tokens else None
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150, prompt_tokens_details=details)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+
+
+@pytest.fixture
+def make_evaluator(tmp_path, monkeypatch, request):
+    """Build evaluators from the repo config with overrides, writing every output under tmp_path.
+
+    Overrides are given as {"section.key": value} or {"section.sub.key": value}.
+    Returns (evaluator, fake_completions), or (evaluator, server) when a mock server
+    is given to talk to over HTTP instead or transport.mode is "replay".
+    """
+    monkeypatch.chdir(tmp_path)
+    # The system prompt is always read from the working directory
+    shutil.copy(REPO_ROOT / "system_prompt.txt", tmp_path / "system_prompt.txt")
+
+    def make(overrides=None, reply=None, server=None):
+        config = json.loads((REPO_ROOT / "config.json").read_text(encoding="utf-8"))
+        evaluation = config["evaluation"]
+        evaluation["system_prompt_file"] = str(REPO_ROOT / "system_prompt.txt")
+        evaluation["knowledge_base_file"] = str(REPO_ROOT / "knowledge_base.txt")
+        evaluation["delay_between_tests"] = 0
+        evaluation["versioning"]["archive_folder"] = str(tmp_path / "history")
+        evaluation["test_data_cache"]["folder"] = str(tmp_path / "cache")
+        config["rag"]["enabled"] = False
+        if server is not None:
+            config["lm_studio"]["base_url"] = server.base_url
+        for dotted, value in (overrides or {}).items():
+            *path, key = dotted.split(".")
+            section = config
+            for name in path:
+                section = section.setdefault(name, {})
+            section[key] = value
+        config_path = tmp_path / "config.json"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        instance = evaluator.LMStudioEvaluator(str(config_path))
+        instance.backend_pool.health_check = lambda url: True
+        instance._check_server_health = lambda *args: True
+        if server is not None:
+            return instance, server
+        if config.get("transport", {}).get("mode") == "replay":
+            # Replay mode talks to its own mock server
+            request.addfinalizer(instance.mock_server.stop)
+            return instance, instance.mock_server
+        completions = FakeCompletions(reply)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        instance.client = client
+        for backend in instance.backend_pool.backends:
+            backend.client = client
+        return instance, completions
+
+    return make
+
+
+@pytest.fixture
+def sample_test_cases():
+    """The test cases of the shipped user_test_data.txt"""
+    lines = evaluator.iter_offset_lines((REPO_ROOT / "user_test_data.txt").read_bytes().splitlines(keepends=True))
+    return [test_case for test_case, _, _ in evaluator.iter_test_case_records(lines)]
+
+
+@pytest.fixture
+def mock_server():
+    """Start mock_lm_studio_server servers on free ports; all are stopped after the test"""
+    from mock_lm_studio_server import MockLMStudioServer
+
+    servers = []
+
+    def start(**options):
+        server = MockLMStudioServer(port=0, **options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,46 @@
+"""BackendPool: weight validation and re-admission of ejected backends."""
+
+import threading
+import time
+
+import pytest
+
+from evaluator import Backend, BackendPool
+
+
+def test_zero_weight_is_rejected():
+    with pytest.raises(ValueError, match="weight"):
+        BackendPool([Backend("http://a/v1", None), Backend("http://b/v1", None, weight=0)])
+
+
+def test_acquire_prefers_least_loaded_relative_to_weight():
+    pool = BackendPool([Backend("http://a/v1", None, weight=1, max_concurrency=4),
+                        Backend("http://b/v1", None, weight=3, max_concurrency=4)])
+    picked = [pool.acquire(timeout=1).base_url for _ in range(4)]
+    assert picked.count("http://b/v1") == 3
+
+
+def test_expired_backend_is_probed_once_by_concurrent_callers():
+    probes = []
+    release = threading.Event()
+
+    def health_check(url):
+        probes.append(url)
+        release.wait(2)
+        return False
+
+    healthy = Backend("http://a/v1", None, max_concurrency=8)
+    ejected = Backend("http://b/v1", None, max_concurrency=8, ejected_until=time.time() - 1, ejections=1)
+    pool = BackendPool([healthy, ejected], eject_seconds=30, health_check=health_check)
+
+    threads = [threading.Thread(target=pool.acquire, args=(1,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert probes == ["http://b/v1"]
+    assert ejected.ejections == 2
+    assert not ejected.probing
@@ -0,0 +1,90 @@
+"""Offline batch jobs: export -> run -> import, and job IDs that track the run's content."""
+
+import dataclasses
+import json
+import logging
+
+import evaluator
+from conftest import judge_text
+
+
+def make_suite():
+    def case(test_id, responses):
+        runs = [evaluator.TestRun(run_number=n, timestamp=f"t{test_id}.{n}", response=response)
+                for n, response in enumerate(responses, 1)]
+        return evaluator.TestCase(test_id=test_id, input_text="Dining offers in Dubai?",
+                                  reference_output="Return UAE DINING offers.", runs=runs)
+
+    return [case("1", ['{"offers": ["1"], "text": "a"}', '{"offers": ["1"], "text": "a"}']),
+            case("2", ['{"offers": ["2"], "text": "b"}'])]
+
+
+def verdict_by_offer(request):
+    judged = request["messages"][-1]["content"]
+    if '"1"' in judged:
+        return judge_text("CORRECT", scores=(9, 9, 9, 9, 9))
+    return judge_text("INCORRECT", scores=(2, 2, 2, 2, 2))
+
+
+def test_export_run_import_round_trip(make_evaluator):
+    instance, completions = make_evaluator({"rules.enabled": False}, reply=verdict_by_offer)
+    suite = make_suite()
+
+    assert instance.batch_export(suite, "jobs.jsonl") == 2
+    assert instance.batch_run("jobs.jsonl", "results.jsonl") == {"completed": 2, "failed": 0, "skipped": 0}
+    results = instance.batch_import(suite, "results.jsonl")
+
+    assert len(completions.requests) == 2
+    assert [[run.evaluation for run in result.run_results] for result in results] == [["CORRECT", "CORRECT"], ["INCORRECT"]]
+    assert instance.dedup_stats["llm_calls_saved"] == 1
+
+
+def test_rerun_skips_completed_jobs(make_evaluator):
+    instance, completions = make_evaluator({"rules.enabled": False})
+    suite = make_suite()
+    instance.batch_export(suite, "jobs.jsonl")
+    instance.batch_run("jobs.jsonl", "results.jsonl")
+
+    assert instance.batch_run("jobs.jsonl", "results.jsonl") == {"completed": 0, "failed": 0, "skipped": 2}
+    assert len(completions.requests) == 2
+
+
+def test_job_id_changes_with_timestamp_and_content():
+    test_case = make_suite()[1]
+    test_run = test_case.runs[0]
+    job_id = evaluator.LMStudioEvaluator._batch_job_id(test_case, test_run)
+
+    assert job_id.startswith("2#run1@t2.1#")
+    for changed in (dataclasses.replace(test_run, timestamp="t2.1-rerun"),
+                    dataclasses.replace(test_run, response='{"offers": ["3"], "text": "b"}')):
+        assert evaluator.LMStudioEvaluator._batch_job_id(test_case, changed) != job_id
+    assert evaluator.LMStudioEvaluator._batch_job_id(
+        dataclasses.replace(test_case, reference_output="Return no offers."), test_run) != job_id
+
+
+def test_stale_results_are_not_applied_to_edited_runs(make_evaluator, caplog):
+    instance, _ = make_evaluator({"rules.enabled": False}, reply=verdict_by_offer)
+    instance.batch_export(make_suite(), "jobs.jsonl")
+    instance.batch_run("jobs.jsonl", "results.jsonl")
+
+    edited = make_suite()
+    edited[1].runs[0] = evaluator.TestRun(run_number=1, timestamp="t2.1", response='{"offers": ["1"], "text": "b"}')
+    with caplog.at_level(logging.WARNING, logger=evaluator.logger.name):
+        results = instance.batch_import(edited, "results.jsonl")
+
+    assert [run.evaluation for run in results[0].run_results] == ["CORRECT", "CORRECT"]
+    stale_run = results[1].run_results[0]
+    assert stale_run.evaluation == "ERROR"
+    assert stale_run.reasoning == "Batch job failed: no result in batch results file"
+    assert "1 results in results.jsonl match no run of the test data" in caplog.text
+
+
+def test_results_file_records_job_ids_of_the_export(make_evaluator):
+    instance, _ = make_evaluator({"rules.enabled": False})
+    instance.batch_export(make_suite(), "jobs.jsonl")
+    instance.batch_run("jobs.jsonl", "results.jsonl")
+
+    with open("jobs.jsonl", encoding="utf-8") as f:
+        exported = {json.loads(line)["custom_id"] for line in f}
+    with open("results.jsonl", encoding="utf-8") as f:
+        assert {json.loads(line)["custom_id"] for line in f} == exported
@@ -0,0 +1,56 @@
+"""Batched judging: early stop on the streamed reply and per-run fallback."""
+
+import re
+
+from conftest import judge_text
+import evaluator
+from evaluator import batched_output_complete, split_run_sections
+
+
+def batched_reply(run_numbers, broken=()):
+    sections = []
+    for run_number in run_numbers:
+        body = "garbled output\n\n" if run_number in broken else judge_text("CORRECT", (9, 9, 9, 9, 9))
+        sections.append(f"=== RUN {run_number} ===\n{body}")
+    return "".join(sections)
+
+
+def test_complete_two_run_output_stops_early():
+    assert batched_output_complete(batched_reply([1, 2]), [1, 2])
+
+
+def test_unfinished_last_recommendation_does_not_stop():
+    text = batched_reply([1, 2]).rstrip("\n")
+    assert not batched_output_complete(text, [1, 2])
+    assert not batched_output_complete(text + "\n", [1, 2])
+    assert batched_output_complete(text + "\n\n", [1, 2])
+
+
+def test_missing_run_section_does_not_stop():
+    assert not batched_output_complete(batched_reply([1]), [1, 2])
+
+
+def test_split_run_sections_strips_by_default():
+    sections = split_run_sections(batched_reply([3, 4]))
+    assert set(sections) == {3, 4}
+    assert sections[3].startswith("EVALUATION_RESULT") and sections[3].endswith("selection")
+
+
+def test_only_unparsable_runs_fall_back(make_evaluator):
+    def reply(request):
+        content = request["messages"][-1]["content"]
+        if "independently" in content:
+            return batched_reply([1, 2, 3], broken=(2,))
+        return judge_text("INCORRECT", (1, 1, 1, 1, 1))
+
+    instance, completions = make_evaluator({"evaluation.batch_judging": True, "rules.enabled": False}, reply)
+    runs = [evaluator.TestRun(n, "", f'{{"offers": ["{n}"], "text": "run {n}"}}') for n in (1, 2, 3)]
+    test_case = evaluator.TestCase("7", "Show me offers", "Return offers", runs)
+
+    results = instance._evaluate_runs_batched(test_case, runs)
+
+    assert [r.evaluation for r in results] == ["CORRECT", "INCORRECT", "CORRECT"]
+    single_requests = [r for r in completions.requests if "independently" not in r["messages"][-1]["content"]]
+    assert len(completions.requests) == 2
+    assert len(single_requests) == 1
+    assert re.search(r"Actual Output \(Run 2\)", single_requests[0]["messages"][-1]["content"])
@@ -0,0 +1,44 @@
+"""Actual output parsing and the canonical keys used to deduplicate runs."""
+
+import evaluator
+
+
+def test_parse_actual_output_accepts_only_json_objects():
+    assert evaluator.parse_actual_output('{ "offers": ["1"], "text": "Hi" }') == {"offers": ["1"], "text": "Hi"}
+    assert evaluator.parse_actual_output('["1", "2"]') is None
+    assert evaluator.parse_actual_output("Sorry, no offers") is None
+    assert evaluator.parse_actual_output(None) is None
+
+
+def test_normalize_offer_ids():
+    assert evaluator.normalize_offer_ids([112, " 104 ", "", "  ", "77"]) == ["112", "104", "77"]
+    assert evaluator.normalize_offer_ids("112") == []
+    assert evaluator.normalize_offer_ids(None) == []
+
+
+def test_canonical_key_ignores_formatting():
+    a = '{ "offers": [ "112", 104 ], "text": "Here  are\\n offers" }'
+    b = '{"text": "Here are offers", "offers": [112, " 104"]}'
+    assert evaluator.canonicalize_response(a) == evaluator.canonicalize_response(b)
+    assert evaluator.canonicalize_response(a).startswith("json:")
+
+
+def test_offer_order_matters_only_when_significant():
+    a = '{"offers": ["9", "10", "x"], "text": "t"}'
+    b = '{"offers": ["x", "10", "9"], "text": "t"}'
+    assert evaluator.canonicalize_response(a) != evaluator.canonicalize_response(b)
+    assert (evaluator.canonicalize_response(a, offer_order_significant=False)
+            == evaluator.canonicalize_response(b, offer_order_significant=False))
+    assert '"offers":["9","10","x"]' in evaluator.canonicalize_response(b, offer_order_significant=False)
+
+
+def test_free_text_falls_back_to_whitespace_normalization():
+    assert evaluator.canonicalize_response("No  offers\n found") == evaluator.canonicalize_response("No offers found")
+    assert evaluator.canonicalize_response("No offers found").startswith("text:")
+
+
+def test_test_run_keys_match_for_equivalent_outputs():
+    a = evaluator.TestRun(run_number=1, timestamp="t1", response='{"offers": [1, 2], "text": "a"}')
+    b = evaluator.TestRun(run_number=2, timestamp="t2", response='{"text": "a", "offers": ["1", "2"]}')
+    assert a.offer_ids == ["1", "2"]
+    assert a.canonical_key() == b.canonical_key()
@@ -0,0 +1,68 @@
+"""Single-flight coalescing of concurrent judge requests."""
+
+import threading
+import time
+
+import evaluator
+from conftest import judge_text
+from evaluator import JudgeCallStats, coalescing_key
+
+
+def request_for(instance, run_number, timestamp, response):
+    test_case = evaluator.TestCase("1", "Show me offers", "Return offers 1 and 2", [])
+    test_run = evaluator.TestRun(run_number, timestamp, response)
+    _, request_params = instance._build_judge_messages(test_case, test_run)
+    return request_params
+
+
+def test_key_ignores_run_number_and_timestamp(make_evaluator):
+    instance, _ = make_evaluator()
+    response = '{"offers": ["1", "2"], "text": "Two offers"}'
+    first = request_for(instance, 1, "01/01/2025 - 10:00:00", response)
+    second = request_for(instance, 3, "02/01/2025 - 11:30:00", response)
+    other = request_for(instance, 1, "01/01/2025 - 10:00:00", '{"offers": ["3"], "text": "One offer"}')
+    assert coalescing_key(first) == coalescing_key(second)
+    assert coalescing_key(first) != coalescing_key(other)
+
+
+def test_key_uses_the_canonical_response(make_evaluator):
+    instance, _ = make_evaluator()
+    first = request_for(instance, 1, "t1", '{"offers": ["1", "2"], "text": "Two  offers"}')
+    reformatted = request_for(instance, 2, "t2", '{ "text": "Two offers", "offers": [1, " 2"] }')
+    reordered = request_for(instance, 2, "t2", '{"offers": ["2", "1"], "text": "Two offers"}')
+    assert coalescing_key(first) == coalescing_key(reformatted)
+    assert coalescing_key(first) != coalescing_key(reordered)
+
+
+def test_concurrent_equivalent_requests_share_one_call(make_evaluator):
+    release = threading.Event()
+
+    def reply(request):
+        release.wait(5)
+        return judge_text()
+
+    instance, completions = make_evaluator({"evaluation.max_concurrency": 2}, reply)
+    response = '{"offers": ["1", "2"], "text": "Two offers"}'
+    requests = [request_for(instance, 1, "01/01/2025 - 10:00:00", response),
+                request_for(instance, 2, "01/01/2025 - 10:05:00", '{ "offers": [1, 2], "text": "Two offers" }')]
+    stats = [JudgeCallStats(), JudgeCallStats()]
+    results = [None, None]
+
+    def judge(i):
+        results[i] = instance._judge_completion(requests[i], stats[i])
+
+    first = threading.Thread(target=judge, args=(0,))
+    first.start()
+    while not completions.requests:
+        time.sleep(0.01)
+    second = threading.Thread(target=judge, args=(1,))
+    second.start()
+    time.sleep(0.1)
+    release.set()
+    first.join()
+    second.join()
+
+    assert len(completions.requests) == 1
+    assert results[0] == results[1]
+    assert (stats[0].llm_calls, stats[1].llm_calls) == (1, 0)
+    assert stats[1].coalesced_calls == 1
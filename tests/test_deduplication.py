@@ -0,0 +1,53 @@
+"""Suite-wide deduplication: identical runs are judged once and the verdict is fanned out."""
+
+import evaluator
+
+
+def make_case(test_id, responses, input_text="Dining offers in Dubai?", reference="Return UAE DINING offers."):
+    runs = [evaluator.TestRun(run_number=n, timestamp=f"t{test_id}.{n}", response=response)
+            for n, response in enumerate(responses, 1)]
+    return evaluator.TestCase(test_id=test_id, input_text=input_text, reference_output=reference, runs=runs)
+
+
+SUITE = [
+    make_case("1", ['{"offers": ["1", "2"], "text": "Here you go"}', '{ "text": "Here  you go", "offers": [1, " 2"] }']),
+    make_case("2", ['{"offers": [1, 2], "text": "Here you go"}', '{"offers": ["3"], "text": "Here you go"}']),
+    # Same response, different reference: judged separately
+    make_case("3", ['{"offers": ["1", "2"], "text": "Here you go"}'], reference="Return no offers."),
+]
+
+
+def test_identical_runs_across_test_cases_are_judged_once(make_evaluator):
+    instance, completions = make_evaluator({"rules.enabled": False})
+
+    results = instance.evaluate_batch(SUITE)
+
+    assert len(completions.requests) == 3
+    assert instance.dedup_stats == {"total_runs": 5, "unique_runs": 3, "llm_calls_saved": 2}
+    first, copy_in_case, copy_across_cases = (results[0].run_results[0], results[0].run_results[1],
+                                              results[1].run_results[0])
+    assert copy_in_case.reasoning.startswith("Duplicated from Run 1: ")
+    assert copy_across_cases.reasoning.startswith("Duplicated from test case 1 Run 1: ")
+    assert copy_across_cases.test_case is SUITE[1] and copy_across_cases.test_run is SUITE[1].runs[0]
+    assert copy_across_cases.detailed_scores == first.detailed_scores
+    assert copy_in_case.processing_time == copy_across_cases.processing_time == 0.0
+
+
+def test_report_shows_unique_runs_and_saved_calls(make_evaluator, tmp_path):
+    instance, _ = make_evaluator({"rules.enabled": False})
+    results = instance.evaluate_batch(SUITE)
+
+    instance.generate_final_report(results, "evaluation_report.md")
+
+    report = (tmp_path / "evaluation_report.md").read_text(encoding="utf-8")
+    assert "| Unique Runs Judged | 3 |" in report
+    assert "| LLM Calls Saved (deduplication) | 2 |" in report
+
+
+def test_disabled_deduplication_judges_every_run(make_evaluator):
+    instance, completions = make_evaluator({"rules.enabled": False, "evaluation.deduplicate_runs": False})
+
+    instance.evaluate_batch(SUITE)
+
+    assert len(completions.requests) == 5
+    assert instance.dedup_stats["llm_calls_saved"] == 0
@@ -0,0 +1,77 @@
+"""Hedged judge requests: the trigger, winner/loser accounting and the latency window."""
+
+import threading
+import time
+
+import evaluator
+from conftest import judge_text
+
+HEDGING = {"evaluation.hedging": {"enabled": True, "percentile": 50, "min_samples": 3, "window": 100,
+                                  "min_delay_seconds": 0.05},
+           "evaluation.max_concurrency": 2}
+
+
+def slow_first_reply(delay):
+    """The first request stalls for delay seconds, later ones answer at once"""
+    calls = {"count": 0}
+    lock = threading.Lock()
+
+    def reply(request):
+        with lock:
+            calls["count"] += 1
+            first = calls["count"] == 1
+        if first:
+            time.sleep(delay)
+            return judge_text("INCORRECT", (1, 1, 1, 1, 1))
+        return judge_text("PARTIAL")
+
+    return reply
+
+
+def judge(instance, stats):
+    return instance._hedged_judge_completion({"model": "m", "messages": []}, stats)
+
+
+def test_fast_call_is_not_hedged(make_evaluator):
+    instance, completions = make_evaluator(HEDGING)
+    instance._judge_latencies.extend([0.2] * 3)
+    stats = evaluator.JudgeCallStats()
+
+    judge(instance, stats)
+
+    assert len(completions.requests) == 1
+    assert stats.hedged_calls == 0
+    assert instance.hedge_stats == {"judge_calls": 1, "hedged": 0, "hedge_wins": 0, "time_saved": 0.0}
+    assert len(instance._judge_latencies) == 4
+
+
+def test_no_hedging_until_enough_latencies_are_known(make_evaluator):
+    instance, completions = make_evaluator(HEDGING, reply=slow_first_reply(0.3))
+    instance._judge_latencies.extend([0.01] * 2)
+
+    judge(instance, evaluator.JudgeCallStats())
+
+    assert len(completions.requests) == 1
+    assert instance.hedge_stats["hedged"] == 0
+
+
+def test_stalled_call_is_hedged_and_the_loser_is_not_timed(make_evaluator):
+    instance, completions = make_evaluator(HEDGING, reply=slow_first_reply(0.5))
+    instance._judge_latencies.extend([0.01] * 3)
+    stats = evaluator.JudgeCallStats()
+
+    start = time.time()
+    content, _, _ = judge(instance, stats)
+
+    assert time.time() - start < 0.4
+    assert evaluator.extract_judge_fields(content)["evaluation"] == "PARTIAL"
+    assert stats.hedged_calls == 1
+    assert instance.hedge_stats["hedged"] == instance.hedge_stats["hedge_wins"] == 1
+
+    # Let the cancelled primary finish in the background
+    time.sleep(0.6)
+    assert len(completions.requests) == 2
+    assert instance.hedge_stats["time_saved"] > 0.2
+    # Only the winner's latency joins the window
+    assert len(instance._judge_latencies) == 4
+    assert max(instance._judge_latencies) < 0.4
@@ -0,0 +1,86 @@
+"""--incremental: reuse verdicts of unchanged runs from the latest archived results of the same shard set."""
+
+import json
+import os
+import time
+
+import pytest
+
+import evaluator
+
+
+def make_suite():
+    def case(test_id, reference, responses):
+        runs = [evaluator.TestRun(run_number=n, timestamp=f"t{test_id}.{n}", response=response)
+                for n, response in enumerate(responses, 1)]
+        return evaluator.TestCase(test_id=test_id, input_text="Dining offers in Dubai?", reference_output=reference, runs=runs)
+
+    return [case("1", "Return UAE DINING offers.", ['{"offers": ["1"]}', '{"offers": ["2"]}']),
+            case("2", "Return offer 3.", ['{"offers": ["3"]}'])]
+
+
+@pytest.fixture
+def baseline(make_evaluator):
+    """Judge the suite once and archive its results; returns the archive path"""
+    instance, completions = make_evaluator({"rules.enabled": False})
+    results = instance.evaluate_batch(make_suite())
+    assert len(completions.requests) == 3
+    return instance.export_results_to_json(results, "evaluation_results.json")
+
+
+def test_unchanged_runs_are_reused(make_evaluator, baseline):
+    instance, completions = make_evaluator({"rules.enabled": False})
+
+    results = instance.evaluate_batch(make_suite(), incremental=True)
+
+    assert completions.requests == []
+    assert instance.incremental_stats == {"baseline": baseline, "reused_runs": 3, "judged_runs": 0}
+    assert all(run.success and run.evaluation == "PARTIAL" for result in results for run in result.run_results)
+
+
+@pytest.mark.parametrize("edit, judged", [
+    (lambda suite: setattr(suite[0].runs[1], "response", '{"offers": ["4"]}'), 1),
+    (lambda suite: setattr(suite[0].runs[0], "timestamp", "t1.1-rerun"), 1),
+    (lambda suite: setattr(suite[0], "reference_output", "Return UAE DINING offers, newest first."), 2),
+    (lambda suite: setattr(suite[1], "input_text", "Offer 3?"), 1),
+], ids=["response", "timestamp", "reference", "input"])
+def test_changed_runs_are_judged_again(make_evaluator, baseline, edit, judged):
+    suite = make_suite()
+    edit(suite)
+    instance, completions = make_evaluator({"rules.enabled": False})
+
+    instance.evaluate_batch(suite, incremental=True)
+
+    assert len(completions.requests) == judged
+    assert instance.incremental_stats["reused_runs"] == 3 - judged
+
+
+def test_failed_runs_are_judged_again(make_evaluator, baseline):
+    with open(baseline, encoding="utf-8") as f:
+        entries = json.load(f)
+    entries[2].update(success=False, evaluation="ERROR")
+    with open(baseline, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    instance, completions = make_evaluator({"rules.enabled": False})
+
+    results = instance.evaluate_batch(make_suite(), incremental=True)
+
+    assert len(completions.requests) == 1
+    assert results[1].run_results[0].evaluation == "PARTIAL"
+
+
+def test_latest_archive_ignores_other_shard_sets(make_evaluator, baseline, tmp_path):
+    shard_file = tmp_path / "history" / "evaluation_results_shard1of2_20990101_000000.json"
+    shard_file.write_text("[]", encoding="utf-8")
+    # Newer than the unsharded baseline
+    later = time.time() + 60
+    os.utime(shard_file, (later, later))
+
+    instance, _ = make_evaluator()
+    assert instance._latest_archived_results() == baseline
+
+    instance.output_suffix = "_shard1of2"
+    assert instance._latest_archived_results() == str(shard_file)
+
+    instance.output_suffix = "_shard2of2"
+    assert instance._latest_archived_results() is None
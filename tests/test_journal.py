@@ -0,0 +1,59 @@
+"""Evaluation journal: crash-safe appends and --resume."""
+
+import json
+
+from evaluator import EvaluationJournal
+
+
+def test_resume_after_torn_write(make_evaluator, sample_test_cases, tmp_path):
+    test_cases = sample_test_cases[:2]
+    instance, completions = make_evaluator({"rules.enabled": False})
+    instance.evaluate_batch(test_cases)
+    journal = tmp_path / "evaluation_journal.jsonl"
+    lines = journal.read_bytes().splitlines(keepends=True)
+    judged = len(completions.requests)
+    assert len(lines) == judged
+
+    # Simulate a crash in the middle of writing the last record
+    journal.write_bytes(b"".join(lines[:-1]) + lines[-1][: len(lines[-1]) // 2])
+
+    instance, completions = make_evaluator({"rules.enabled": False})
+    results = instance.evaluate_batch(test_cases, resume=True)
+
+    assert len(completions.requests) == 1
+    assert all(run.success for tc in results for run in tc.run_results)
+    content = journal.read_text(encoding="utf-8")
+    assert content.endswith("\n")
+    assert [json.loads(line)["test_id"] for line in content.splitlines()]
+    assert len(EvaluationJournal.load(str(journal))) == judged
+
+
+def test_torn_tail_is_cut_before_appending(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"a": 1}\n{"b": 2}\n{"c": ', encoding="utf-8")
+    EvaluationJournal(str(path)).close()
+    assert path.read_text(encoding="utf-8") == '{"a": 1}\n{"b": 2}\n'
+
+
+def test_single_torn_line_is_cut_entirely(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"a": ', encoding="utf-8")
+    EvaluationJournal(str(path)).close()
+    assert path.read_text(encoding="utf-8") == ""
+
+
+def test_resume_rejudges_runs_edited_since_the_journal(make_evaluator, sample_test_cases):
+    test_cases = sample_test_cases[:2]
+    instance, completions = make_evaluator({"rules.enabled": False})
+    instance.evaluate_batch(test_cases)
+    judged = len(completions.requests)
+
+    edited = test_cases[0].runs[0]
+    edited.response = edited.response + " "
+    test_cases[1].reference_output = test_cases[1].reference_output + " Prefer newer offers."
+    instance, completions = make_evaluator({"rules.enabled": False})
+    instance.evaluate_batch(test_cases, resume=True)
+
+    # The edited run, and every run of the case whose reference changed
+    assert len(completions.requests) == 1 + len(test_cases[1].runs)
+    assert len(completions.requests) < judged
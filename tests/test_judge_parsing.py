@@ -0,0 +1,145 @@
+"""Judge output parsing: the single-pass tokenizer matches the per-field regex parser it replaced."""
+
+import json
+import random
+import re
+
+import pytest
+
+import evaluator
+from conftest import judge_text
+
+
+def regex_parse(text):
+    """The regex parser extract_judge_fields replaced (verdict, scores, sections; no defaults)"""
+    verdict = re.search(r"EVALUATION_RESULT:\s*(\w+)", text, re.IGNORECASE)
+    scores = {}
+    for name in evaluator._SCORE_FIELDS:
+        match = re.search(rf"{name}:\s*(\d+)", text, re.IGNORECASE)
+        if match:
+            scores[name.lower()] = int(match.group(1))
+    rag = re.search(r"RAG_VERIFICATION:(.*?)REASONING:", text, re.DOTALL | re.IGNORECASE)
+    reasoning = re.search(r"REASONING:(.*?)RECOMMENDATION:", text, re.DOTALL | re.IGNORECASE)
+    recommendation = re.search(r"RECOMMENDATION:(.*?)$", text, re.DOTALL | re.IGNORECASE)
+    return {
+        "evaluation": verdict.group(1).upper() if verdict else None,
+        "scores": scores,
+        "rag_verification": rag.group(1).strip() if rag else "",
+        "reasoning": reasoning.group(1).strip() if reasoning else "",
+        "recommendation": recommendation.group(1).strip() if recommendation else ""
+    }
+
+
+_FRAGMENTS = [
+    "EVALUATION_RESULT:", "evaluation_result: ", "Evaluation_Result:\n", "EVALUATION_RESULT: ",
+    "Factual_Accuracy:", "COMPLETENESS: ", "order_sequence:", "Relevance:  ", "Overall_Quality:",
+    "RAG_VERIFICATION:", "REASONING:", "Reasoning: ", "RECOMMENDATION:", "recommendation:\n",
+    "CORRECT", "PARTIAL", "incorrect", "7", "10", "3/10", " 8", "x", "-", "–", ":", "::", " ", "\n", "\n\n",
+    "DETAILED_ANALYSIS:", "Knowledge_Base_Check:", "MY_REASONING:", "Offers: 112, 104", "é", "\t",
+]
+
+
+def random_judge_output(rng):
+    return "".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+
+def test_shipped_format_parses():
+    fields = evaluator.extract_judge_fields(judge_text("CORRECT", (8, 9, 7, 8, 9), "Keep it up"))
+    assert fields["evaluation"] == "CORRECT"
+    assert fields["scores"] == {"factual_accuracy": 8, "completeness": 9, "order_sequence": 7,
+                                "relevance": 8, "overall_quality": 9}
+    assert fields["rag_verification"] == "- Knowledge_Base_Check: ok"
+    assert fields["reasoning"] == "because"
+    assert fields["recommendation"] == "Keep it up"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_tokenizer_matches_regex_parser(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        text = random_judge_output(rng)
+        assert evaluator.extract_judge_fields(text) == regex_parse(text), text
+
+
+def test_parse_structured_evaluation_applies_score_bands(make_evaluator):
+    instance, _ = make_evaluator()
+    evaluation, scores, _, reasoning, _ = instance._parse_structured_evaluation(
+        judge_text("INCORRECT", (8, 8, 8, 8, 8)))
+    assert evaluation == "CORRECT"
+    assert scores == evaluator.DetailedScores(8, 8, 8, 8, 8)
+    assert reasoning == "because"
+
+    evaluation, scores, *_ = instance._parse_structured_evaluation("no verdict here")
+    assert evaluation == "INCORRECT"
+    assert scores == evaluator.DetailedScores(0, 0, 0, 0, 0)
+
+
+def test_json_verdict_is_read_with_the_text_fallback_for_other_input():
+    verdict = {"evaluation": "partial", "scores": {"factual_accuracy": 5, "completeness": 6, "order_sequence": 4,
+                                                  "relevance": 5, "overall_quality": True},
+               "rag_verification": " ok ", "reasoning": "r", "recommendation": None}
+    fields = evaluator.extract_judge_fields(json.dumps(verdict))
+    assert fields == {"evaluation": "PARTIAL",
+                      "scores": {"factual_accuracy": 5, "completeness": 6, "order_sequence": 4, "relevance": 5},
+                      "rag_verification": "ok", "reasoning": "r", "recommendation": ""}
+
+    broken = '{"evaluation": "CORRECT", EVALUATION_RESULT: PARTIAL'
+    assert evaluator.extract_judge_fields(broken)["evaluation"] == "PARTIAL"
+
+
+@pytest.mark.parametrize("text,reason", [
+    ("EVALUATION_RESULT: CORRECT\nFactual_Accuracy: 9", "parse_failure"),
+    (judge_text("CORRECT", (5, 5, 5, 5, 5)), "score_mismatch"),
+    (judge_text("CORRECT", (7, 7, 7, 7, 7)), "boundary"),
+    (judge_text("PARTIAL", (5, 6, 5, 6, 5)), None),
+])
+def test_escalation_reason(make_evaluator, text, reason):
+    instance, _ = make_evaluator()
+    assert instance._escalation_reason(text, None) == reason
+
+
+def test_rule_disagreement_escalates_a_pass(make_evaluator):
+    instance, _ = make_evaluator()
+    rule_check = evaluator.RuleCheckResult(findings=["x"], violations=["Offer IDs outside UAE: 9"])
+    assert instance._escalation_reason(judge_text("CORRECT", (9, 9, 9, 9, 9)), rule_check) == "rule_disagreement"
+    assert instance._escalation_reason(judge_text("INCORRECT", (1, 1, 1, 1, 1)), rule_check) is None
+
+
+def test_structured_output_requests_a_json_schema_for_single_runs(make_evaluator):
+    instance, _ = make_evaluator({"evaluation.structured_output": True})
+    single = instance._build_judge_request([])
+    batched = instance._build_judge_request([], run_count=2)
+    assert single["response_format"]["json_schema"]["schema"] is evaluator.JUDGE_VERDICT_SCHEMA
+    assert "response_format" not in batched
+
+    instance, _ = make_evaluator()
+    assert "response_format" not in instance._build_judge_request([])
+
+
+def test_structured_output_is_not_sent_with_tools(make_evaluator):
+    instance, _ = make_evaluator({"evaluation.structured_output": True, "rag.enabled": True})
+    with_tools = instance._build_judge_request([])
+    assert with_tools["tools"] and "response_format" not in with_tools
+
+    instance, _ = make_evaluator({"evaluation.structured_output": True, "rag.enabled": True, "rag.pre_retrieval": True})
+    pre_retrieved = instance._build_judge_request([])
+    assert "tools" not in pre_retrieved and pre_retrieved["response_format"]["type"] == "json_schema"
+
+
+@pytest.mark.parametrize("pre_retrieval, requests", [(True, 1), (False, 2)])
+def test_structured_output_end_to_end(make_evaluator, mock_server, pre_retrieval, requests):
+    server = mock_server()
+    instance, _ = make_evaluator({"evaluation.structured_output": True, "rules.enabled": False, "rag.enabled": True,
+                                  "rag.pre_retrieval": pre_retrieval}, server=server)
+    test_case = evaluator.TestCase(test_id="1", input_text="Dining offers in Dubai?", reference_output="Return UAE dining offers.",
+                                   runs=[evaluator.TestRun(run_number=1, timestamp="t1", response='{"offers": ["107"], "text": "Here"}')])
+
+    result = instance.evaluate_single_run(test_case, test_case.runs[0])
+
+    # With tools the judge searches the knowledge base first and answers in text; without, it answers in JSON
+    assert server.stats["requests"] == requests
+    assert result.success and result.evaluation in ("CORRECT", "PARTIAL", "INCORRECT")
+    assert 3 <= result.detailed_scores.factual_accuracy <= 10
+    assert result.reasoning.strip() == "Synthetic evaluation generated by the mock LM Studio server."
+    # Only the text format lists the knowledge base check as a bullet
+    assert result.rag_verification.startswith("-") != pre_retrieval
@@ -0,0 +1,110 @@
+"""JSONL and CSV test suites parse to the same test cases as the text export, BOM or not."""
+
+import csv
+import io
+import json
+
+import pytest
+
+import evaluator
+
+
+def suite_as_jsonl(test_cases, per_case=False):
+    records = []
+    for case in test_cases:
+        runs = [{"run_number": run.run_number, "timestamp": run.timestamp, "response": run.response}
+                for run in case.runs]
+        base = {"test_id": case.test_id, "input": case.input_text, "reference": case.reference_output}
+        if per_case:
+            records.append(dict(base, runs=runs))
+        else:
+            records.extend(dict(base, **run) for run in runs)
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def suite_as_csv(test_cases, per_case=False):
+    out = io.StringIO()
+    if per_case:
+        writer = csv.DictWriter(out, fieldnames=["test_id", "input", "reference", "runs"])
+        writer.writeheader()
+        for case in test_cases:
+            runs = [{"run_number": run.run_number, "timestamp": run.timestamp, "response": run.response}
+                    for run in case.runs]
+            writer.writerow({"test_id": case.test_id, "input": case.input_text,
+                             "reference": case.reference_output, "runs": json.dumps(runs, ensure_ascii=False)})
+    else:
+        writer = csv.DictWriter(out, fieldnames=["test_id", "input", "reference", "run_number", "timestamp", "response"])
+        writer.writeheader()
+        for case in test_cases:
+            for run in case.runs:
+                writer.writerow({"test_id": case.test_id, "input": case.input_text, "reference": case.reference_output,
+                                 "run_number": run.run_number, "timestamp": run.timestamp, "response": run.response})
+    return out.getvalue()
+
+
+def as_tuples(test_cases):
+    return [(case.test_id, case.input_text, case.reference_output,
+             [(run.run_number, run.timestamp, run.response, run.parsed_response) for run in case.runs])
+            for case in test_cases]
+
+
+def parse(file_format, data: bytes):
+    lines = evaluator.iter_offset_lines(data.splitlines(keepends=True))
+    return [case for case, _, _ in evaluator.iter_suite_records(file_format, lines)]
+
+
+@pytest.mark.parametrize("file_format,render", [("jsonl", suite_as_jsonl), ("csv", suite_as_csv)])
+@pytest.mark.parametrize("per_case", [False, True])
+@pytest.mark.parametrize("bom", [b"", b"\xef\xbb\xbf"])
+def test_structured_suites_match_the_text_export(sample_test_cases, file_format, render, per_case, bom):
+    data = bom + render(sample_test_cases, per_case).encode("utf-8")
+
+    parsed = parse(file_format, data)
+
+    assert as_tuples(parsed) == as_tuples(sample_test_cases)
+
+
+def test_bom_csv_keeps_test_cases_apart_and_offsets_in_bytes(tmp_path, make_evaluator, sample_test_cases):
+    instance, _ = make_evaluator()
+    path = tmp_path / "suite.csv"
+    path.write_bytes(b"\xef\xbb\xbf" + suite_as_csv(sample_test_cases).encode("utf-8"))
+
+    streamed = list(instance.iter_user_test_data(str(path)))
+    wanted = [sample_test_cases[-1].test_id, sample_test_cases[0].test_id]
+    sliced = instance.load_test_cases(str(path), wanted)
+
+    assert [case.test_id for case in streamed] == [case.test_id for case in sample_test_cases]
+    assert as_tuples(sliced) == as_tuples([sample_test_cases[-1], sample_test_cases[0]])
+
+
+@pytest.mark.parametrize("file_format,data", [
+    ("csv", b"test_id,input,reference,response\n1,q,r,a\n,q,r,b\n"),
+    ("jsonl", b'{"test_id": "1", "input": "q", "response": "a"}\n{"input": "q", "response": "b"}\n'),
+])
+def test_record_without_test_id_is_rejected(file_format, data):
+    with pytest.raises(ValueError, match="no test_id"):
+        parse(file_format, data)
+
+
+@pytest.mark.parametrize("file_format,data", [
+    ("jsonl", b'{"test_id": "1", "input": "q", "reference": "r", "response": {"offers": ["7", 8], "text": "ok"}}\n'),
+    ("csv", b'test_id,input,reference,runs\n1,q,r,"[{""response"": {""offers"": [""7"", 8], ""text"": ""ok""}}]"\n'),
+])
+def test_structured_responses_are_not_parsed_again(file_format, data, monkeypatch):
+    def no_parsing(response):
+        raise AssertionError(f"response parsed again: {response}")
+
+    monkeypatch.setattr(evaluator, "parse_actual_output", no_parsing)
+    (case,) = parse(file_format, data)
+
+    run = case.runs[0]
+    assert run.parsed_response == {"offers": ["7", 8], "text": "ok"}
+    assert run.response == '{"offers": ["7", 8], "text": "ok"}'
+    assert run.offer_ids == ["7", "8"]
+
+
+def test_structured_non_object_response_has_no_parsed_form():
+    (case,) = parse("jsonl", b'{"test_id": "1", "input": "q", "response": ["7"]}\n')
+
+    assert case.runs[0].response == '["7"]'
+    assert case.runs[0].parsed_response is None
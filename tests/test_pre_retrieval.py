@@ -0,0 +1,59 @@
+"""Pre-retrieval: knowledge base citations are looked up locally and sent with the first judge request."""
+
+import json
+
+import evaluator
+
+TEST_CASE = evaluator.TestCase(
+    test_id="1", input_text="Any FOOD & DRINK offers in Dubai?",
+    reference_output="Return up to 5 FOOD & DRINK offers in UAE.",
+    runs=[evaluator.TestRun(run_number=1, timestamp="t", response='{"offers": ["107", "104", "107"], "text": "Here"}')]
+)
+
+PRE_RETRIEVAL = {"rag.enabled": True, "rag.pre_retrieval": True, "rules.enabled": False}
+
+
+def test_queries_look_up_offer_ids_and_scope_the_case(make_evaluator):
+    instance, _ = make_evaluator(PRE_RETRIEVAL)
+
+    queries = instance._build_retrieval_queries(TEST_CASE, TEST_CASE.runs[0])
+
+    assert queries["offer_ids"] == "logic:or 107 104"
+    assert queries["scope"].startswith("require:OfferCountry=UAE require:OfferCategoryTrained=FOOD logic:or ")
+    assert queries["scope"].split()[3:] == ["UAE", "FOOD", "DRINK"]
+
+
+def test_run_citations_hold_only_the_output_ids_not_already_cited(make_evaluator):
+    instance, _ = make_evaluator(PRE_RETRIEVAL)
+
+    case_citations, run_citations = instance._pre_retrieve_citations(TEST_CASE, TEST_CASE.runs[0])
+
+    case_ids = {str(citation["id"]) for citation in case_citations}
+    run_ids = {str(citation["id"]) for citation in run_citations}
+    assert case_ids and "107" in case_ids
+    assert run_ids == {"104"}
+
+
+def test_first_request_carries_the_citations_and_no_tools(make_evaluator):
+    instance, completions = make_evaluator(PRE_RETRIEVAL)
+
+    result = instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0])
+
+    assert result.success
+    assert len(completions.requests) == 1
+    request = completions.requests[0]
+    assert "tools" not in request and "tool_choice" not in request
+    system, case_prompt, run_prompt = (message["content"] for message in request["messages"])
+    assert "Do NOT call any tools" in system
+    assert "Knowledge base citations for this test case (pre-retrieved):" in case_prompt
+    assert "Knowledge base citations for the offer IDs in this output (pre-retrieved):" in run_prompt
+    cited = [line for line in run_prompt.split("(pre-retrieved):\n", 1)[1].splitlines() if line.startswith("{")]
+    assert [str(json.loads(line)["id"]) for line in cited] == ["104"]
+
+
+def test_without_pre_retrieval_the_judge_gets_the_search_tool(make_evaluator):
+    instance, _ = make_evaluator({"rag.enabled": True, "rag.pre_retrieval": False})
+    messages, request = instance._build_judge_messages(TEST_CASE, TEST_CASE.runs[0])
+
+    assert request["tools"] == [evaluator.SEARCH_KNOWLEDGE_BASE_TOOL]
+    assert "pre-retrieved" not in messages[1]["content"] + messages[2]["content"]
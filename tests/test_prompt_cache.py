@@ -0,0 +1,43 @@
+"""Prompt layout for LM Studio's prefix cache, and the cached-token telemetry it reports."""
+
+import json
+
+import evaluator
+
+
+def judge_requests(instance, test_cases):
+    return [(test_case, instance._build_judge_messages(test_case, test_run, instance._pre_judge(test_case, test_run))[1])
+            for test_case in test_cases for test_run in test_case.runs]
+
+
+def test_prefix_is_byte_identical_across_runs_and_test_cases(make_evaluator, sample_test_cases):
+    instance, _ = make_evaluator({"rag.enabled": True, "rag.use_plugin": "rag-v1"})
+    requests = judge_requests(instance, sample_test_cases[:4])
+
+    # System prompt and tool schema: shared by every request of the suite
+    shared = {json.dumps([request["messages"][0], request["tools"]], ensure_ascii=False) for _, request in requests}
+    assert len(shared) == 1
+
+    # System prompt and test case message: shared by every run of a test case
+    for test_case in sample_test_cases[:4]:
+        prefixes = {json.dumps(request["messages"][:2], ensure_ascii=False)
+                    for owner, request in requests if owner is test_case}
+        assert len(prefixes) == 1
+
+    # Only the last message is specific to the run
+    assert all(f"(Run {run.run_number})" not in request["messages"][1]["content"]
+               for owner, request in requests for run in owner.runs)
+
+
+def test_cached_prompt_tokens_are_reported(make_evaluator, sample_test_cases, capsys):
+    instance, completions = make_evaluator({"rules.enabled": False})
+    completions.cached_tokens = 60
+
+    results = instance.evaluate_batch(sample_test_cases[:3])
+    summary = instance._summarize_judge_stats(results)
+
+    calls = len(completions.requests)
+    assert summary["prompt_tokens"] == 100 * calls
+    assert summary["cached_tokens"] == 60 * calls
+    instance.print_results_summary(results)
+    assert f"Cached: {60 * calls} (60.0%)" in capsys.readouterr().out
@@ -0,0 +1,68 @@
+"""Record / replay transport: judge traffic captured once is served again by the mock server."""
+
+import json
+
+import evaluator
+from mock_lm_studio_server import request_fingerprint
+
+TEST_CASE = evaluator.TestCase(
+    test_id="1", input_text="Dining offers in Dubai?", reference_output="Return UAE dining offers.",
+    runs=[evaluator.TestRun(run_number=1, timestamp="t1", response='{"offers": ["107"], "text": "Here"}'),
+          evaluator.TestRun(run_number=2, timestamp="t2", response='{"offers": ["108"], "text": "Here"}')]
+)
+
+
+def verdict(result):
+    return (result.evaluation, result.detailed_scores, result.rag_verification, result.reasoning,
+            result.recommendation)
+
+
+def test_record_then_replay_gives_the_same_verdict(make_evaluator, tmp_path):
+    recording = tmp_path / "recordings.jsonl"
+    transport = {"transport.mode": "record", "transport.recording_file": str(recording), "rules.enabled": False}
+    instance, completions = make_evaluator(transport)
+    recorded = instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0])
+
+    records = [json.loads(line) for line in recording.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == len(completions.requests) == 1
+    assert request_fingerprint(records[0]["request"]) == request_fingerprint(completions.requests[0])
+
+    instance, server = make_evaluator(dict(transport, **{"transport.mode": "replay", "transport.replay_latency": "none"}))
+    replayed = instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0])
+
+    assert replayed.success
+    assert verdict(replayed) == verdict(recorded)
+    assert server.stats == {"requests": 1, "replayed": 1, "synthetic": 0}
+
+
+def test_replay_miss_gets_a_synthetic_evaluation(make_evaluator, tmp_path):
+    recording = tmp_path / "recordings.jsonl"
+    transport = {"transport.mode": "record", "transport.recording_file": str(recording), "rules.enabled": False}
+    instance, _ = make_evaluator(transport)
+    instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0])
+
+    instance, server = make_evaluator(dict(transport, **{"transport.mode": "replay", "transport.replay_latency": "none"}))
+    result = instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[1])
+
+    assert result.success
+    assert "Synthetic evaluation" in result.reasoning
+    assert server.stats == {"requests": 1, "replayed": 0, "synthetic": 1}
+
+
+def test_replay_without_a_recording_file_is_fully_synthetic(make_evaluator, tmp_path):
+    instance, server = make_evaluator({"transport.mode": "replay", "transport.replay_latency": "none",
+                                       "transport.recording_file": str(tmp_path / "missing.jsonl")})
+    assert len(server.store) == 0
+    assert instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0]).success
+    assert server.stats["synthetic"] == 1
+
+
+def test_synthetic_responses_call_the_search_tool_first(make_evaluator, tmp_path):
+    instance, server = make_evaluator({"transport.mode": "replay", "transport.replay_latency": "none",
+                                       "transport.recording_file": str(tmp_path / "missing.jsonl"),
+                                       "rag.enabled": True, "rag.pre_retrieval": False, "rules.enabled": False})
+    result = instance.evaluate_single_run(TEST_CASE, TEST_CASE.runs[0])
+
+    assert result.success
+    assert server.stats["requests"] == 2
+    assert result.judge_stats.tool_calls == 1
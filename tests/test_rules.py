@@ -0,0 +1,83 @@
+"""Rule-based pre-judge: reference constraints checked against the knowledge base."""
+
+import pytest
+
+import evaluator
+
+KB_ENTRIES = [
+    {"OfferId": 1, "OfferCountry": "UAE", "OfferCategoryTrained": "DINING", "Merchant": "Cafe One"},
+    {"OfferId": 2, "OfferCountry": "UAE", "OfferCategoryTrained": "TRAVEL", "Merchant": "Fly Two"},
+    {"OfferId": 3, "OfferCountry": "USA", "OfferCategoryTrained": "DINING", "Merchant": "Diner Three"},
+]
+
+
+@pytest.fixture
+def kb_index():
+    return evaluator.KnowledgeBaseIndex(KB_ENTRIES)
+
+
+def test_reference_constraints(kb_index):
+    constraints = evaluator.parse_reference_constraints(
+        "Return up to 5 DINING offers in Dubai; cap 3; exclude offers [2, 3].", kb_index)
+    assert constraints.cap == 3
+    assert constraints.excluded_ids == {"2", "3"}
+    assert constraints.countries == {"UAE"}
+    assert constraints.categories == {"DINING"}
+    assert not constraints.offers_forbidden
+
+    assert evaluator.parse_reference_constraints("No offers; ask for the card type.", kb_index).offers_forbidden
+    assert evaluator.parse_reference_constraints("Do not show any offers.", kb_index).offers_forbidden
+
+
+def judge_run(make_evaluator, kb_index, reference, offers, overrides=None):
+    instance, completions = make_evaluator(overrides)
+    instance._kb_index = kb_index
+    test_case = evaluator.TestCase(test_id="1", input_text="q", reference_output=reference, runs=[])
+    test_run = evaluator.TestRun(run_number=1, timestamp="t", response=f'{{"offers": {offers}, "text": "t"}}')
+    result, rule_check = instance._apply_rules(test_case, test_run, 0.0)
+    return result, rule_check
+
+
+@pytest.mark.parametrize("reference,offers,violation", [
+    ("Show DINING offers in UAE.", '["1", "99"]', "not found in knowledge base"),
+    ("No offers should be shown.", '["1"]', "no offers should be shown"),
+    ("Show offers in UAE, cap 1.", '["1", "2"]', "exceeding the cap of 1"),
+    ("Show offers, exclude [2].", '["1", "2"]', "excludes: 2"),
+    ("Show offers in UAE.", '["1", "3"]', "outside UAE: 3"),
+    ("Show DINING offers.", '["1", "2"]', "outside DINING: 2"),
+])
+def test_decisive_violation_decides_the_run(make_evaluator, kb_index, reference, offers, violation):
+    result, rule_check = judge_run(make_evaluator, kb_index, reference, offers)
+    assert result is not None and result.evaluation == "INCORRECT" and result.judged_by == "rules"
+    assert any(violation in message for message in rule_check.violations)
+
+
+def test_clean_run_goes_to_the_judge_with_findings(make_evaluator, kb_index):
+    result, rule_check = judge_run(make_evaluator, kb_index, "Show DINING offers in UAE, cap 2.", '["1"]')
+    assert result is None
+    assert rule_check.violations == []
+    assert "All known offer IDs are in UAE" in rule_check.findings
+
+
+def test_non_decisive_rule_is_only_a_finding(make_evaluator, kb_index):
+    result, rule_check = judge_run(make_evaluator, kb_index, "Show offers, cap 1.", '["1", "2"]',
+                                   {"rules.decisive": ["unknown_offer_ids"]})
+    assert result is None
+    assert any("exceeding the cap" in finding for finding in rule_check.findings)
+
+
+def test_disabled_rules_skip_the_pre_judge(make_evaluator, kb_index):
+    assert judge_run(make_evaluator, kb_index, "No offers.", '["1"]', {"rules.enabled": False}) == (None, None)
+
+
+@pytest.mark.parametrize("reference,offers", [
+    ("If the user’s detected country is not UAE, do not show international offers without confirmation; "
+     "reply accordingly; no offers.", '["1"]'),
+    ("If no more ITA hotel TRAVEL offers remain, respond 'No additional offers are available for Italy hotel "
+     "offers.'; do not switch country.", '["1", "3"]'),
+])
+def test_conditional_reference_is_left_to_the_judge(make_evaluator, kb_index, reference, offers):
+    result, rule_check = judge_run(make_evaluator, kb_index, reference, offers)
+    assert result is None
+    assert rule_check.violations and rule_check.verdict is None
+    assert "Reference is conditional; rule violations are left to the judge" in rule_check.findings
@@ -0,0 +1,46 @@
+"""Confidence intervals and strata reported for sampled evaluations."""
+
+import random
+
+import pytest
+
+import evaluator
+
+
+def test_wilson_interval_contains_the_proportion():
+    low, high = evaluator.wilson_interval(0.8, 50)
+    assert 0.6 < low < 0.8 < high < 0.95
+    assert evaluator.wilson_interval(0.0, 20)[0] == pytest.approx(0.0, abs=1e-12)
+    assert evaluator.wilson_interval(1.0, 20)[1] == pytest.approx(1.0, abs=1e-12)
+
+
+def test_wilson_interval_edge_cases():
+    assert evaluator.wilson_interval(0.5, 0) == (0.0, 1.0)
+    # Sampling every run leaves no sampling error
+    assert evaluator.wilson_interval(0.5, 40, population=40) == (0.5, 0.5)
+
+
+def test_finite_population_narrows_the_interval():
+    low, high = evaluator.wilson_interval(0.5, 50)
+    fpc_low, fpc_high = evaluator.wilson_interval(0.5, 50, population=60)
+    assert fpc_high - fpc_low < high - low
+
+
+def test_stratified_bootstrap_interval():
+    values = {"offers": [1.0] * 30, "no_offers": [0.0, 1.0] * 15}
+    weights = {"offers": 0.5, "no_offers": 0.5}
+    low, high = evaluator.stratified_bootstrap_interval(values, weights, samples=500, rng=random.Random(1))
+    assert 0.6 < low <= 0.75 <= high < 0.9
+    assert evaluator.stratified_bootstrap_interval({"a": [], "b": [0.4]}, {"a": 0.9, "b": 0.1},
+                                                   samples=50) == (0.4, 0.4)
+    assert evaluator.stratified_bootstrap_interval({}, {}) == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("constraints,kind", [
+    (dict(offers_forbidden=True, cap=None, categories=set(), countries=set()), "no_offers"),
+    (dict(offers_forbidden=False, cap=5, categories=set(), countries=set()), "offers"),
+    (dict(offers_forbidden=False, cap=None, categories=set(), countries={"USA"}), "offers"),
+    (dict(offers_forbidden=False, cap=None, categories=set(), countries=set()), "other"),
+])
+def test_reference_type(constraints, kind):
+    assert evaluator.reference_type(evaluator.ReferenceConstraints(excluded_ids=set(), **constraints)) == kind
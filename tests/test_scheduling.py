@@ -0,0 +1,106 @@
+"""Longest-expected-first scheduling: cost prediction from archived results and submission order."""
+
+import json
+
+import pytest
+
+import evaluator
+
+HISTORY = {"fast": 1.0, "slow": 9.0, "medium": 5.0}
+
+
+def make_case(test_id, response='{"offers": ["1"], "text": "ok"}'):
+    return evaluator.TestCase(test_id=test_id, input_text="Dining offers in Dubai?", reference_output="Return UAE DINING offers.",
+                              runs=[evaluator.TestRun(run_number=1, timestamp=f"t{test_id}", response=response)])
+
+
+def seed_history(tmp_path, times):
+    """An archived results file with one successful run per test case"""
+    folder = tmp_path / "history"
+    folder.mkdir(exist_ok=True)
+    entries = [{"test_id": test_id, "run_number": 1, "success": True, "processing_time": seconds,
+                "input": "x" * 50, "reference_output": "y" * 25, "actual_output": "z" * 25}
+               for test_id, seconds in times.items()]
+    # A duplicated run (0s) and a failure must not count
+    entries += [{"test_id": "fast", "run_number": 2, "success": True, "processing_time": 0.0},
+                {"test_id": "fast", "run_number": 3, "success": False, "processing_time": 60.0}]
+    (folder / "evaluation_results_20260101_000000.json").write_text(json.dumps(entries), encoding="utf-8")
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Test IDs in the order evaluate_batch submits them to its executor"""
+    order = []
+
+    class RecordingExecutor(evaluator.ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            if args and isinstance(args[0], evaluator.TestCase):
+                order.append(args[0].test_id)
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(evaluator, "ThreadPoolExecutor", RecordingExecutor)
+    return order
+
+
+@pytest.mark.parametrize("costs, workers, makespan", [
+    ([4, 1, 1], 2, 4),
+    ([1, 1, 4], 2, 5),
+    ([9, 5, 1], 2, 9),
+    ([1, 5, 9], 2, 10),
+    ([3, 2, 1], 1, 6),
+])
+def test_predicted_makespan(costs, workers, makespan):
+    assert evaluator.LMStudioEvaluator._predict_makespan(costs, workers) == makespan
+
+
+def test_costs_come_from_history_or_prompt_length(make_evaluator, tmp_path):
+    seed_history(tmp_path, HISTORY)
+    instance, _ = make_evaluator()
+    known, unknown = make_case("slow"), make_case("new", response="r" * 100)
+    pending = {("slow",): (known, known.runs[0]), ("new",): (unknown, unknown.runs[0])}
+
+    costs, history_hits = instance._predict_run_costs(pending)
+
+    assert history_hits == 1
+    assert costs[("slow",)] == 9.0
+    # 15s over 300 characters of history: 0.05s per character
+    chars = len(unknown.input_text) + len(unknown.reference_output) + 100
+    assert costs[("new",)] == pytest.approx(chars * 0.05)
+
+
+def test_costs_without_history_use_the_default_rate(make_evaluator):
+    instance, _ = make_evaluator({"evaluation.scheduling.default_seconds_per_char": 0.5})
+    case = make_case("new")
+
+    costs, history_hits = instance._predict_run_costs({("new",): (case, case.runs[0])})
+
+    chars = len(case.input_text) + len(case.reference_output) + len(case.runs[0].response)
+    assert history_hits == 0
+    assert costs[("new",)] == pytest.approx(chars * 0.5)
+
+
+def test_longest_expected_runs_are_submitted_first(make_evaluator, tmp_path, submitted):
+    seed_history(tmp_path, HISTORY)
+    instance, _ = make_evaluator({"rules.enabled": False, "evaluation.max_concurrency": 2})
+    suite = [make_case("fast", '{"offers": ["1"]}'), make_case("medium", '{"offers": ["2"]}'),
+             make_case("slow", '{"offers": ["3"]}')]
+
+    instance.evaluate_batch(suite)
+
+    assert submitted == ["slow", "medium", "fast"]
+    assert instance.schedule_stats["history_hits"] == 3
+    assert instance.schedule_stats["longest_first"] is True
+    assert instance.schedule_stats["predicted_makespan"] == 9.0
+
+
+def test_disabled_longest_first_keeps_test_case_order(make_evaluator, tmp_path, submitted):
+    seed_history(tmp_path, HISTORY)
+    instance, _ = make_evaluator({"rules.enabled": False, "evaluation.max_concurrency": 2,
+                                  "evaluation.scheduling.longest_first": False})
+    suite = [make_case("fast", '{"offers": ["1"]}'), make_case("medium", '{"offers": ["2"]}'),
+             make_case("slow", '{"offers": ["3"]}')]
+
+    instance.evaluate_batch(suite)
+
+    assert submitted == ["fast", "medium", "slow"]
+    assert instance.schedule_stats["predicted_makespan"] == 10.0
@@ -0,0 +1,30 @@
+"""Sharding test cases across processes by a stable hash of test_id."""
+
+import pytest
+
+import evaluator
+
+
+@pytest.mark.parametrize("spec,expected", [("1/4", (1, 4)), (" 3 / 3 ", (3, 3))])
+def test_parse_shard_spec(spec, expected):
+    assert evaluator.parse_shard_spec(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["0/4", "5/4", "1", "a/b", "1/0"])
+def test_invalid_shard_spec_is_rejected(spec):
+    with pytest.raises(ValueError):
+        evaluator.parse_shard_spec(spec)
+
+
+def test_shards_partition_the_suite():
+    test_cases = [evaluator.TestCase(test_id=str(n), input_text="", reference_output="", runs=[]) for n in range(200)]
+    shards = [evaluator.shard_test_cases(test_cases, index, 4) for index in range(1, 5)]
+    ids = [case.test_id for shard in shards for case in shard]
+    assert sorted(ids) == sorted(case.test_id for case in test_cases)
+    assert all(shard for shard in shards)
+
+
+def test_shard_assignment_is_stable():
+    # sha256 based, so it does not depend on PYTHONHASHSEED or on the other test ids
+    assert [evaluator.in_shard("42", index, 3) for index in (1, 2, 3)].count(True) == 1
+    assert evaluator.in_shard("42", 1, 1)
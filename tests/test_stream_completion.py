@@ -0,0 +1,58 @@
+"""Streamed judge completions against the mock server: TTFT, early stop and the non-streaming fallback."""
+
+import json
+
+import evaluator
+from conftest import judge_text
+from mock_lm_studio_server import request_fingerprint
+
+
+def judge_request(instance):
+    return instance._build_judge_request([{"role": "system", "content": "judge"}, {"role": "user", "content": "run"}])
+
+
+def test_streaming_records_time_to_first_token(make_evaluator, mock_server):
+    server = mock_server(latency="fixed:0.4", ttft_fraction=0.5)
+    instance, _ = make_evaluator({"model_parameters.stream": True}, server=server)
+    stats = evaluator.JudgeCallStats()
+
+    content, tool_calls, finish_reason = instance._judge_attempt(judge_request(instance), stats)
+
+    assert evaluator.extract_judge_fields(content)["evaluation"]
+    assert tool_calls == [] and finish_reason == "stop"
+    assert 0.15 <= stats.time_to_first_token < 0.4
+    assert stats.completion_tokens > 0 and stats.generation_time > 0
+
+
+def test_stream_stops_once_the_evaluation_is_complete(make_evaluator, mock_server, tmp_path):
+    instance, _ = make_evaluator({"model_parameters.stream": True})
+    request = judge_request(instance)
+    complete = judge_text("PARTIAL")
+    rambling = complete + "Some further thoughts that go on and on.\n" * 200
+    recordings = tmp_path / "recordings.jsonl"
+    recordings.write_text(json.dumps({"key": request_fingerprint(request),
+                                      "response": {"content": rambling, "tool_calls": [], "finish_reason": "stop"}}),
+                          encoding="utf-8")
+    server = mock_server(recordings_file=str(recordings), latency="fixed:2.0")
+    instance, _ = make_evaluator({"model_parameters.stream": True}, server=server)
+    stats = evaluator.JudgeCallStats()
+
+    content, _, _ = instance._stream_chat_completion(instance.client, request, stats)
+
+    assert stats.early_stopped
+    assert content.startswith(complete.rstrip()) and len(content) < len(rambling) // 10
+    assert server.stats["replayed"] == 1
+
+
+def test_backend_without_streaming_falls_back_to_plain_requests(make_evaluator, mock_server):
+    server = mock_server(streaming=False)
+    instance, _ = make_evaluator({"model_parameters.stream": True}, server=server)
+    backend = instance.backend_pool.backends[0]
+
+    first = instance._judge_attempt(judge_request(instance), evaluator.JudgeCallStats())
+    second = instance._judge_attempt(judge_request(instance), evaluator.JudgeCallStats())
+
+    assert first[0] == second[0] and evaluator.extract_judge_fields(first[0])["evaluation"]
+    assert backend.streaming is False
+    # Only the first call was tried as a stream; the server answers rejected streams before counting them
+    assert server.stats["requests"] == 2
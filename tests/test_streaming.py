@@ -0,0 +1,51 @@
+"""Streaming evaluation pipeline."""
+
+import json
+import time
+
+import evaluator
+
+
+def test_stream_matches_batch_counts_and_restarts_the_journal(make_evaluator, sample_test_cases, tmp_path):
+    test_cases = sample_test_cases[:6]
+    total_runs = sum(len(tc.runs) for tc in test_cases)
+    journal = tmp_path / "evaluation_journal.jsonl"
+
+    for _ in range(2):
+        instance, _ = make_evaluator({"evaluation.max_concurrency": 3})
+        results_file = instance.evaluate_stream(iter(test_cases))
+        journal_lines = journal.read_text(encoding="utf-8").splitlines()
+        assert len(journal_lines) == instance.stream_totals["unique_runs"]
+
+    with open(results_file, encoding="utf-8") as f:
+        assert len(json.load(f)) == total_runs
+    assert instance.stream_totals["runs"] == total_runs
+    assert instance.stream_totals["unique_runs"] + instance.stream_totals["duplicates"] == total_runs
+    report = (tmp_path / "evaluation_report.md").read_text(encoding="utf-8")
+    assert "COMPLETE" in report and f"| Runs Completed | {total_runs} |" in report
+
+    batch, _ = make_evaluator()
+    batch.evaluate_batch(test_cases)
+    assert batch.dedup_stats["unique_runs"] == instance.stream_totals["unique_runs"]
+
+
+def test_stream_summary_prints_running_totals(make_evaluator, sample_test_cases, capsys):
+    instance, _ = make_evaluator()
+    instance.evaluate_stream(iter(sample_test_cases[:2]))
+    instance.print_stream_summary()
+    assert f"Total Runs: {instance.stream_totals['runs']}" in capsys.readouterr().out
+
+
+def test_instant_verdicts_are_not_counted_as_duplicates(make_evaluator, sample_test_cases, monkeypatch):
+    test_cases = sample_test_cases[:6]
+    instance, _ = make_evaluator({"evaluation.max_concurrency": 3})
+    # A coarse clock reports 0s for instant verdicts, such as rule-decided runs
+    monkeypatch.setattr(evaluator.time, "time", lambda: 1000.0)
+
+    instance.evaluate_stream(iter(test_cases))
+
+    batch, _ = make_evaluator()
+    batch.evaluate_batch(test_cases)
+    assert instance.stream_totals["rules"] > 0
+    assert instance.stream_totals["unique_runs"] == batch.dedup_stats["unique_runs"]
+    assert instance.stream_totals["duplicates"] == batch.dedup_stats["llm_calls_saved"]
@@ -0,0 +1,55 @@
+"""The parsed-suite cache is reused for unchanged files and dropped when the parsers change."""
+
+import shutil
+
+import evaluator
+from conftest import REPO_ROOT
+
+
+def as_tuples(test_cases):
+    return [(case.test_id, case.input_text, case.reference_output,
+             [(run.run_number, run.timestamp, run.response, run.parsed_response) for run in case.runs])
+            for case in test_cases]
+
+
+def test_cache_round_trips_parsed_test_cases(tmp_path, make_evaluator):
+    instance, _ = make_evaluator()
+    path = tmp_path / "user_test_data.txt"
+    shutil.copy(REPO_ROOT / "user_test_data.txt", path)
+
+    parsed = instance.parse_user_test_data(str(path))
+    cached = instance._load_test_data_cache(str(path))
+
+    assert cached is not None
+    assert as_tuples(cached) == as_tuples(parsed)
+
+
+def test_cache_is_ignored_after_a_parser_change(tmp_path, make_evaluator, monkeypatch):
+    instance, _ = make_evaluator()
+    path = tmp_path / "user_test_data.txt"
+    shutil.copy(REPO_ROOT / "user_test_data.txt", path)
+    instance.parse_user_test_data(str(path))
+
+    monkeypatch.setattr(evaluator, "test_data_parser_fingerprint", lambda: "edited parser")
+
+    assert instance._load_test_data_cache(str(path)) is None
+
+
+def test_fingerprint_covers_the_response_parser(monkeypatch):
+    # Bypass the per-process cache to fingerprint the patched parser
+    fingerprint = evaluator.test_data_parser_fingerprint.__wrapped__
+    before = fingerprint()
+
+    def parse_actual_output(response):
+        return {"offers": [], "text": response}
+
+    monkeypatch.setattr(evaluator, "parse_actual_output", parse_actual_output)
+
+    assert fingerprint() != before
+
+
+def test_fingerprint_is_computed_once():
+    evaluator.test_data_parser_fingerprint()
+    evaluator.test_data_parser_fingerprint()
+
+    assert evaluator.test_data_parser_fingerprint.cache_info().misses <= 1
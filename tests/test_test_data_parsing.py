@@ -0,0 +1,123 @@
+"""Text test data parsing: the streaming state machine matches the index-walking parser it replaced."""
+
+import random
+
+import pytest
+
+import evaluator
+from conftest import REPO_ROOT
+
+
+def index_parse(content):
+    """The line-index parser iter_test_case_records replaced, as (test_id, input, reference, runs) tuples"""
+    test_cases = []
+    lines = content.split("\n")
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if line == "Test Case" and i + 1 < len(lines):
+            test_id = lines[i + 1].strip()
+            i += 2
+            if i < len(lines) and lines[i].strip() == "Input":
+                i += 1
+                input_text = lines[i].strip() if i < len(lines) else ""
+                i += 1
+            else:
+                input_text = ""
+            if i < len(lines) and lines[i].strip() == "Reference":
+                i += 1
+                reference_output = lines[i].strip() if i < len(lines) else ""
+                i += 1
+            else:
+                reference_output = ""
+            runs = []
+            while i < len(lines):
+                line = lines[i].strip()
+                if line.startswith("Run "):
+                    try:
+                        run_number = int(line.split()[1])
+                        i += 1
+                        if i < len(lines) and lines[i].strip() == "":
+                            i += 1
+                        timestamp = lines[i].strip() if i < len(lines) else ""
+                        i += 1
+                        response_lines = []
+                        while i < len(lines):
+                            next_line = lines[i].strip()
+                            if next_line.startswith("Run ") or next_line == "Test Case":
+                                break
+                            if next_line:
+                                response_lines.append(next_line)
+                            i += 1
+                        runs.append((run_number, timestamp, " ".join(response_lines)))
+                        continue
+                    except (ValueError, IndexError):
+                        i += 1
+                        continue
+                elif line == "Test Case":
+                    break
+                else:
+                    i += 1
+            if runs:
+                test_cases.append((test_id, input_text, reference_output, runs))
+        else:
+            i += 1
+    return test_cases
+
+
+_LINES = ["Test Case", "Test Case", "Input", "Reference", "Run 1", "Run 2", "Run x", "Run", "Runner up",
+          "", "", "  ", "7", "22/08/2025 - 15:49:20", '{ "offers": [ "112" ], "text": "Hi" }', "plain text",
+          "  Test Case  ", "Input ", "é"]
+
+
+def random_test_data(rng):
+    newline = rng.choice(["\n", "\r\n"])
+    return newline.join(rng.choice(_LINES) for _ in range(rng.randint(0, 60)))
+
+
+def parse(data: bytes):
+    lines = evaluator.iter_offset_lines(data.splitlines(keepends=True))
+    return list(evaluator.iter_test_case_records(lines))
+
+
+def as_tuples(test_cases):
+    return [(case.test_id, case.input_text, case.reference_output,
+             [(run.run_number, run.timestamp, run.response) for run in case.runs])
+            for case in test_cases]
+
+
+def test_shipped_test_data_matches_index_parser(sample_test_cases):
+    content = (REPO_ROOT / "user_test_data.txt").read_text(encoding="utf-8")
+    assert sample_test_cases
+    assert as_tuples(sample_test_cases) == index_parse(content)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_state_machine_matches_index_parser(seed):
+    rng = random.Random(seed)
+    for _ in range(1000):
+        content = random_test_data(rng)
+        records = parse(content.encode("utf-8"))
+        assert as_tuples(case for case, _, _ in records) == index_parse(content), content
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_byte_ranges_reparse_to_the_same_test_case(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        data = random_test_data(rng).encode("utf-8")
+        for case, start, end in parse(data):
+            sliced = [c for c, _, _ in parse(data[start:end])]
+            assert as_tuples(sliced) == as_tuples([case]), data
+
+
+def test_load_test_cases_reads_only_the_requested_cases(make_evaluator, sample_test_cases, tmp_path):
+    instance, _ = make_evaluator()
+    path = tmp_path / "user_test_data.txt"
+    path.write_bytes((REPO_ROOT / "user_test_data.txt").read_bytes())
+    wanted = [sample_test_cases[-1].test_id, "no such test"]
+
+    loaded = instance.load_test_cases(str(path), wanted)
+
+    assert (tmp_path / "user_test_data.txt.index.json").exists()
+    assert as_tuples(loaded) == as_tuples([case for case in sample_test_cases if case.test_id == wanted[0]])
@@ -0,0 +1,51 @@
+"""Tool-call loop budgets."""
+
+import time
+
+import pytest
+
+from conftest import judge_text, search_call
+from evaluator import JudgeCallStats
+
+
+def test_deadline_caps_each_request_timeout(make_evaluator):
+    instance, completions = make_evaluator({"evaluation.timeout_seconds": 120,
+                                            "evaluation.tool_loop.deadline_seconds": 5})
+    instance._run_chat_with_tools([{"role": "user", "content": "x"}], {"model": "m", "messages": []})
+    assert 4 < completions.requests[0]["timeout"] <= 5
+
+
+def test_request_timeout_past_deadline_marks_budget(make_evaluator):
+    def reply(request):
+        time.sleep(0.3)
+        raise TimeoutError("request timed out")
+
+    instance, _ = make_evaluator({"evaluation.tool_loop.deadline_seconds": 0.2}, reply)
+    stats = JudgeCallStats()
+    with pytest.raises(TimeoutError, match="deadline"):
+        instance._run_chat_with_tools([{"role": "user", "content": "x"}], {"model": "m", "messages": []}, stats)
+    assert stats.budget_exhausted == "deadline"
+
+
+def test_without_deadline_the_configured_timeout_is_used(make_evaluator):
+    instance, completions = make_evaluator({"evaluation.timeout_seconds": 42})
+    instance._judge_completion({"model": "m", "messages": [{"role": "user", "content": judge_text()}]}, JudgeCallStats())
+    assert completions.requests[0]["timeout"] == 42
+
+
+def test_without_deadline_the_loop_is_not_bounded_by_timeout_seconds(make_evaluator):
+    def reply(request):
+        time.sleep(0.15)
+        return search_call() if "tools" in request else judge_text()
+
+    instance, completions = make_evaluator({"evaluation.timeout_seconds": 0.2,
+                                            "evaluation.tool_loop.max_iterations": 2}, reply)
+    stats = JudgeCallStats()
+    request = {"model": "m", "messages": [{"role": "user", "content": "x"}], "tools": [], "tool_choice": "auto"}
+
+    content = instance._run_chat_with_tools(list(request["messages"]), request, stats)
+
+    # Three requests of 0.15s each take longer than timeout_seconds, which only bounds each one
+    assert content.startswith("EVALUATION_RESULT: PARTIAL")
+    assert stats.round_trips == 3 and stats.budget_exhausted != "deadline"
+    assert [r["timeout"] for r in completions.requests] == [0.2, 0.2, 0.2]
@@ -0,0 +1,110 @@
+"""SQLite work queue and the coordinator/worker loop."""
+
+import threading
+import time
+
+import evaluator
+from conftest import judge_text
+from evaluator import WorkQueue
+
+
+def job(job_id, priority=0.0):
+    return {"job_id": job_id, "priority": priority, "payload": {
+        "test_id": job_id, "input": "Show me offers", "reference_output": "Return offers",
+        "run_number": 1, "timestamp": "01/01/2025 - 10:00:00", "response": '{"offers": ["1"], "text": "x"}'}}
+
+
+def test_claim_order_and_lease_expiry(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "q.db"), lease_seconds=0.2)
+    assert work_queue.enqueued_at() is None
+    assert work_queue.enqueue([job("a", 1), job("b", 5)]) == 2
+    assert work_queue.enqueued_at() is not None
+    assert [job_id for job_id, _ in work_queue.claim("w1", 1)] == ["b"]
+    assert [job_id for job_id, _ in work_queue.claim("w2", 5)] == ["a"]
+    time.sleep(0.3)
+    assert [job_id for job_id, _ in work_queue.claim("w3", 5)] == ["b", "a"]
+    assert not work_queue.complete("b", "w1", {"x": 1})
+    assert work_queue.complete("b", "w3", {"x": 1})
+    assert work_queue.done_ids() == {"b"}
+
+
+def test_renewed_lease_is_not_claimed_again(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "q.db"), lease_seconds=0.3)
+    work_queue.enqueue([job("a")])
+    work_queue.claim("w1")
+    time.sleep(0.2)
+    assert work_queue.renew(["a"], "w1") == 1
+    time.sleep(0.2)
+    assert work_queue.claim("w2") == []
+    assert work_queue.renew(["a"], "w2") == 0
+
+
+def test_changed_payload_is_reset(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "q.db"))
+    work_queue.enqueue([job("a")])
+    work_queue.claim("w1")
+    work_queue.complete("a", "w1", {"x": 1})
+    changed = job("a")
+    changed["payload"]["response"] = "other"
+    assert work_queue.enqueue([job("b"), changed]) == 2
+    assert work_queue.counts() == {"pending": 2}
+
+
+def test_error_verdicts_are_retried(make_evaluator, tmp_path):
+    calls = []
+
+    def reply(request):
+        calls.append(1)
+        if len(calls) == 1:
+            raise TimeoutError("judge timed out")
+        return judge_text("CORRECT", (9, 9, 9, 9, 9))
+
+    instance, _ = make_evaluator({"rules.enabled": False, "evaluation.work_queue.poll_seconds": 0.05}, reply)
+    queue_file = str(tmp_path / "q.db")
+    WorkQueue(queue_file).enqueue([job("a")])
+
+    assert instance.work(queue_file, "w1") == 2
+    _, result = WorkQueue(queue_file).results()["a"]
+    assert result["evaluation"] == "CORRECT"
+    assert len(calls) == 2
+
+
+def test_worker_waits_for_the_coordinator(make_evaluator, tmp_path):
+    instance, _ = make_evaluator({"rules.enabled": False, "evaluation.work_queue.poll_seconds": 0.05,
+                                  "evaluation.work_queue.idle_timeout_seconds": 5})
+    queue_file = str(tmp_path / "q.db")
+    WorkQueue(queue_file)
+    judged = []
+    worker = threading.Thread(target=lambda: judged.append(instance.work(queue_file, "w1")))
+    worker.start()
+    time.sleep(0.3)
+    assert worker.is_alive()
+    WorkQueue(queue_file).enqueue([job("a"), job("b")])
+    worker.join(5)
+    assert judged == [2]
+
+
+def test_worker_gives_up_after_idle_timeout(make_evaluator, tmp_path):
+    instance, _ = make_evaluator({"evaluation.work_queue.poll_seconds": 0.05,
+                                  "evaluation.work_queue.idle_timeout_seconds": 0.2})
+    start = time.time()
+    assert instance.work(str(tmp_path / "q.db"), "w1") == 0
+    assert 0.2 <= time.time() - start < 2
+
+
+def test_long_job_keeps_its_lease(make_evaluator, tmp_path):
+    def reply(request):
+        time.sleep(0.8)
+        return judge_text()
+
+    instance, completions = make_evaluator({"rules.enabled": False, "evaluation.max_concurrency": 1,
+                                            "evaluation.work_queue.poll_seconds": 0.05,
+                                            "evaluation.work_queue.lease_seconds": 0.3}, reply)
+    queue_file = str(tmp_path / "q.db")
+    WorkQueue(queue_file).enqueue([job("a")])
+    second = threading.Thread(target=lambda: time.sleep(0.5) or WorkQueue(queue_file, 0.3).claim("w2"))
+    second.start()
+    assert instance.work(queue_file, "w1") == 1
+    second.join()
+    assert len(completions.requests) == 1
+    assert WorkQueue(queue_file).done_ids() == {"a"}